@@ -0,0 +1,134 @@
+"""
+Async versions of the data_access functions.
+
+Each function runs its blocking counterpart in the database executor so a slow
+query never stalls the Discord event loop.
+"""
+import data_access
+import utils
+from db_executor import run_db
+
+# User operations
+async def set_birthday(user_id, guild_id, birthday):
+    """Set a user's birthday"""
+    return await run_db(data_access.set_birthday, user_id, guild_id, birthday)
+
+async def clear_birthday(user_id, guild_id):
+    """Clear a user's birthday"""
+    return await run_db(data_access.clear_birthday, user_id, guild_id)
+
+async def set_birth_year(user_id, guild_id, birth_year):
+    """Set a user's birth year"""
+    return await run_db(data_access.set_birth_year, user_id, guild_id, birth_year)
+
+async def toggle_user_setting(user_id, guild_id, setting, value=None):
+    """Toggle a user setting or set to a specific value"""
+    return await run_db(data_access.toggle_user_setting, user_id, guild_id, setting, value)
+
+async def get_user_birthday(user_id, guild_id):
+    """Get a user's birthday information"""
+    return await run_db(data_access.get_user_birthday, user_id, guild_id)
+
+async def get_birthdays_for_date(days, dms_only=False, shard=None):
+    """Get all users with birthdays on a specific date"""
+    return await run_db(data_access.get_birthdays_for_date, days, dms_only, shard)
+
+async def get_birthdays_for_guilds(guild_days, announce_only=False):
+    """Get birthdays for several guilds, each on its own local date, in one query"""
+    return await run_db(data_access.get_birthdays_for_guilds, guild_days, announce_only)
+
+async def list_guild_birthdays(guild_id, days, after=None, limit=25):
+    """List one page of a guild's birthdays in a range"""
+    return await run_db(data_access.list_guild_birthdays, guild_id, days, after, limit)
+
+# Guild config operations
+async def get_guild_config(guild_id):
+    """Get a guild's GuildConfig"""
+    return await run_db(data_access.get_guild_config, guild_id)
+
+async def get_guild_configs(guild_ids):
+    """Get the GuildConfig of each guild in guild_ids as a dict"""
+    return await run_db(data_access.get_guild_configs, list(guild_ids))
+
+async def update_guild_config(guild_id, **changes):
+    """Change some fields of a guild's config. Returns the new GuildConfig, or None on error."""
+    return await run_db(data_access.update_guild_config, guild_id, **changes)
+
+async def get_guild_timezone(guild_id):
+    """Get the timezone for a guild, or 'UTC' if not set"""
+    return await run_db(utils.get_guild_timezone, guild_id)
+
+async def get_guild_timezones(guild_ids):
+    """Get the timezone for each guild"""
+    return await run_db(utils.get_guild_timezones, list(guild_ids))
+
+async def get_guild_dates(guild_ids):
+    """Get the current local date for each guild"""
+    return await run_db(utils.get_guild_dates, list(guild_ids))
+
+async def clean_up_user_data(user_id, guild_id=None):
+    """Remove user data from database"""
+    return await run_db(data_access.clean_up_user_data, user_id, guild_id)
+
+# Delivery ledger operations
+async def get_delivered(keys):
+    """Check which deliveries have already been made"""
+    return await run_db(data_access.get_delivered, keys)
+
+async def record_deliveries(keys):
+    """Record completed deliveries in the ledger"""
+    return await run_db(data_access.record_deliveries, keys)
+
+async def prune_deliveries(before_date):
+    """Remove ledger entries older than the given date"""
+    return await run_db(data_access.prune_deliveries, before_date)
+
+# Undeliverable target operations
+async def mark_undeliverable(target_type, target_id, guild_id, reason, ttl_seconds):
+    """Record that a user or channel can't be delivered to"""
+    return await run_db(data_access.mark_undeliverable, target_type, target_id, guild_id, reason, ttl_seconds)
+
+async def get_undeliverable(target_type, target_ids):
+    """Get which of the given targets are currently undeliverable"""
+    return await run_db(data_access.get_undeliverable, target_type, target_ids)
+
+async def clear_undeliverable(target_type, target_id):
+    """Forget that a target was undeliverable"""
+    return await run_db(data_access.clear_undeliverable, target_type, target_id)
+
+async def list_undeliverable(guild_id, limit=25):
+    """List a guild's undeliverable channels and members"""
+    return await run_db(data_access.list_undeliverable, guild_id, limit)
+
+async def prune_undeliverable():
+    """Remove expired undeliverable entries"""
+    return await run_db(data_access.prune_undeliverable)
+
+# Delivery job operations
+async def enqueue_jobs(jobs):
+    """Queue delivery jobs"""
+    return await run_db(data_access.enqueue_jobs, jobs)
+
+async def claim_jobs(limit, lease_seconds, shard=None):
+    """Claim up to `limit` due jobs"""
+    return await run_db(data_access.claim_jobs, limit, lease_seconds, shard)
+
+async def complete_jobs(job_ids):
+    """Mark jobs as done"""
+    return await run_db(data_access.complete_jobs, job_ids)
+
+async def retry_job(job_id, delay_seconds, error):
+    """Make a failed job due again later"""
+    return await run_db(data_access.retry_job, job_id, delay_seconds, error)
+
+async def fail_job(job_id, error):
+    """Give up on a job"""
+    return await run_db(data_access.fail_job, job_id, error)
+
+async def prune_jobs(before_date):
+    """Remove jobs for old delivery dates"""
+    return await run_db(data_access.prune_jobs, before_date)
+
+async def job_counts():
+    """Count jobs by status"""
+    return await run_db(data_access.job_counts)
@@ -0,0 +1,100 @@
+"""
+End-to-end birthday check at scale.
+
+Runs main.check_birthdays against a fake Discord client over the generated
+dataset: a cold run that delivers every DM and announcement for the day, then
+a warm run where the delivery ledger filters everything out. Repeats clear the
+ledger first so each cold run does the same work.
+
+Usage:
+    python benchmarks/bench_check_birthdays.py --users 2000000 --guilds 100000 --output check.json
+    python benchmarks/bench_check_birthdays.py --backend postgres --http-latency-ms 50
+    python benchmarks/bench_check_birthdays.py --shard-count 16 --shard-ids 0-3
+    python benchmarks/bench_check_birthdays.py --queue-workers 50 --http-latency-ms 50
+
+With --queue-workers, the check only queues delivery jobs and the wall time
+covers the workers draining the queue.
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common import add_common_args, setup, report
+from fake_discord import FakeHTTP, build_client
+from sharding import parse_shard_ids
+
+async def run(args, guilds, users):
+    import main
+    from storage import start_storage
+    import data_access
+    from outbound import OutboundScheduler
+    from delivery_queue import DeliveryWorkers
+    from user_resolver import UserResolver
+
+    client = build_client(
+        guilds, users, FakeHTTP(args.http_rate, args.http_latency_ms / 1000),
+        shard_count=args.shard_count, shard_ids=parse_shard_ids(args.shard_ids) if args.shard_ids else None
+    )
+    main.bot = client
+    await start_storage()
+    main.user_resolver = UserResolver(client)
+    # Unthrottled by default so the run measures the bot, not Discord's limits
+    main.outbound = OutboundScheduler(
+        global_rate=args.send_rate, global_burst=args.send_rate,
+        route_rate=args.send_rate, route_burst=args.send_rate
+    )
+
+    if args.queue_workers:
+        main.DELIVERY_MODE = "queue"
+        main.delivery_workers = DeliveryWorkers(main.run_delivery_job, workers=args.queue_workers, poll_interval=0.05)
+        main.delivery_workers.start()
+
+    today = datetime.date.fromisoformat(args.date)
+    runs = []
+    for _ in range(args.repeat):
+        data_access.prune_deliveries(today + datetime.timedelta(days=1))
+        data_access.prune_jobs(today + datetime.timedelta(days=1))
+        for label in ("cold", "warm"):
+            requests_before = client.http_fake.requests
+            started = time.perf_counter()
+            stats = await main.check_birthdays()
+            while args.queue_workers and data_access.job_counts().get("pending"):
+                await asyncio.sleep(0.01)
+            stats["wall_s"] = round(time.perf_counter() - started, 3)
+            stats["http_requests"] = client.http_fake.requests - requests_before
+            stats["run"] = label
+            runs.append(stats)
+    if args.queue_workers:
+        main.delivery_workers.stop()
+    await main.outbound.stop()
+    return runs
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_common_args(parser)
+    parser.add_argument("--repeat", type=int, default=3, help="Cold/warm run pairs")
+    parser.add_argument("--http-rate", type=float, default=None, help="Fake HTTP requests per second (unlimited if unset)")
+    parser.add_argument("--http-latency-ms", type=float, default=0.0, help="Fake HTTP round-trip latency")
+    parser.add_argument("--shard-count", type=int, default=1, help="Shards in the simulated cluster")
+    parser.add_argument("--shard-ids", help="Shards this simulated process runs, e.g. 0-3 (all if unset)")
+    parser.add_argument("--queue-workers", type=int, default=0, help="Deliver through the job queue with this many workers")
+    parser.add_argument("--send-rate", type=float, default=1e9, help="Outbound scheduler global and per-route rate")
+    args = parser.parse_args()
+
+    guilds, users = setup(args)
+    runs = asyncio.run(run(args, guilds, users))
+    cold = [entry["wall_s"] for entry in runs if entry["run"] == "cold"]
+    warm = [entry["wall_s"] for entry in runs if entry["run"] == "warm"]
+    report("check_birthdays", args, {
+        "cold_wall_s_min": min(cold),
+        "warm_wall_s_min": min(warm),
+        "runs": runs,
+    })
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Command handler latency at scale.
+
+Runs the global command channel check and the bot's command callbacks with
+fake contexts for random existing users, `--concurrency` at a time, and
+reports latency per command. Replies and privacy-warning DMs go to the fake
+HTTP layer.
+
+Usage:
+    python benchmarks/bench_commands.py --commands 20000 --concurrency 50 --output commands.json
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common import add_common_args, setup, report, latency_summary
+from fake_discord import FakeHTTP, FakeContext, FakeMember, FakeChannel, build_client
+
+# (command name, arguments, weight)
+COMMAND_MIX = [
+    ("setbirthday", lambda rng: [f"{rng.randint(1, 12):02d}{rng.randint(1, 28):02d}"], 30),
+    ("setbirthyear", lambda rng: [str(rng.randint(1960, 2010))], 10),
+    ("toggledms", lambda rng: [], 20),
+    ("toggleannounce", lambda rng: [], 20),
+    ("toggleshareage", lambda rng: [], 10),
+    ("clearbirthday", lambda rng: [], 5),
+    ("help", lambda rng: [], 5),
+]
+
+async def run(args, guilds, users):
+    import main
+    from storage import start_storage
+    from outbound import OutboundScheduler
+
+    client = build_client(guilds, users, FakeHTTP(args.http_rate, args.http_latency_ms / 1000))
+    bot_commands = {command.name: command for command in main.bot.commands}
+    main.bot = client
+    await start_storage()
+    main.outbound = OutboundScheduler(
+        global_rate=args.send_rate, global_burst=args.send_rate,
+        route_rate=args.send_rate, route_burst=args.send_rate
+    )
+
+    rng = random.Random(args.seed)
+    names, argument_makers, weights = zip(*COMMAND_MIX)
+    latencies = {name: [] for name in names}
+
+    async def invoke(name, arguments, user_id, guild_id):
+        guild = client.get_guild(guild_id)
+        channel = FakeChannel(client, guild_id * 10 + 2, guild)
+        ctx = FakeContext(client, guild, channel, FakeMember(client, user_id, guild), name)
+        command = bot_commands[name]
+        started = time.perf_counter()
+        await main.command_channel_check(ctx)
+        await command.callback(ctx, *arguments)
+        latencies[name].append(time.perf_counter() - started)
+
+    jobs = []
+    for _ in range(args.commands):
+        index = rng.choices(range(len(names)), weights)[0]
+        user_id, guild_id = rng.choice(users)[:2]
+        jobs.append((names[index], argument_makers[index](rng), user_id, guild_id))
+
+    started = time.perf_counter()
+    for offset in range(0, len(jobs), args.concurrency):
+        await asyncio.gather(*(invoke(*job) for job in jobs[offset:offset + args.concurrency]))
+    elapsed = time.perf_counter() - started
+    await main.outbound.stop()
+
+    return {
+        "commands": args.commands,
+        "wall_s": round(elapsed, 3),
+        "commands_per_s": round(args.commands / elapsed, 1),
+        "overall": latency_summary([value for values in latencies.values() for value in values]),
+        "per_command": {name: latency_summary(values) for name, values in latencies.items() if values},
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_common_args(parser)
+    parser.add_argument("--commands", type=int, default=10000, help="Commands to invoke")
+    parser.add_argument("--concurrency", type=int, default=50, help="Commands in flight at once")
+    parser.add_argument("--http-rate", type=float, default=None, help="Fake HTTP requests per second (unlimited if unset)")
+    parser.add_argument("--http-latency-ms", type=float, default=0.0, help="Fake HTTP round-trip latency")
+    parser.add_argument("--send-rate", type=float, default=1e9, help="Outbound scheduler global and per-route rate")
+    args = parser.parse_args()
+
+    guilds, users = setup(args)
+    report("commands", args, asyncio.run(run(args, guilds, users)))
+
+if __name__ == '__main__':
+    main()
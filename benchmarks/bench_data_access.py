@@ -0,0 +1,90 @@
+"""
+Per-function data_access latency at scale.
+
+Calls each data_access function directly (no event loop or executor) with
+arguments drawn from the generated dataset and reports latency per function.
+Write benchmarks touch random existing users, so run them against a scratch
+database.
+
+Usage:
+    python benchmarks/bench_data_access.py --iterations 2000 --output data_access.json
+    python benchmarks/bench_data_access.py --backend postgres --only get_birthdays_for_guilds
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common import add_common_args, setup, report, latency_summary
+
+def build_cases(args, guilds, users):
+    """Map each benchmark name to (function, argument maker, iterations)"""
+    import data_access
+    from utils import get_guild_dates, birthday_days
+
+    rng = random.Random(args.seed)
+    today = datetime.date.fromisoformat(args.date)
+    days = birthday_days(today)
+    guild_ids = [guild.guild_id for guild in guilds]
+    todays = [row for row in users if days[0] <= row[2] <= days[1]]
+    delivered_keys = [(user_id, guild_id, "dm", today) for user_id, guild_id, *_ in todays]
+    all_guild_days = {guild_id: birthday_days(date) for guild_id, date in get_guild_dates(guild_ids).items()}
+
+    # Listing pages in the largest guild, from a random point in the year
+    members = {}
+    for user_id, guild_id, birthday, *_ in users:
+        members.setdefault(guild_id, []).append((birthday, user_id))
+    largest, largest_members = max(members.items(), key=lambda item: len(item[1]))
+
+    def random_page():
+        return largest, (1, 366), rng.choice(largest_members), 21
+
+    def random_user():
+        return rng.choice(users)[:2]
+
+    few = max(1, args.iterations // 100)
+    return {
+        "get_user_birthday": (data_access.get_user_birthday, lambda: random_user(), args.iterations),
+        "get_guild_config": (data_access.get_guild_config, lambda: (rng.choice(guild_ids),), args.iterations),
+        "get_guild_dates_all": (get_guild_dates, lambda: (guild_ids,), few),
+        "list_guild_birthdays_page": (data_access.list_guild_birthdays, random_page, args.iterations),
+        "get_birthdays_for_date": (data_access.get_birthdays_for_date, lambda: (days, True), few),
+        "get_birthdays_for_guilds_all": (data_access.get_birthdays_for_guilds, lambda: (all_guild_days, True), few),
+        "get_delivered_today": (data_access.get_delivered, lambda: (delivered_keys,), few),
+        "record_deliveries_today": (data_access.record_deliveries, lambda: (delivered_keys,), few),
+        "get_undeliverable_today": (data_access.get_undeliverable,
+                                    lambda: ("user", {row[0] for row in todays}), few),
+        "set_birthday": (data_access.set_birthday,
+                         lambda: (*random_user(), rng.randint(1, 366)), args.iterations),
+        "toggle_user_setting": (data_access.toggle_user_setting,
+                                lambda: (*random_user(), "receive_dms"), args.iterations),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_common_args(parser)
+    parser.add_argument("--iterations", type=int, default=1000, help="Calls per single-row function")
+    parser.add_argument("--only", action="append", help="Run only this benchmark (repeatable)")
+    args = parser.parse_args()
+
+    guilds, users = setup(args)
+    cases = build_cases(args, guilds, users)
+    results = {}
+    for name, (func, make_args, iterations) in cases.items():
+        if args.only and name not in args.only:
+            continue
+        durations = []
+        for _ in range(iterations):
+            call_args = make_args()
+            started = time.perf_counter()
+            func(*call_args)
+            durations.append(time.perf_counter() - started)
+        results[name] = latency_summary(durations)
+    report("data_access", args, results)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Event-loop lag benchmark for database calls.
+
+Runs many simulated commands at once, each doing one blocking query, and
+measures how late a 10ms heartbeat coroutine wakes up. Compares calling the
+query directly inside the coroutine (the old behaviour) with awaiting it through
+the database executor.
+
+Usage:
+    python benchmarks/bench_event_loop_lag.py --commands 200 --query-ms 20
+    python benchmarks/bench_event_loop_lag.py --real   # use get_guild_config against Postgres
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db_executor import run_db, shutdown_executor
+
+HEARTBEAT_INTERVAL = 0.01
+
+def make_query(args):
+    """Build the blocking query function used by each simulated command"""
+    if args.real:
+        from database import init_pool
+        from data_access import get_guild_config
+        init_pool()
+        return lambda: get_guild_config(1)
+    return lambda: time.sleep(args.query_ms / 1000)
+
+async def heartbeat(lags, stop):
+    """Record how late each wake-up is compared to the requested interval"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+        lags.append(loop.time() - start - HEARTBEAT_INTERVAL)
+
+async def run_mode(mode, query, commands):
+    """Run all simulated commands in the given mode and return lag statistics"""
+    lags = []
+    stop = asyncio.Event()
+    beat = asyncio.create_task(heartbeat(lags, stop))
+    await asyncio.sleep(0)
+
+    async def command():
+        if mode == "blocking":
+            query()
+        else:
+            await run_db(query)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(command() for _ in range(commands)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await beat
+
+    lags_ms = sorted(lag * 1000 for lag in lags) or [0.0]
+    return {
+        "mode": mode,
+        "commands": commands,
+        "elapsed_s": round(elapsed, 3),
+        "heartbeats": len(lags),
+        "lag_mean_ms": round(statistics.mean(lags_ms), 2),
+        "lag_p99_ms": round(lags_ms[min(len(lags_ms) - 1, int(len(lags_ms) * 0.99))], 2),
+        "lag_max_ms": round(lags_ms[-1], 2),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--commands", type=int, default=200, help="Number of concurrent commands")
+    parser.add_argument("--query-ms", type=float, default=20, help="Simulated query latency in milliseconds")
+    parser.add_argument("--real", action="store_true", help="Run get_guild_config against the configured database")
+    args = parser.parse_args()
+
+    query = make_query(args)
+    for mode in ("blocking", "executor"):
+        result = asyncio.run(run_mode(mode, query, args.commands))
+        print(
+            f"{result['mode']:>8}: {result['commands']} commands in {result['elapsed_s']}s, "
+            f"loop lag mean {result['lag_mean_ms']}ms p99 {result['lag_p99_ms']}ms "
+            f"max {result['lag_max_ms']}ms ({result['heartbeats']} heartbeats)"
+        )
+    shutdown_executor()
+
+if __name__ == '__main__':
+    main()
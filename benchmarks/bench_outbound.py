@@ -0,0 +1,118 @@
+"""
+Reply latency during an announcement burst.
+
+Simulates Discord's HTTP layer with a fake client that serves requests in
+arrival order at a fixed global rate, then queues a burst of announcements
+across many channels while a user sends a command reply every 100ms. Compares
+sending directly to the HTTP layer (the old behaviour) with sending through
+the OutboundScheduler.
+
+Rates are scaled up from Discord's real limits so the run finishes quickly;
+only the ratio between them matters.
+
+Usage:
+    python benchmarks/bench_outbound.py --announcements 10000 --http-rate 500
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from outbound import OutboundScheduler, PRIORITY_REPLY, PRIORITY_ANNOUNCE
+
+class FakeHTTP:
+    """Serves requests first-come first-served at `rate` per second with fixed latency"""
+
+    def __init__(self, rate, latency):
+        self.interval = 1 / rate
+        self.latency = latency
+        self.next_free = 0.0
+        self.requests = 0
+
+    async def request(self):
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        slot = max(now, self.next_free)
+        self.next_free = slot + self.interval
+        await asyncio.sleep(slot - now + self.latency)
+        self.requests += 1
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+async def run_mode(mode, args):
+    """Run one burst and return latency statistics"""
+    http = FakeHTTP(args.http_rate, args.latency_ms / 1000)
+    scheduler = None
+    if mode == "scheduler":
+        scheduler = OutboundScheduler(
+            global_rate=args.http_rate * 0.9, global_burst=args.http_rate * 0.05,
+            route_rate=args.route_rate, route_burst=args.route_rate
+        )
+
+    async def send(priority, route):
+        if scheduler:
+            await scheduler.submit(priority, route, http.request)
+        else:
+            await http.request()
+
+    reply_latencies = []
+    burst_done = asyncio.Event()
+
+    async def replies():
+        while not burst_done.is_set():
+            started = time.perf_counter()
+            await send(PRIORITY_REPLY, ("channel", "commands"))
+            reply_latencies.append((time.perf_counter() - started) * 1000)
+            await asyncio.sleep(0.1)
+
+    started = time.perf_counter()
+    reply_task = asyncio.create_task(replies())
+    await asyncio.gather(*(
+        send(PRIORITY_ANNOUNCE, ("channel", i % args.channels))
+        for i in range(args.announcements)
+    ))
+    burst_seconds = time.perf_counter() - started
+    burst_done.set()
+    await reply_task
+    if scheduler:
+        await scheduler.stop()
+
+    return {
+        "mode": mode,
+        "announcements": args.announcements,
+        "burst_s": round(burst_seconds, 2),
+        "replies": len(reply_latencies),
+        "reply_p50_ms": round(percentile(reply_latencies, 0.5), 1),
+        "reply_p99_ms": round(percentile(reply_latencies, 0.99), 1),
+        "reply_max_ms": round(max(reply_latencies, default=0.0), 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--announcements", type=int, default=10000, help="Announcements in the burst")
+    parser.add_argument("--channels", type=int, default=1000, help="Channels the burst is spread across")
+    parser.add_argument("--http-rate", type=float, default=500, help="Requests per second the fake HTTP layer serves")
+    parser.add_argument("--route-rate", type=float, default=10, help="Scheduler messages per second per channel")
+    parser.add_argument("--latency-ms", type=float, default=20, help="Fake HTTP round-trip latency")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = [asyncio.run(run_mode(mode, args)) for mode in ("direct", "scheduler")]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for result in results:
+        print(
+            f"{result['mode']:>9}: {result['announcements']} announcements in {result['burst_s']}s, "
+            f"{result['replies']} replies p50 {result['reply_p50_ms']}ms "
+            f"p99 {result['reply_p99_ms']}ms max {result['reply_max_ms']}ms"
+        )
+
+if __name__ == '__main__':
+    main()
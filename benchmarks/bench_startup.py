@@ -0,0 +1,82 @@
+"""
+Import time and cold start.
+
+Each run starts a fresh interpreter so nothing is cached, imports a module and
+reports how long the import took. For `main` it also reports how long until
+the event loop runs its first task, which is when the bot can begin its
+gateway login. Before startup was made lazy, importing `database` connected to
+Postgres and could sleep through several retries before returning.
+
+With --db the run also times start_database() until it returns ready,
+against the configured database.
+
+Usage:
+    python benchmarks/bench_startup.py --runs 10
+    python benchmarks/bench_startup.py --db --json
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = ["database", "data_access", "utils", "main"]
+
+# Runs inside the child interpreter and prints a JSON line of timings in ms
+CHILD = """
+import sys, time, json, asyncio
+started = time.perf_counter()
+import {module}
+imported = time.perf_counter()
+result = {{"import_ms": (imported - started) * 1000}}
+
+async def first_tick():
+    result["loop_ready_ms"] = (time.perf_counter() - started) * 1000
+    if {db}:
+        import database
+        ok = await database.start_database(max_retries=1)
+        result["db_ready_ms"] = (time.perf_counter() - started) * 1000 if ok else None
+
+asyncio.run(first_tick())
+print(json.dumps(result))
+"""
+
+def run_once(module, db):
+    """Time one import in a fresh interpreter"""
+    code = CHILD.format(module=module, db=db)
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def summarize(module, runs, db):
+    """Run several times and take the median of each timing"""
+    samples = [run_once(module, db) for _ in range(runs)]
+    result = {"module": module, "runs": runs}
+    for key in samples[0]:
+        values = [sample[key] for sample in samples if sample.get(key) is not None]
+        result[key] = round(statistics.median(values), 1) if values else None
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per module")
+    parser.add_argument("--db", action="store_true", help="Also time start_database() against the configured database")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = [summarize(module, args.runs, args.db) for module in MODULES]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for result in results:
+        line = f"{result['module']:>12}: import {result['import_ms']}ms, first loop tick {result['loop_ready_ms']}ms"
+        if args.db:
+            line += f", database ready {result['db_ready_ms']}ms"
+        print(line)
+
+if __name__ == '__main__':
+    main()
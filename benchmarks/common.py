@@ -0,0 +1,123 @@
+"""
+Shared setup and reporting for the scale benchmarks.
+
+Every benchmark takes the same data and backend options, and writes one JSON
+document with the parameters, environment and results so runs can be diffed.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import datetime
+import platform
+import subprocess
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datagen import generate_guilds, generate_users, guild_configs
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def add_common_args(parser):
+    """Options shared by every scale benchmark"""
+    parser.add_argument("--users", type=int, default=1000000, help="Users rows to generate")
+    parser.add_argument("--guilds", type=int, default=100000, help="Guilds to spread users across")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed, must match datagen --seed for postgres")
+    parser.add_argument("--backend", choices=("memory", "sqlite", "postgres"), default="memory",
+                        help="memory and sqlite load the data at startup; postgres uses data loaded by datagen.py --seed-db")
+    parser.add_argument("--sqlite-path", default=":memory:", help="Database file for the sqlite backend")
+    parser.add_argument("--date", default="2024-07-04", help="Date the bot treats as today in every timezone")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    parser.add_argument("--output", help="Also write the JSON results to this file")
+    parser.add_argument("--verbose", action="store_true", help="Show the bot's log output")
+
+def setup(args):
+    """
+    Generate the dataset and prepare the chosen backend.
+    Returns (guild_specs, users rows).
+    """
+    if not args.verbose:
+        logging.disable(logging.CRITICAL)
+
+    started = time.perf_counter()
+    guilds = generate_guilds(args.guilds, args.seed)
+    users = list(generate_users(args.users, guilds, args.seed))
+    print(f"Generated {len(users)} users across {len(guilds)} guilds in {time.perf_counter() - started:.1f}s",
+          file=sys.stderr)
+
+    from storage import set_storage
+    if args.backend == "postgres":
+        from database import init_pool
+        from storage_postgres import PostgresStorage
+        if not init_pool():
+            raise SystemExit("No database connection available")
+        set_storage(PostgresStorage())
+    else:
+        if args.backend == "memory":
+            from storage_memory import MemoryStorage
+            storage = MemoryStorage()
+        else:
+            from storage_sqlite import SQLiteStorage
+            storage = SQLiteStorage(args.sqlite_path)
+        storage.initialize()
+        storage.load(users, guild_configs(guilds))
+        set_storage(storage)
+
+    freeze_date(datetime.date.fromisoformat(args.date))
+    return guilds, users
+
+def freeze_date(today):
+    """Make the bot see `today` as the current date in every timezone"""
+    import utils
+    import main
+
+    def get_current_date(timezone=None):
+        return today
+
+    utils.get_current_date = get_current_date
+    main.get_current_date = get_current_date
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+def latency_summary(seconds):
+    """Summarize a list of durations in seconds as milliseconds"""
+    return {
+        "count": len(seconds),
+        "mean_ms": round(sum(seconds) / len(seconds) * 1000, 3) if seconds else 0.0,
+        "p50_ms": round(percentile(seconds, 0.5) * 1000, 3),
+        "p90_ms": round(percentile(seconds, 0.9) * 1000, 3),
+        "p99_ms": round(percentile(seconds, 0.99) * 1000, 3),
+        "max_ms": round(max(seconds, default=0.0) * 1000, 3),
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+def report(name, args, results):
+    """Print results and write them to --output as JSON"""
+    document = {
+        "benchmark": name,
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "params": {key: value for key, value in vars(args).items() if key not in ("json", "output", "verbose")},
+        "results": results,
+    }
+    text = json.dumps(document, indent=2, default=str)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    if args.json:
+        print(text)
+    else:
+        for key, value in results.items():
+            print(f"{key}: {json.dumps(value, default=str)}")
+    return document
@@ -0,0 +1,145 @@
+"""
+Synthetic data for the benchmarks.
+
+Generates guilds with a realistic timezone spread and announcement settings,
+and users spread across them with a long-tailed guild size distribution.
+Everything is derived from --seed so runs are repeatable.
+
+With --seed-db the data is loaded into the configured storage backend
+(STORAGE_BACKEND, Postgres by default, using COPY). Point ENVIRONMENT /
+DB_HOST or SQLITE_PATH at a scratch database.
+
+Usage:
+    python benchmarks/datagen.py --users 2000000 --guilds 100000 --seed-db
+"""
+import os
+import sys
+import time
+import random
+import argparse
+from collections import namedtuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Rough share of guilds per timezone; guilds that never set one stay on UTC
+TIMEZONE_WEIGHTS = [
+    (None, 30),
+    ("America/New_York", 14),
+    ("America/Chicago", 7),
+    ("America/Los_Angeles", 8),
+    ("America/Denver", 2),
+    ("America/Sao_Paulo", 4),
+    ("America/Mexico_City", 2),
+    ("Europe/London", 6),
+    ("Europe/Berlin", 5),
+    ("Europe/Paris", 3),
+    ("Europe/Moscow", 2),
+    ("Asia/Kolkata", 4),
+    ("Asia/Manila", 2),
+    ("Asia/Tokyo", 2),
+    ("Asia/Singapore", 2),
+    ("Australia/Sydney", 3),
+    ("Pacific/Auckland", 1),
+    ("Africa/Lagos", 1),
+]
+
+GuildSpec = namedtuple("GuildSpec", "guild_id timezone announce_channel mention_everyone coalesce")
+
+USER_ID_BASE = 100000000000000000
+GUILD_ID_BASE = 900000000000000000
+
+# Birthdays as stored, days of the leap year (see utils.encode_birthday)
+BIRTHDAYS = list(range(1, 367))
+
+def generate_guilds(count, seed=0):
+    """Generate guild specs with timezones and announcement settings"""
+    rng = random.Random(seed)
+    timezones, weights = zip(*TIMEZONE_WEIGHTS)
+    chosen = rng.choices(timezones, weights, k=count)
+    guilds = []
+    for index, timezone in enumerate(chosen):
+        # One snowflake timestamp tick apart, so guilds spread across shards like real ones
+        guild_id = GUILD_ID_BASE + (index << 22)
+        announce = rng.random() < 0.6
+        guilds.append(GuildSpec(
+            guild_id=guild_id,
+            timezone=timezone,
+            announce_channel=guild_id * 10 + 1 if announce else None,
+            mention_everyone=announce and rng.random() < 0.1,
+            coalesce=announce and rng.random() < 0.2,
+        ))
+    return guilds
+
+def generate_users(count, guilds, seed=0, multi_guild_fraction=0.2):
+    """
+    Yield `count` users rows as (user_id, guild_id, birthday, birth_year,
+    announce_in_servers, receive_dms, share_age).
+    Guild sizes follow a power law so a few guilds are very large, and about
+    `multi_guild_fraction` of users are registered in a second guild too.
+    """
+    rng = random.Random(seed + 1)
+    weights = [1 / (rank + 1) ** 0.9 for rank in range(len(guilds))]
+    cum_weights = []
+    total = 0.0
+    for weight in weights:
+        total += weight
+        cum_weights.append(total)
+    guild_ids = [guild.guild_id for guild in guilds]
+
+    rows = 0
+    index = 0
+    while rows < count:
+        user_id = USER_ID_BASE + index
+        index += 1
+        birthday = rng.choice(BIRTHDAYS)
+        birth_year = rng.randint(1960, 2010) if rng.random() < 0.4 else None
+        receive_dms = 1 if rng.random() < 0.85 else 0
+        share_age = 1 if birth_year and rng.random() < 0.5 else 0
+        first_guild = rng.choices(guild_ids, cum_weights=cum_weights)[0]
+        yield (user_id, first_guild, birthday, birth_year, 1 if rng.random() < 0.9 else 0, receive_dms, share_age)
+        rows += 1
+
+        if rows < count and len(guild_ids) > 1 and rng.random() < multi_guild_fraction:
+            second_guild = rng.choices(guild_ids, cum_weights=cum_weights)[0]
+            if second_guild != first_guild:
+                yield (user_id, second_guild, birthday, birth_year, 1 if rng.random() < 0.9 else 0,
+                       receive_dms, share_age)
+                rows += 1
+
+def guild_configs(guilds):
+    """Yield guild_config rows as (guild_id, *storage.GuildConfig)"""
+    for guild in guilds:
+        yield guild.guild_id, guild.timezone, guild.announce_channel, None, guild.mention_everyone, guild.coalesce
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=2000000, help="Users rows to generate")
+    parser.add_argument("--guilds", type=int, default=100000, help="Guilds to spread users across")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--seed-db", action="store_true", help="Load the data into the configured database")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    guilds = generate_guilds(args.guilds, args.seed)
+    users = generate_users(args.users, guilds, args.seed)
+
+    if not args.seed_db:
+        count = sum(1 for _ in users)
+        print(f"Generated {count} users across {len(guilds)} guilds in {time.perf_counter() - started:.1f}s")
+        return 0
+
+    from storage import get_storage
+    storage = get_storage()
+    if storage.name == "postgres":
+        from database import init_pool
+        if not init_pool():
+            print("No database connection available")
+            return 2
+    storage.initialize()
+    user_count = storage.load(users, guild_configs(guilds))
+    storage.close()
+    print(f"Loaded {user_count} users into {storage.name} in {time.perf_counter() - started:.1f}s")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
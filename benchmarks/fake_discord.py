@@ -0,0 +1,184 @@
+"""
+Stand-ins for the parts of discord.py the bot touches, for the benchmarks and
+test_main.py. Channels keep what was sent to them and the client keeps which
+users were DMed, so tests can check what went out.
+
+FakeHTTP serves every send at a fixed rate and latency. Guilds create member
+objects on demand from a set of IDs, so millions of users don't need millions
+of objects up front. Users in `closed_dms` reject DMs with the same error
+Discord returns, and users in `unknown` make fetch_user raise NotFound.
+"""
+import asyncio
+from types import SimpleNamespace
+
+import discord
+
+from sharding import shard_for_guild
+
+def _http_error(cls, status, code, message):
+    response = SimpleNamespace(status=status, reason=message)
+    return cls(response, {"code": code, "message": message})
+
+class FakeHTTP:
+    """Serves requests first-come first-served at `rate` per second with fixed latency"""
+
+    def __init__(self, rate=None, latency=0.0):
+        self.interval = 1 / rate if rate else 0.0
+        self.latency = latency
+        self.next_free = 0.0
+        self.requests = 0
+
+    async def request(self):
+        if self.interval or self.latency:
+            loop = asyncio.get_running_loop()
+            now = loop.time()
+            slot = max(now, self.next_free)
+            self.next_free = slot + self.interval
+            await asyncio.sleep(slot - now + self.latency)
+        self.requests += 1
+
+class FakePermissions:
+    def __init__(self, administrator=False, send_messages=True):
+        self.administrator = administrator
+        self.send_messages = send_messages
+
+class FakeUser:
+    def __init__(self, client, user_id):
+        self.client = client
+        self.id = user_id
+        self.name = f"user{user_id}"
+        self.display_name = self.name
+        self.mention = f"<@{user_id}>"
+        self.bot = False
+
+    async def send(self, content=None, **kwargs):
+        if self.id in self.client.closed_dms:
+            raise _http_error(discord.Forbidden, 403, 50007, "Cannot send messages to this user")
+        await self.client.http_fake.request()
+        self.client.dms.append(self.id)
+
+class FakeMember(FakeUser):
+    def __init__(self, client, user_id, guild, administrator=False):
+        super().__init__(client, user_id)
+        self.guild = guild
+        self.guild_permissions = FakePermissions(administrator=administrator)
+        self.roles = []
+
+class FakeChannel:
+    def __init__(self, client, channel_id, guild):
+        self.client = client
+        self.id = channel_id
+        self.guild = guild
+        self.name = f"channel{channel_id}"
+        self.mention = f"<#{channel_id}>"
+        self.messages = []
+
+    def permissions_for(self, member):
+        return FakePermissions()
+
+    async def send(self, content=None, **kwargs):
+        await self.client.http_fake.request()
+        self.messages.append(content)
+
+class FakeGuild:
+    def __init__(self, client, guild_id, member_ids=(), channel_ids=()):
+        self.client = client
+        self.id = guild_id
+        self.name = f"guild{guild_id}"
+        self.member_ids = set(member_ids)
+        self.channels = {channel_id: FakeChannel(client, channel_id, self) for channel_id in channel_ids}
+        self.me = None
+        self.unavailable = False
+
+    @property
+    def member_count(self):
+        return len(self.member_ids)
+
+    def get_member(self, user_id):
+        return FakeMember(self.client, user_id, self) if user_id in self.member_ids else None
+
+    def get_channel(self, channel_id):
+        return self.channels.get(channel_id)
+
+class FakeClient:
+    """
+    Enough of discord.Client for check_birthdays and the command handlers.
+    `cached_users` are returned by get_user; everyone else needs fetch_user.
+    """
+
+    def __init__(self, http=None):
+        self.http_fake = http or FakeHTTP()
+        self._guilds = {}
+        self.cached_users = set()
+        self.closed_dms = set()
+        self.unknown = set()
+        self.dms = []
+        self.fetches = 0
+        self.user = SimpleNamespace(id=1, name="birthdayboy")
+        self.shard_count = None
+        self.shard_ids = None
+
+    @property
+    def guilds(self):
+        return list(self._guilds.values())
+
+    def add_guild(self, guild):
+        self._guilds[guild.id] = guild
+
+    def get_guild(self, guild_id):
+        return self._guilds.get(guild_id)
+
+    def is_ready(self):
+        return True
+
+    def get_user(self, user_id):
+        return FakeUser(self, user_id) if user_id in self.cached_users else None
+
+    async def fetch_user(self, user_id):
+        self.fetches += 1
+        await self.http_fake.request()
+        if user_id in self.unknown:
+            raise _http_error(discord.NotFound, 404, 10013, "Unknown User")
+        return FakeUser(self, user_id)
+
+class FakeContext:
+    """Command context whose replies go straight to the fake channel"""
+
+    def __init__(self, client, guild, channel, author, command_name=None):
+        self.bot = client
+        self.guild = guild
+        self.channel = channel
+        self.author = author
+        self.command = SimpleNamespace(qualified_name=command_name)
+        self.replies = []
+
+    async def send(self, content=None, **kwargs):
+        self.replies.append(content)
+        await self.channel.send(content, **kwargs)
+
+def build_client(guild_specs, users, http=None, cached_fraction=0.8, closed_dm_fraction=0.02,
+                 shard_count=None, shard_ids=None):
+    """
+    Build a FakeClient from datagen guild specs and users rows.
+    Roughly `cached_fraction` of users are in the client cache and
+    `closed_dm_fraction` have DMs closed, chosen by user ID so runs repeat.
+    With `shard_ids`, the client only sees those shards' guilds, like one
+    process of a sharded cluster.
+    """
+    client = FakeClient(http)
+    if shard_ids is not None:
+        client.shard_count, client.shard_ids = shard_count, list(shard_ids)
+        guild_specs = [spec for spec in guild_specs if shard_for_guild(spec.guild_id, shard_count) in shard_ids]
+    members = {}
+    for user_id, guild_id, *_ in users:
+        members.setdefault(guild_id, []).append(user_id)
+        bucket = user_id % 1000
+        if bucket < cached_fraction * 1000:
+            client.cached_users.add(user_id)
+        if bucket >= 1000 - closed_dm_fraction * 1000:
+            client.closed_dms.add(user_id)
+
+    for spec in guild_specs:
+        channels = [spec.announce_channel] if spec.announce_channel else []
+        client.add_guild(FakeGuild(client, spec.guild_id, members.get(spec.guild_id, ()), channels))
+    return client
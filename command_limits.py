@@ -0,0 +1,241 @@
+import os
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+
+from discord.ext import commands
+
+from outbound import TokenBucket
+
+logger = logging.getLogger('birthday_bot')
+
+# Command rate limits, in commands per second with a burst allowance
+COMMAND_USER_RATE = float(os.getenv("COMMAND_USER_RATE", "0.2"))
+COMMAND_USER_BURST = float(os.getenv("COMMAND_USER_BURST", "3"))
+COMMAND_GUILD_RATE = float(os.getenv("COMMAND_GUILD_RATE", "2"))
+COMMAND_GUILD_BURST = float(os.getenv("COMMAND_GUILD_BURST", "20"))
+COMMAND_LIMITER_MAX_KEYS = int(os.getenv("COMMAND_LIMITER_MAX_KEYS", "50000"))
+
+# Load shedding: writes are shed while recent pool checkout waits or event-loop
+# lag exceed these (0 disables a signal). Mode is "reject" or "defer".
+LOAD_SHED_POOL_WAIT_MS = float(os.getenv("LOAD_SHED_POOL_WAIT_MS", "200"))
+LOAD_SHED_LOOP_LAG_MS = float(os.getenv("LOAD_SHED_LOOP_LAG_MS", "250"))
+LOAD_SHED_MODE = os.getenv("LOAD_SHED_MODE", "reject")
+LOAD_SHED_MAX_DEFER = float(os.getenv("LOAD_SHED_MAX_DEFER", "10"))
+LOAD_SHED_INTERVAL = float(os.getenv("LOAD_SHED_INTERVAL", "1"))
+
+class RateLimited(commands.CheckFailure):
+    """Raised when a user or guild is over its command rate limit"""
+
+    def __init__(self, scope, retry_after):
+        super().__init__(f"{scope} rate limited for {retry_after:.1f}s")
+        self.scope = scope
+        self.retry_after = retry_after
+
+class Overloaded(commands.CheckFailure):
+    """Raised when a write command is shed because the bot is overloaded"""
+
+class KeyedRateLimiter:
+    """
+    One token bucket per key, with bounded memory.
+
+    Buckets that have refilled completely are dropped on the next sweep since
+    they behave exactly like a new bucket. If `max_keys` is still exceeded,
+    the least recently used buckets are dropped.
+    """
+
+    # Seconds between sweeps of idle buckets
+    SWEEP_INTERVAL = 30.0
+
+    def __init__(self, rate, burst, max_keys=COMMAND_LIMITER_MAX_KEYS, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._clock = clock
+        self._buckets = OrderedDict()
+        self._warned = set()
+        self._last_sweep = clock()
+        self.evictions = 0
+
+    def delay(self, key):
+        """Seconds until `key` may act again, 0 if it may act now"""
+        bucket = self._buckets.get(key)
+        return bucket.delay() if bucket else 0.0
+
+    def acquire(self, key):
+        """Take a token for `key`. Call only after delay() returned 0."""
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.burst, self._clock)
+        else:
+            self._buckets.move_to_end(key)
+        bucket.try_acquire()
+        self._warned.discard(key)
+        self._sweep()
+
+    def should_warn(self, key):
+        """True the first time `key` is rejected since it last acted, so floods get one reply"""
+        if key in self._warned:
+            return False
+        self._warned.add(key)
+        return True
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def _sweep(self):
+        now = self._clock()
+        if now - self._last_sweep >= self.SWEEP_INTERVAL:
+            self._last_sweep = now
+            idle = [key for key, bucket in self._buckets.items() if bucket.is_full()]
+            for key in idle:
+                del self._buckets[key]
+                self._warned.discard(key)
+            self.evictions += len(idle)
+        while len(self._buckets) > self.max_keys:
+            key, _ = self._buckets.popitem(last=False)
+            self._warned.discard(key)
+            self.evictions += 1
+
+class CommandLimiter:
+    """Per-user and per-guild command rate limits"""
+
+    def __init__(self, user_rate=COMMAND_USER_RATE, user_burst=COMMAND_USER_BURST,
+                 guild_rate=COMMAND_GUILD_RATE, guild_burst=COMMAND_GUILD_BURST,
+                 max_keys=COMMAND_LIMITER_MAX_KEYS, clock=time.monotonic):
+        self.users = KeyedRateLimiter(user_rate, user_burst, max_keys, clock)
+        self.guilds = KeyedRateLimiter(guild_rate, guild_burst, max_keys, clock)
+        self.rejected = {"user": 0, "guild": 0}
+
+    def check(self, user_id, guild_id):
+        """
+        Admit a command or raise RateLimited. Tokens are only taken when both
+        limits allow it, so a throttled user doesn't use up the guild's budget.
+        Returns True if admitted.
+        """
+        for scope, limiter, key in (("user", self.users, user_id), ("guild", self.guilds, guild_id)):
+            if key is None:
+                continue
+            retry_after = limiter.delay(key)
+            if retry_after > 0:
+                self.rejected[scope] += 1
+                raise RateLimited(scope, retry_after)
+
+        self.users.acquire(user_id)
+        if guild_id is not None:
+            self.guilds.acquire(guild_id)
+        return True
+
+    def should_warn(self, error, user_id, guild_id):
+        """Whether to tell the user about this rejection"""
+        if error.scope == "user":
+            return self.users.should_warn(user_id)
+        return self.guilds.should_warn(guild_id)
+
+    def stats(self):
+        """Get tracked keys, evictions and rejections"""
+        return {
+            "users": len(self.users),
+            "guilds": len(self.guilds),
+            "evictions": self.users.evictions + self.guilds.evictions,
+            "rejected": dict(self.rejected),
+        }
+
+class LoadShedder:
+    """
+    Tracks whether the bot is overloaded from recent pool checkout waits and
+    event-loop lag, sampled every `interval` seconds, and admits or sheds writes.
+    """
+
+    def __init__(self, pool_stats, pool_wait_ms=LOAD_SHED_POOL_WAIT_MS, loop_lag_ms=LOAD_SHED_LOOP_LAG_MS,
+                 mode=LOAD_SHED_MODE, max_defer=LOAD_SHED_MAX_DEFER, interval=LOAD_SHED_INTERVAL):
+        self._pool_stats = pool_stats
+        self.pool_wait_ms = pool_wait_ms
+        self.loop_lag_ms = loop_lag_ms
+        self.mode = mode
+        self.max_defer = max_defer
+        self.interval = interval
+        self.overloaded = False
+        self.reason = None
+        self.shed = 0
+        self.deferred = 0
+        self._last_pool = None
+        self._recovered = None
+        self._task = None
+
+    def start(self):
+        """Start sampling on the running event loop"""
+        if self._task is None or self._task.done():
+            self._recovered = asyncio.Event()
+            self._recovered.set()
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        """Stop sampling"""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def recent_pool_wait_ms(self):
+        """Average checkout wait since the previous sample, None without a pool or checkouts"""
+        stats = self._pool_stats()
+        if "wait_time_total_ms" not in stats:
+            return None
+        current = (stats["checkouts"], stats["wait_time_total_ms"])
+        previous, self._last_pool = self._last_pool, current
+        if previous is None or current[0] <= previous[0]:
+            return None
+        return (current[1] - previous[1]) / (current[0] - previous[0])
+
+    def update(self, loop_lag_ms, pool_wait_ms):
+        """Recompute the overloaded state from one sample"""
+        reason = None
+        if self.loop_lag_ms and loop_lag_ms > self.loop_lag_ms:
+            reason = f"event loop lag {loop_lag_ms:.0f}ms"
+        elif self.pool_wait_ms and pool_wait_ms is not None and pool_wait_ms > self.pool_wait_ms:
+            reason = f"pool wait {pool_wait_ms:.0f}ms"
+
+        if reason and not self.overloaded:
+            logger.warning(f"Overloaded ({reason}), shedding write commands")
+        elif not reason and self.overloaded:
+            logger.info("Load back to normal, accepting write commands")
+        self.overloaded = reason is not None
+        self.reason = reason
+        if self._recovered:
+            if self.overloaded:
+                self._recovered.clear()
+            else:
+                self._recovered.set()
+
+    async def admit(self):
+        """
+        Admit a write or raise Overloaded. In defer mode, waits up to
+        `max_defer` seconds for the overload to clear first.
+        """
+        if not self.overloaded:
+            return True
+        if self.mode == "defer" and self._recovered:
+            self.deferred += 1
+            try:
+                await asyncio.wait_for(self._recovered.wait(), self.max_defer)
+                return True
+            except asyncio.TimeoutError:
+                pass
+        self.shed += 1
+        raise Overloaded(self.reason)
+
+    def stats(self):
+        """Get the current state and shed/deferred counters"""
+        return {"overloaded": self.overloaded, "reason": self.reason, "shed": self.shed, "deferred": self.deferred}
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag_ms = max(0.0, loop.time() - started - self.interval) * 1000
+            try:
+                self.update(lag_ms, self.recent_pool_wait_ms())
+            except Exception as e:
+                logger.error(f"Error sampling load: {e}")
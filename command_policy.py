@@ -0,0 +1,83 @@
+import os
+import time
+import logging
+from collections import namedtuple
+
+from discord.ext import commands
+
+logger = logging.getLogger('birthday_bot')
+
+# Seconds a compiled policy is trusted before the setting is read again
+COMMAND_POLICY_TTL = float(os.getenv("COMMAND_POLICY_TTL", "3600"))
+
+# Compiled form of a guild's command channel setting, channel_id is None when unrestricted
+ChannelPolicy = namedtuple("ChannelPolicy", "channel_id")
+UNRESTRICTED = ChannelPolicy(None)
+
+class WrongChannel(commands.CheckFailure):
+    """Raised by the command channel check after redirecting the user"""
+
+def compile_policy(value):
+    """Turn a stored command_channel setting into a ChannelPolicy"""
+    try:
+        return ChannelPolicy(int(value)) if value else UNRESTRICTED
+    except (TypeError, ValueError):
+        logger.warning(f"Ignoring invalid command_channel setting: {value!r}")
+        return UNRESTRICTED
+
+class CommandChannelGate:
+    """
+    Decides whether a command may run in the channel it was used in.
+
+    Each guild's command_channel setting is loaded with `load_setting(guild_id)`
+    and kept compiled for `ttl` seconds, so commands are decided without touching
+    storage. `is_privileged(member)` lets admins use commands anywhere. Call
+    `set_channel` or `invalidate` whenever the setting changes.
+    """
+
+    def __init__(self, load_setting, is_privileged, ttl=COMMAND_POLICY_TTL, clock=time.monotonic):
+        self._load_setting = load_setting
+        self._is_privileged = is_privileged
+        self.ttl = ttl
+        self._clock = clock
+        self._policies = {}  # guild_id -> (policy, expires_at)
+        self.hits = 0
+        self.misses = 0
+
+    async def policy(self, guild_id):
+        """Get a guild's compiled policy, loading it on first use or once expired"""
+        entry = self._policies.get(guild_id)
+        if entry is not None and entry[1] > self._clock():
+            self.hits += 1
+            return entry[0]
+        self.misses += 1
+        policy = compile_policy(await self._load_setting(guild_id))
+        self._policies[guild_id] = (policy, self._clock() + self.ttl)
+        return policy
+
+    def set_channel(self, guild_id, channel_id):
+        """Record a guild's new command channel, None to allow every channel"""
+        policy = ChannelPolicy(channel_id) if channel_id else UNRESTRICTED
+        self._policies[guild_id] = (policy, self._clock() + self.ttl)
+
+    def invalidate(self, guild_id):
+        """Forget a guild's policy so it's reloaded on next use"""
+        self._policies.pop(guild_id, None)
+
+    async def redirect_for(self, ctx):
+        """
+        Get the channel the user should be sent to instead, or None if the
+        command may run here. A command channel that no longer exists restricts nothing.
+        """
+        if ctx.guild is None:
+            return None
+        policy = await self.policy(ctx.guild.id)
+        if policy.channel_id is None or ctx.channel.id == policy.channel_id:
+            return None
+        if self._is_privileged(ctx.author):
+            return None
+        return ctx.guild.get_channel(policy.channel_id)
+
+    def stats(self):
+        """Get cache size and hit/miss counters"""
+        return {"guilds": len(self._policies), "hits": self.hits, "misses": self.misses}
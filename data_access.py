@@ -1,194 +1,235 @@
-from database import get_connection, release_connection
+"""
+Data access functions used by the bot.
+
+Each function delegates to the storage backend chosen by STORAGE_BACKEND (see
+storage.py). Guild configs are cached in-process in front of every backend.
+"""
+import os
+from storage import get_storage, DEFAULT_GUILD_CONFIG
+from settings_cache import SettingsCache, MISSING
+from metrics import timed
+
+# Delivery ledger kinds
+DELIVERY_DM = "dm"
+DELIVERY_ANNOUNCE = "announce"
+
+# DMs go to a user once however many guilds they're in, so their ledger
+# entries use this in place of a guild ID
+DM_LEDGER_GUILD = 0
+
+# Undeliverable target types
+TARGET_USER = "user"
+TARGET_CHANNEL = "channel"
+
+# In-process cache in front of the guild_config table, one entry per guild
+settings_cache = SettingsCache(
+    max_size=int(os.getenv("SETTINGS_CACHE_SIZE", "100000")),
+    ttl=float(os.getenv("SETTINGS_CACHE_TTL", "300"))
+)
 
 # User operations
+@timed
 def set_birthday(user_id, guild_id, birthday):
-    """Set a user's birthday"""
-    conn = get_connection()
-    try:
-        with conn.cursor() as cur:
-            cur.execute("""
-                INSERT INTO users (user_id, guild_id, birthday)
-                VALUES (%s, %s, %s)
-                ON CONFLICT (user_id, guild_id) 
-                DO UPDATE SET birthday = EXCLUDED.birthday
-            """, (user_id, guild_id, birthday))
-            conn.commit()
-            return True
-    except Exception as e:
-        conn.rollback()
-        print(f"Error setting birthday: {e}")
-        return False
-    finally:
-        release_connection(conn)
+    """Set a user's birthday, encoded with utils.encode_birthday"""
+    return get_storage().set_birthday(user_id, guild_id, birthday)
 
+@timed
 def clear_birthday(user_id, guild_id):
     """Clear a user's birthday"""
-    conn = get_connection()
-    try:
-        with conn.cursor() as cur:
-            cur.execute("""
-                DELETE FROM users
-                WHERE user_id = %s AND guild_id = %s
-            """, (user_id, guild_id))
-            conn.commit()
-            return cur.rowcount > 0
-    except Exception as e:
-        conn.rollback()
-        print(f"Error clearing birthday: {e}")
-        return False
-    finally:
-        release_connection(conn)
+    return get_storage().clear_birthday(user_id, guild_id)
 
+@timed
 def set_birth_year(user_id, guild_id, birth_year):
     """Set a user's birth year"""
-    conn = get_connection()
-    try:
-        with conn.cursor() as cur:
-            cur.execute("""
-                UPDATE users 
-                SET birth_year = %s
-                WHERE user_id = %s AND guild_id = %s
-            """, (birth_year, user_id, guild_id))
-            conn.commit()
-            return cur.rowcount > 0
-    except Exception as e:
-        conn.rollback()
-        print(f"Error setting birth year: {e}")
-        return False
-    finally:
-        release_connection(conn)
+    return get_storage().set_birth_year(user_id, guild_id, birth_year)
 
+@timed
 def toggle_user_setting(user_id, guild_id, setting, value=None):
     """Toggle a user setting or set to a specific value"""
-    valid_settings = ['announce_in_servers', 'receive_dms', 'share_age']
-    if setting not in valid_settings:
-        return False
-    
-    conn = get_connection()
-    try:
-        with conn.cursor() as cur:
-            # If value is None, toggle the current value
-            if value is None:
-                cur.execute(f"""
-                    UPDATE users 
-                    SET {setting} = CASE WHEN {setting} = 1 THEN 0 ELSE 1 END
-                    WHERE user_id = %s AND guild_id = %s
-                    RETURNING {setting}
-                """, (user_id, guild_id))
-                result = cur.fetchone()
-                conn.commit()
-                return result[0] if result else None
-            # Otherwise set to the specified value
-            else:
-                cur.execute(f"""
-                    UPDATE users 
-                    SET {setting} = %s
-                    WHERE user_id = %s AND guild_id = %s
-                """, (value, user_id, guild_id))
-                conn.commit()
-                return value if cur.rowcount > 0 else None
-    except Exception as e:
-        conn.rollback()
-        print(f"Error toggling {setting}: {e}")
-        return None
-    finally:
-        release_connection(conn)
+    return get_storage().toggle_user_setting(user_id, guild_id, setting, value)
 
+@timed
 def get_user_birthday(user_id, guild_id):
     """Get a user's birthday information"""
-    conn = get_connection()
-    try:
-        with conn.cursor() as cur:
-            cur.execute("""
-                SELECT birthday, birth_year, announce_in_servers, receive_dms, share_age
-                FROM users
-                WHERE user_id = %s AND guild_id = %s
-            """, (user_id, guild_id))
-            return cur.fetchone()
-    except Exception as e:
-        print(f"Error getting birthday: {e}")
-        return None
-    finally:
-        release_connection(conn)
-
-def get_birthdays_for_date(date_str):
-    """Get all users with birthdays on a specific date"""
-    conn = get_connection()
-    try:
-        with conn.cursor() as cur:
-            cur.execute("""
-                SELECT user_id, guild_id, birth_year, announce_in_servers, receive_dms, share_age
-                FROM users
-                WHERE birthday = %s
-            """, (date_str,))
-            return cur.fetchall()
-    except Exception as e:
-        print(f"Error getting birthdays for date: {e}")
-        return []
-    finally:
-        release_connection(conn)
-
-# Server settings operations
-def set_server_setting(guild_id, setting, value):
-    """Set a server setting"""
-    conn = get_connection()
-    try:
-        with conn.cursor() as cur:
-            cur.execute("""
-                INSERT INTO settings (guild_id, setting, value)
-                VALUES (%s, %s, %s)
-                ON CONFLICT (guild_id, setting) 
-                DO UPDATE SET value = EXCLUDED.value
-            """, (guild_id, setting, value))
-            conn.commit()
-            return True
-    except Exception as e:
-        conn.rollback()
-        print(f"Error setting server setting: {e}")
-        return False
-    finally:
-        release_connection(conn)
-
-def get_server_setting(guild_id, setting):
-    """Get a server setting"""
-    conn = get_connection()
-    try:
-        with conn.cursor() as cur:
-            cur.execute("""
-                SELECT value
-                FROM settings
-                WHERE guild_id = %s AND setting = %s
-            """, (guild_id, setting))
-            result = cur.fetchone()
-            return result[0] if result else None
-    except Exception as e:
-        print(f"Error getting server setting: {e}")
-        return None
-    finally:
-        release_connection(conn)
+    return get_storage().get_user_birthday(user_id, guild_id)
+
+@timed
+def get_birthdays_for_date(days, dms_only=False, shard=None):
+    """
+    Get all users with birthdays on a specific date, one row each for their
+    lowest guild ID, so a user in several guilds is only DMed once.
+    days is the date's (first, last) range of encoded birthdays from utils.birthday_days.
+    shard, a sharding.ShardFilter, limits rows to users whose lowest guild this process owns.
+    """
+    return get_storage().get_birthdays_for_date(days, dms_only, shard)
+
+@timed
+def get_birthdays_for_guilds(guild_days, announce_only=False):
+    """
+    Get birthdays for several guilds, each on its own local date, in one query.
+    guild_days maps guild_id to its date's (first, last) range from utils.birthday_days.
+    """
+    return get_storage().get_birthdays_for_guilds(guild_days, announce_only)
 
+@timed
+def list_guild_birthdays(guild_id, days, after=None, limit=25):
+    """
+    List a guild's birthdays in a (first, last) range of encoded birthdays as
+    (user_id, birthday, birth_year, share_age) rows, ordered by (birthday, user_id).
+    after is the (birthday, user_id) of the previous page's last row, so each
+    page is one index range scan however large the guild is. Members who turned
+    off server announcements are left out.
+    """
+    return get_storage().list_guild_birthdays(guild_id, days, after, limit)
+
+# Guild config operations
+@timed
+def get_guild_config(guild_id):
+    """Get a guild's GuildConfig, the defaults if it has never been configured"""
+    return _cached_guild_configs([guild_id])[guild_id]
+
+@timed
+def get_guild_configs(guild_ids):
+    """
+    Get the GuildConfig of each guild in guild_ids as a dict.
+    Guilds that aren't cached are read in one query. Call it with every guild
+    at startup to warm the cache.
+    """
+    return _cached_guild_configs(guild_ids)
+
+def _cached_guild_configs(guild_ids):
+    configs = {}
+    uncached = []
+    for guild_id in guild_ids:
+        cached = settings_cache.get(guild_id)
+        if cached is MISSING:
+            uncached.append(guild_id)
+        else:
+            configs[guild_id] = cached
+    if not uncached:
+        return configs
+    
+    loaded = get_storage().get_guild_configs(uncached)
+    if loaded is MISSING:
+        # The lookup failed, use the defaults without caching them
+        configs.update(dict.fromkeys(uncached, DEFAULT_GUILD_CONFIG))
+        return configs
+    for guild_id in uncached:
+        configs[guild_id] = loaded.get(guild_id, DEFAULT_GUILD_CONFIG)
+        settings_cache.set(guild_id, configs[guild_id])
+    return configs
+
+@timed
+def update_guild_config(guild_id, **changes):
+    """
+    Change some fields of a guild's config, e.g. announce_channel=channel_id.
+    Returns the new GuildConfig, or None on error.
+    """
+    config = get_storage().update_guild_config(guild_id, changes)
+    if config is None:
+        settings_cache.invalidate(guild_id)
+    else:
+        settings_cache.set(guild_id, config)
+    return config
+
+@timed
 def clean_up_user_data(user_id, guild_id=None):
-    """Remove user data from database"""
-    conn = get_connection()
-    try:
-        with conn.cursor() as cur:
-            if guild_id:
-                # Remove user from specific guild
-                cur.execute("""
-                    DELETE FROM users
-                    WHERE user_id = %s AND guild_id = %s
-                """, (user_id, guild_id))
-            else:
-                # Remove user from all guilds
-                cur.execute("""
-                    DELETE FROM users
-                    WHERE user_id = %s
-                """, (user_id,))
-            conn.commit()
-            return cur.rowcount
-    except Exception as e:
-        conn.rollback()
-        print(f"Error cleaning up user data: {e}")
-        return 0
-    finally:
-        release_connection(conn) 
\ No newline at end of file
+    """Remove user data from database. Returns how many guild memberships were removed."""
+    return get_storage().clean_up_user_data(user_id, guild_id)
+
+# Delivery ledger operations
+@timed
+def get_delivered(keys):
+    """
+    Check which deliveries have already been made.
+    keys is a list of (user_id, guild_id, kind, delivery_date) tuples.
+    Returns the set of keys that are already in the ledger.
+    """
+    return get_storage().get_delivered(keys)
+
+@timed
+def record_deliveries(keys):
+    """
+    Record completed deliveries in the ledger.
+    keys is a list of (user_id, guild_id, kind, delivery_date) tuples.
+    """
+    return get_storage().record_deliveries(keys)
+
+@timed
+def prune_deliveries(before_date):
+    """Remove ledger entries older than the given date"""
+    return get_storage().prune_deliveries(before_date)
+
+# Undeliverable target operations
+@timed
+def mark_undeliverable(target_type, target_id, guild_id, reason, ttl_seconds):
+    """Record that a user or channel can't be delivered to for `ttl_seconds`"""
+    return get_storage().mark_undeliverable(target_type, target_id, guild_id, reason, ttl_seconds)
+
+@timed
+def get_undeliverable(target_type, target_ids):
+    """Get which of the given targets are currently undeliverable"""
+    return get_storage().get_undeliverable(target_type, target_ids)
+
+@timed
+def clear_undeliverable(target_type, target_id):
+    """Forget that a target was undeliverable"""
+    return get_storage().clear_undeliverable(target_type, target_id)
+
+@timed
+def list_undeliverable(guild_id, limit=25):
+    """List a guild's undeliverable channels and members"""
+    return get_storage().list_undeliverable(guild_id, limit)
+
+@timed
+def prune_undeliverable():
+    """Remove expired undeliverable entries"""
+    return get_storage().prune_undeliverable()
+
+# Delivery job operations
+@timed
+def enqueue_jobs(jobs):
+    """
+    Queue delivery jobs, given as (kind, guild_id, target_id, delivery_date, payload)
+    tuples with a JSON-serializable payload dict. A job that's already queued for the
+    same kind, guild, target and date is left alone, unless it's an announcement and
+    the new payload has members the queued one lacks: those are merged in (see
+    storage.merge_job_payload) and the job is made pending again. Returns how many
+    jobs were added or merged into.
+    """
+    return get_storage().enqueue_jobs(jobs)
+
+@timed
+def claim_jobs(limit, lease_seconds, shard=None):
+    """
+    Claim up to `limit` due jobs, skipping any another worker is claiming.
+    Claimed jobs are hidden for `lease_seconds`, after which they're due again unless
+    completed, so a crashed worker's jobs are picked up by another. Returns
+    (job_id, kind, guild_id, target_id, delivery_date, payload, attempts) tuples.
+    """
+    return get_storage().claim_jobs(limit, lease_seconds, shard)
+
+@timed
+def complete_jobs(job_ids):
+    """Mark jobs as done"""
+    return get_storage().complete_jobs(job_ids)
+
+@timed
+def retry_job(job_id, delay_seconds, error):
+    """Make a failed job due again in `delay_seconds`"""
+    return get_storage().retry_job(job_id, delay_seconds, error)
+
+@timed
+def fail_job(job_id, error):
+    """Give up on a job"""
+    return get_storage().fail_job(job_id, error)
+
+@timed
+def prune_jobs(before_date):
+    """Remove jobs for delivery dates before the given date"""
+    return get_storage().prune_jobs(before_date)
+
+@timed
+def job_counts():
+    """Count jobs by status (pending, done, failed)"""
+    return get_storage().job_counts()
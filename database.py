@@ -1,22 +1,23 @@
 import os
+import random
+import asyncio
 import psycopg2
-from psycopg2 import pool
+from contextlib import contextmanager
 from dotenv import load_dotenv
 import logging
 import time
 
-# Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+from db_pool import ConnectionPool
+from db_executor import run_db
+from metrics import db_errors
+
+# Logging is configured by the entry point, importing this module has no side effects
 logger = logging.getLogger('database')
 
 load_dotenv()
 
 # Get environment - default to dev for initial connection
 ENVIRONMENT = os.getenv("ENVIRONMENT", "dev")
-logger.info(f"Current environment: {ENVIRONMENT}")
 
 # Override to dev if database doesn't exist yet
 DB_NAME = f"birthday_bot_{ENVIRONMENT.lower()}"
@@ -30,73 +31,151 @@ DB_CONFIG = {
     "database": "birthday_bot_dev"  # Always use dev database first
 }
 
-# Log connection parameters (without password)
-logger.info(f"Connecting to database at {DB_CONFIG['host']}:{DB_CONFIG['port']} as {DB_CONFIG['user']}")
-logger.info(f"Using database: {DB_CONFIG['database']}")
+# Connection pool config
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_HEALTH_CHECK_AFTER = float(os.getenv("DB_POOL_HEALTH_CHECK_AFTER", "30"))
+DB_POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "3600"))
+
+# Connection retries: exponential backoff with full jitter, capped at DB_CONNECT_MAX_DELAY
+DB_CONNECT_RETRIES = int(os.getenv("DB_CONNECT_RETRIES", "5"))
+DB_CONNECT_BASE_DELAY = float(os.getenv("DB_CONNECT_BASE_DELAY", "0.5"))
+DB_CONNECT_MAX_DELAY = float(os.getenv("DB_CONNECT_MAX_DELAY", "30"))
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "5"))
+
+# TCP keepalives so a dropped connection is noticed in about
+# idle + interval * count seconds instead of the OS default of hours
+DB_KEEPALIVES_IDLE = int(os.getenv("DB_KEEPALIVES_IDLE", "10"))
+DB_KEEPALIVES_INTERVAL = int(os.getenv("DB_KEEPALIVES_INTERVAL", "5"))
+DB_KEEPALIVES_COUNT = int(os.getenv("DB_KEEPALIVES_COUNT", "3"))
+
+# Created by init_pool() or start_database(), never at import
+connection_pool = None
+
+def backoff_delay(attempt, base_delay=DB_CONNECT_BASE_DELAY, max_delay=DB_CONNECT_MAX_DELAY):
+    """Seconds to wait before retry number `attempt` (1-based)"""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+
+def _create_missing_databases():
+    """Connect to the server without a database and create any missing bot databases"""
+    try:
+        logger.info("Trying basic connection to PostgreSQL server...")
+        conn = psycopg2.connect(
+            host=DB_CONFIG["host"],
+            port=DB_CONFIG["port"],
+            user=DB_CONFIG["user"],
+            password=DB_CONFIG["password"],
+            connect_timeout=DB_CONNECT_TIMEOUT,
+        )
+        logger.info("Basic connection successful")
+        
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            for name in ("birthday_bot_dev", "birthday_bot_test", "birthday_bot_prod"):
+                cur.execute("SELECT 1 FROM pg_database WHERE datname = %s", (name,))
+                if cur.fetchone() is None:
+                    logger.info(f"Creating {name} database")
+                    cur.execute(f"CREATE DATABASE {name}")
+        conn.close()
+    except Exception as e:
+        logger.error(f"Basic connection failed: {e}")
+
+def _open_pool():
+    """Make one attempt at creating the pool. Returns None on failure."""
+    try:
+        # Thread-safe pool so connections can be used from the database executor
+        pool_obj = ConnectionPool(
+            DB_POOL_MIN, DB_POOL_MAX,
+            timeout=DB_POOL_TIMEOUT,
+            health_check_after=DB_POOL_HEALTH_CHECK_AFTER,
+            max_lifetime=DB_POOL_MAX_LIFETIME,
+            host=DB_CONFIG["host"],
+            port=DB_CONFIG["port"],
+            user=DB_CONFIG["user"],
+            password=DB_CONFIG["password"],
+            database=DB_CONFIG["database"],
+            connect_timeout=DB_CONNECT_TIMEOUT,
+            keepalives=1,
+            keepalives_idle=DB_KEEPALIVES_IDLE,
+            keepalives_interval=DB_KEEPALIVES_INTERVAL,
+            keepalives_count=DB_KEEPALIVES_COUNT,
+        )
+        logger.info("Database connection pool created successfully")
+        return pool_obj
+    except Exception as e:
+        logger.error(f"Could not create connection pool: {e}")
+        _create_missing_databases()
+        return None
 
-# Create connection pool with retry
-def create_connection_pool(max_retries=5, retry_delay=5):
-    """Create database connection pool with retries"""
+def create_connection_pool(max_retries=DB_CONNECT_RETRIES):
+    """Create database connection pool, retrying with backoff. Blocks the calling thread."""
+    # Log connection parameters (without password)
+    logger.info(f"Connecting to database {DB_CONFIG['database']} at {DB_CONFIG['host']}:{DB_CONFIG['port']} as {DB_CONFIG['user']}")
     for attempt in range(1, max_retries + 1):
-        try:
-            logger.info(f"Connection attempt {attempt}/{max_retries}")
-            pool_obj = pool.SimpleConnectionPool(
-                1, 10,
-                host=DB_CONFIG["host"],
-                port=DB_CONFIG["port"],
-                user=DB_CONFIG["user"],
-                password=DB_CONFIG["password"],
-                database=DB_CONFIG["database"]
-            )
-            logger.info("Database connection pool created successfully")
+        logger.info(f"Connection attempt {attempt}/{max_retries}")
+        pool_obj = _open_pool()
+        if pool_obj:
             return pool_obj
-        except Exception as e:
-            logger.error(f"Connection attempt {attempt} failed: {e}")
-            
-            # Try basic connection to see if server is reachable
-            try:
-                logger.info("Trying basic connection to PostgreSQL server...")
-                conn = psycopg2.connect(
-                    host=DB_CONFIG["host"],
-                    user=DB_CONFIG["user"],
-                    password=DB_CONFIG["password"],
-                )
-                logger.info("Basic connection successful")
-                
-                # Check if database exists
-                conn.autocommit = True
-                with conn.cursor() as cur:
-                    # Create the dev database if it doesn't exist
-                    cur.execute("SELECT 1 FROM pg_database WHERE datname = %s", ("birthday_bot_dev",))
-                    if cur.fetchone() is None:
-                        logger.info("Creating birthday_bot_dev database")
-                        cur.execute("CREATE DATABASE birthday_bot_dev")
-                    
-                    # Also create test and prod databases if they don't exist
-                    cur.execute("SELECT 1 FROM pg_database WHERE datname = %s", ("birthday_bot_test",))
-                    if cur.fetchone() is None:
-                        logger.info("Creating birthday_bot_test database")
-                        cur.execute("CREATE DATABASE birthday_bot_test")
-                        
-                    cur.execute("SELECT 1 FROM pg_database WHERE datname = %s", ("birthday_bot_prod",))
-                    if cur.fetchone() is None:
-                        logger.info("Creating birthday_bot_prod database")
-                        cur.execute("CREATE DATABASE birthday_bot_prod")
-                
-                conn.close()
-                logger.info(f"Retrying connection to database {DB_CONFIG['database']} in {retry_delay} seconds")
-            except Exception as e2:
-                logger.error(f"Basic connection failed: {e2}")
-            
-            if attempt < max_retries:
-                logger.info(f"Retrying in {retry_delay} seconds...")
-                time.sleep(retry_delay)
-            else:
-                logger.error("Maximum retry attempts reached")
-                return None
-
-# Initialize connection pool with retries
-connection_pool = create_connection_pool()
+        if attempt < max_retries:
+            delay = backoff_delay(attempt)
+            logger.info(f"Retrying in {delay:.1f} seconds...")
+            time.sleep(delay)
+    logger.error("Maximum retry attempts reached")
+    return None
+
+def init_pool(max_retries=DB_CONNECT_RETRIES):
+    """Create the global connection pool if it doesn't exist yet. Returns True if it's available."""
+    global connection_pool
+    if connection_pool is None:
+        connection_pool = create_connection_pool(max_retries)
+    return connection_pool is not None
+
+async def start_database(max_retries=None):
+    """
+    Create the pool and schema on the database executor without blocking the event loop.
+    Retries connecting with backoff until it succeeds, or `max_retries` attempts. Returns
+    True once ready, and raises if the schema or a migration fails.
+    """
+    global connection_pool
+    logger.info(f"Connecting to database {DB_CONFIG['database']} at {DB_CONFIG['host']}:{DB_CONFIG['port']} as {DB_CONFIG['user']}")
+    started = time.perf_counter()
+    attempt = 0
+    while connection_pool is None:
+        attempt += 1
+        pool_obj = await run_db(_open_pool)
+        if pool_obj:
+            connection_pool = pool_obj
+            break
+        if max_retries is not None and attempt >= max_retries:
+            logger.error("Maximum retry attempts reached")
+            return False
+        delay = backoff_delay(attempt)
+        logger.info(f"Connection attempt {attempt} failed, retrying in {delay:.1f} seconds...")
+        await asyncio.sleep(delay)
+    
+    await run_db(initialize_database)
+    logger.info(f"Database ready in {time.perf_counter() - started:.2f}s")
+    return True
+
+def check_connection():
+    """Open and close a single connection, for health checks. Returns True on success."""
+    try:
+        conn = psycopg2.connect(
+            host=DB_CONFIG["host"],
+            port=DB_CONFIG["port"],
+            user=DB_CONFIG["user"],
+            password=DB_CONFIG["password"],
+            database=DB_CONFIG["database"],
+            connect_timeout=DB_CONNECT_TIMEOUT,
+        )
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        conn.close()
+        return True
+    except Exception as e:
+        logger.error(f"Health check failed: {e}")
+        return False
 
 def get_connection():
     """Get a connection from the pool"""
@@ -110,52 +189,267 @@ def get_connection():
         logger.error("Connection pool is not initialized")
         return None
 
-def release_connection(conn):
-    """Return a connection to the pool"""
+def release_connection(conn, close=False):
+    """Return a connection to the pool, closing it instead of reusing it if `close`"""
     if connection_pool and conn:
         try:
-            connection_pool.putconn(conn)
+            connection_pool.putconn(conn, close=close)
         except Exception as e:
             logger.error(f"Error returning connection to pool: {e}")
 
+@contextmanager
+def connection():
+    """
+    Check out a pooled connection for the duration of a with block.
+    Rolls back on error and always returns the connection to the pool.
+    Raises if no connection is available within the pool timeout.
+    """
+    if not connection_pool:
+        raise RuntimeError("Connection pool is not initialized")
+    
+    conn = connection_pool.getconn()
+    try:
+        yield conn
+    except Exception:
+        db_errors.inc()
+        if not conn.closed:
+            conn.rollback()
+        raise
+    finally:
+        release_connection(conn)
+
+def pool_stats():
+    """Get connection pool usage and checkout counters"""
+    return connection_pool.stats() if connection_pool else {}
+
+# Pool stats exposed as metrics: stat -> (type, help)
+POOL_METRICS = {
+    "size": ("gauge", "Open connections in the pool"),
+    "idle": ("gauge", "Idle connections in the pool"),
+    "in_use": ("gauge", "Connections checked out of the pool"),
+    "waiting": ("gauge", "Threads waiting for a connection"),
+    "checkouts": ("counter", "Connections checked out since start"),
+    "timeouts": ("counter", "Checkouts that timed out waiting for a connection"),
+    "connect_failures": ("counter", "Failed attempts to open a connection"),
+    "recycled": ("counter", "Connections closed for being dead or too old"),
+    "wait_time_total_ms": ("counter", "Total checkout wait in milliseconds"),
+    "wait_time_max_ms": ("gauge", "Longest checkout wait in milliseconds"),
+}
+
+def pool_metrics():
+    """Pool stats as (name, type, help, value) samples for metrics.add_collector"""
+    stats = pool_stats()
+    for stat, (metric_type, documentation) in POOL_METRICS.items():
+        if stat in stats:
+            suffix = "_total" if metric_type == "counter" else ""
+            yield f"birthday_bot_db_pool_{stat}{suffix}", metric_type, documentation, stats[stat]
+
+# Birthday-first for date lookups, (guild_id, birthday) for per-guild lookups,
+# partial indexes covering only the rows that get a DM or an announcement,
+# and a partial index on the pending jobs the delivery workers claim
+SCHEMA_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_profiles_birthday ON profiles (birthday)",
+    "CREATE INDEX IF NOT EXISTS idx_profiles_birthday_dms ON profiles (birthday) WHERE receive_dms = 1",
+    "CREATE INDEX IF NOT EXISTS idx_memberships_guild_birthday ON memberships (guild_id, birthday)",
+    # Serves announcements and, with user_id for keyset cursors, guild birthday listings
+    "CREATE INDEX IF NOT EXISTS idx_memberships_guild_listing ON memberships (guild_id, birthday, user_id) WHERE announce_in_servers = 1",
+    "CREATE INDEX IF NOT EXISTS idx_deliveries_date ON deliveries (delivery_date)",
+    "CREATE INDEX IF NOT EXISTS idx_undeliverable_guild ON undeliverable (guild_id)",
+    "CREATE INDEX IF NOT EXISTS idx_delivery_jobs_due ON delivery_jobs (run_at) WHERE status = 'pending'",
+    "CREATE INDEX IF NOT EXISTS idx_delivery_jobs_date ON delivery_jobs (delivery_date)",
+]
+
+# SQL for utils.encode_birthday, the day of the leap year of an MMDD string
+MMDD_TO_DAY = "EXTRACT(DOY FROM to_date('2000' || {column}, 'YYYYMMDD'))::smallint"
+
+def create_schema(cur):
+    """Create tables and indexes if they don't exist"""
+    # Serialize replicas starting together for the whole transaction, so tables
+    # are created and each migration runs once
+    cur.execute("SELECT pg_advisory_xact_lock(hashtext('birthday_bot.migrate'))")
+    
+    # Create profiles table, one row per user wherever they registered
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS profiles (
+            user_id BIGINT PRIMARY KEY,
+            birthday SMALLINT NOT NULL CHECK (birthday BETWEEN 1 AND 366),
+            birth_year INTEGER,
+            receive_dms INTEGER DEFAULT 1,
+            share_age INTEGER DEFAULT 0
+        )
+    """)
+    
+    # Create memberships table, one narrow row per guild a user registered in.
+    # birthday is copied from profiles so per-guild date scans use one index.
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS memberships (
+            user_id BIGINT NOT NULL REFERENCES profiles (user_id) ON DELETE CASCADE,
+            guild_id BIGINT NOT NULL,
+            birthday SMALLINT NOT NULL CHECK (birthday BETWEEN 1 AND 366),
+            announce_in_servers INTEGER DEFAULT 1,
+            PRIMARY KEY (user_id, guild_id)
+        )
+    """)
+    
+    # Create guild config table, one typed row per configured guild
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS guild_config (
+            guild_id BIGINT PRIMARY KEY,
+            timezone VARCHAR(64),
+            announce_channel BIGINT,
+            command_channel BIGINT,
+            mention_everyone BOOLEAN NOT NULL DEFAULT FALSE,
+            coalesce_announcements BOOLEAN NOT NULL DEFAULT FALSE
+        )
+    """)
+    
+    # Create delivery ledger so each birthday DM/announcement is sent once
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS deliveries (
+            user_id BIGINT NOT NULL,
+            guild_id BIGINT NOT NULL,
+            kind VARCHAR(16) NOT NULL,
+            delivery_date DATE NOT NULL,
+            delivered_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (user_id, guild_id, kind, delivery_date)
+        )
+    """)
+    
+    # Create record of DM recipients and channels that can't be delivered to
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS undeliverable (
+            target_type VARCHAR(16) NOT NULL,
+            target_id BIGINT NOT NULL,
+            guild_id BIGINT,
+            reason TEXT NOT NULL,
+            failed_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            expires_at TIMESTAMPTZ NOT NULL,
+            PRIMARY KEY (target_type, target_id)
+        )
+    """)
+    
+    # Create queue of birthday deliveries claimed by the delivery workers
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS delivery_jobs (
+            id BIGSERIAL PRIMARY KEY,
+            kind VARCHAR(16) NOT NULL,
+            guild_id BIGINT NOT NULL,
+            target_id BIGINT NOT NULL,
+            delivery_date DATE NOT NULL,
+            payload JSONB NOT NULL,
+            status VARCHAR(8) NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            run_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            last_error TEXT,
+            UNIQUE (kind, guild_id, target_id, delivery_date)
+        )
+    """)
+    
+    migrate_birthday_encoding(cur)
+    migrate_listing_index(cur)
+    migrate_users_table(cur)
+    migrate_settings_table(cur)
+    
+    # Indexes for the birthday lookups run by check_birthdays
+    for statement in SCHEMA_INDEXES:
+        cur.execute(statement)
+
+def migrate_birthday_encoding(cur):
+    """
+    Convert MMDD VARCHAR birthday columns to their SMALLINT day of the leap
+    year, the encoding in utils.encode_birthday. Indexes are rebuilt with them.
+    """
+    cur.execute("""
+        SELECT table_name FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name IN ('profiles', 'memberships')
+          AND column_name = 'birthday' AND data_type = 'character varying'
+    """)
+    for (table,) in cur.fetchall():
+        cur.execute(f"""
+            ALTER TABLE {table}
+            ALTER COLUMN birthday TYPE SMALLINT USING {MMDD_TO_DAY.format(column="birthday")},
+            ADD CHECK (birthday BETWEEN 1 AND 366)
+        """)
+        logger.info(f"Converted {table}.birthday to day of the year")
+
+def migrate_listing_index(cur):
+    """Drop the announcement index that idx_memberships_guild_listing replaced"""
+    cur.execute("SELECT to_regclass('idx_memberships_guild_birthday_announce') IS NOT NULL")
+    if cur.fetchone()[0]:
+        cur.execute("DROP INDEX idx_memberships_guild_birthday_announce")
+        logger.info("Dropped idx_memberships_guild_birthday_announce, replaced by idx_memberships_guild_listing")
+
+def migrate_users_table(cur):
+    """
+    Move rows from the old per-guild users table into profiles and memberships,
+    then rename it to users_premigration so it's only migrated once. A user's
+    row in their lowest guild ID supplies their profile.
+    """
+    cur.execute("SELECT to_regclass('users') IS NOT NULL")
+    if not cur.fetchone()[0]:
+        return
+    
+    cur.execute(f"""
+        INSERT INTO profiles (user_id, birthday, birth_year, receive_dms, share_age)
+        SELECT DISTINCT ON (user_id) user_id, {MMDD_TO_DAY.format(column="birthday")}, birth_year, receive_dms, share_age
+        FROM users
+        ORDER BY user_id, guild_id
+        ON CONFLICT (user_id) DO NOTHING
+    """)
+    profiles = cur.rowcount
+    cur.execute("""
+        INSERT INTO memberships (user_id, guild_id, birthday, announce_in_servers)
+        SELECT u.user_id, u.guild_id, p.birthday, u.announce_in_servers
+        FROM users u
+        JOIN profiles p ON p.user_id = u.user_id
+        ON CONFLICT (user_id, guild_id) DO NOTHING
+    """)
+    memberships = cur.rowcount
+    cur.execute("ALTER TABLE users RENAME TO users_premigration")
+    logger.info(f"Migrated users table into {profiles} profiles and {memberships} memberships")
+
+def migrate_settings_table(cur):
+    """
+    Pivot the old key/value settings table into guild_config, then rename it
+    to settings_premigration so it's only migrated once. Channel values that
+    aren't IDs are dropped rather than failing startup.
+    """
+    cur.execute("SELECT to_regclass('settings') IS NOT NULL")
+    if not cur.fetchone()[0]:
+        return
+    
+    cur.execute("""
+        INSERT INTO guild_config (guild_id, timezone, announce_channel, command_channel,
+                                  mention_everyone, coalesce_announcements)
+        SELECT guild_id,
+               max(NULLIF(value, '')) FILTER (WHERE setting = 'timezone'),
+               max(CASE WHEN value ~ '^[0-9]{1,18}$' THEN value::bigint END) FILTER (WHERE setting = 'announce_channel'),
+               max(CASE WHEN value ~ '^[0-9]{1,18}$' THEN value::bigint END) FILTER (WHERE setting = 'command_channel'),
+               COALESCE(bool_or(value = '1') FILTER (WHERE setting = 'mention_everyone'), FALSE),
+               COALESCE(bool_or(value = '1') FILTER (WHERE setting = 'coalesce_announcements'), FALSE)
+        FROM settings
+        GROUP BY guild_id
+        ON CONFLICT (guild_id) DO NOTHING
+    """)
+    guilds = cur.rowcount
+    cur.execute("ALTER TABLE settings RENAME TO settings_premigration")
+    logger.info(f"Migrated settings table into {guilds} guild configs")
+
 def initialize_database():
-    """Initialize database schema for a guild"""
+    """Initialize database schema. Raises if it can't, rather than run on a half-built schema."""
     conn = get_connection()
     if not conn:
-        logger.error("Cannot initialize database - no connection available")
-        return
+        raise RuntimeError("Cannot initialize database - no connection available")
     
     try:
         with conn.cursor() as cur:
-            # Create users table
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    user_id BIGINT PRIMARY KEY,
-                    guild_id BIGINT NOT NULL,
-                    birthday VARCHAR(4) NOT NULL,
-                    birth_year INTEGER,
-                    announce_in_servers INTEGER DEFAULT 1,
-                    receive_dms INTEGER DEFAULT 1,
-                    share_age INTEGER DEFAULT 0,
-                    UNIQUE (user_id, guild_id)
-                )
-            """)
-            
-            # Create settings table
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS settings (
-                    guild_id BIGINT NOT NULL,
-                    setting VARCHAR(50) NOT NULL,
-                    value TEXT,
-                    PRIMARY KEY (guild_id, setting)
-                )
-            """)
-            
+            create_schema(cur)
             conn.commit()
             logger.info("Database tables initialized successfully")
     except Exception as e:
         conn.rollback()
         logger.error(f"Database initialization error: {e}")
+        raise
     finally:
         release_connection(conn)
 
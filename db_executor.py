@@ -0,0 +1,40 @@
+import os
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+logger = logging.getLogger('database')
+
+# Number of worker threads used for blocking database calls. Keep this at or
+# below the connection pool's maximum size so every worker can hold a connection.
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", "8"))
+
+_executor = None
+
+def get_executor():
+    """Get the shared executor for database calls, creating it on first use"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=DB_EXECUTOR_WORKERS,
+            thread_name_prefix="db"
+        )
+        logger.info(f"Database executor started with {DB_EXECUTOR_WORKERS} workers")
+    return _executor
+
+async def run_db(func, *args, **kwargs):
+    """
+    Run a blocking database function in the database executor.
+    Returns the function's result without blocking the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), partial(func, *args, **kwargs))
+
+def shutdown_executor(wait=True):
+    """Stop the database executor"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=wait)
+        _executor = None
+        logger.info("Database executor stopped")
@@ -0,0 +1,199 @@
+import time
+import logging
+import threading
+from collections import deque
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+
+logger = logging.getLogger('database')
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available within the checkout timeout"""
+
+class ConnectionPool:
+    """
+    Thread-safe psycopg2 connection pool.
+
+    Keeps between `minconn` and `maxconn` connections. A checkout waits up to
+    `timeout` seconds for a free connection instead of failing straight away.
+    Connections idle for longer than `health_check_after` seconds are pinged
+    before being handed out, and connections older than `max_lifetime` seconds
+    or found dead are closed and replaced.
+    """
+
+    def __init__(self, minconn, maxconn, timeout=10.0, health_check_after=30.0, max_lifetime=3600.0,
+                 connect=psycopg2.connect, clock=time.monotonic, **connect_kwargs):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.health_check_after = health_check_after
+        self.max_lifetime = max_lifetime
+        self._connect_func = connect
+        self._connect_kwargs = connect_kwargs
+        self._clock = clock
+        self._lock = threading.Condition()
+        self._idle = deque()  # (conn, created_at, returned_at)
+        self._in_use = {}     # id(conn) -> created_at
+        self._opening = 0
+        self._closed = False
+
+        self.checkouts = 0
+        self.timeouts = 0
+        self.connect_failures = 0
+        self.recycled = 0
+        self.waiting = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+        for _ in range(minconn):
+            conn = self._connect()
+            now = self._clock()
+            self._idle.append((conn, now, now))
+
+    def _connect(self):
+        try:
+            return self._connect_func(**self._connect_kwargs)
+        except Exception:
+            with self._lock:
+                self.connect_failures += 1
+            raise
+
+    def _size(self):
+        return len(self._idle) + len(self._in_use) + self._opening
+
+    def _is_healthy(self, conn, created_at, returned_at):
+        """Check a connection before handing it out"""
+        now = self._clock()
+        if conn.closed:
+            return False
+        if self.max_lifetime and now - created_at > self.max_lifetime:
+            return False
+        if now - returned_at > self.health_check_after:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+                conn.rollback()
+            except Exception:
+                return False
+        return True
+
+    def _discard(self, conn):
+        self.recycled += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def getconn(self, timeout=None):
+        """
+        Check out a connection, waiting up to `timeout` seconds (the pool's
+        default if None) for one to become free. Raises PoolTimeout on expiry.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        started = self._clock()
+        deadline = started + timeout
+
+        while True:
+            with self._lock:
+                if self._closed:
+                    raise PoolError("connection pool is closed")
+
+                self.waiting += 1
+                try:
+                    while not self._idle and self._size() >= self.maxconn:
+                        remaining = deadline - self._clock()
+                        if remaining <= 0:
+                            self.timeouts += 1
+                            raise PoolTimeout(f"no connection available within {timeout}s")
+                        self._lock.wait(remaining)
+                finally:
+                    self.waiting -= 1
+
+                if self._idle:
+                    conn, created_at, returned_at = self._idle.pop()
+                    self._in_use[id(conn)] = created_at
+                else:
+                    conn = None
+                    self._opening += 1
+
+            if conn is not None:
+                # Health checks run outside the lock since they may hit the network
+                if self._is_healthy(conn, created_at, returned_at):
+                    break
+                with self._lock:
+                    del self._in_use[id(conn)]
+                    self._discard(conn)
+                    self._lock.notify()
+                continue
+
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._lock:
+                    self._opening -= 1
+                    self._lock.notify()
+                raise
+            with self._lock:
+                self._opening -= 1
+                self._in_use[id(conn)] = self._clock()
+            break
+
+        waited = self._clock() - started
+        with self._lock:
+            self.checkouts += 1
+            self.wait_time_total += waited
+            self.wait_time_max = max(self.wait_time_max, waited)
+        return conn
+
+    def putconn(self, conn, close=False):
+        """Return a connection, rolling back any open transaction"""
+        if not close and not conn.closed:
+            status = conn.get_transaction_status()
+            if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                close = True
+            elif status != extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except Exception:
+                    close = True
+
+        with self._lock:
+            created_at = self._in_use.pop(id(conn), None)
+            if created_at is None:
+                raise PoolError("trying to put unkeyed connection")
+            if close or conn.closed or self._closed:
+                self._discard(conn)
+            else:
+                self._idle.append((conn, created_at, self._clock()))
+            self._lock.notify()
+
+    def closeall(self):
+        """Close every idle connection and refuse new checkouts"""
+        with self._lock:
+            self._closed = True
+            while self._idle:
+                conn, _, _ = self._idle.pop()
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+            self._lock.notify_all()
+
+    def stats(self):
+        """Get pool usage and checkout counters"""
+        with self._lock:
+            return {
+                "size": self._size(),
+                "idle": len(self._idle),
+                "in_use": len(self._in_use),
+                "waiting": self.waiting,
+                "checkouts": self.checkouts,
+                "wait_time_total_ms": round(self.wait_time_total * 1000, 2),
+                "wait_time_avg_ms": round(self.wait_time_total / self.checkouts * 1000, 2) if self.checkouts else 0.0,
+                "wait_time_max_ms": round(self.wait_time_max * 1000, 2),
+                "timeouts": self.timeouts,
+                "connect_failures": self.connect_failures,
+                "recycled": self.recycled,
+            }
@@ -0,0 +1,122 @@
+import os
+import asyncio
+import logging
+
+import metrics
+from database import backoff_delay
+from async_data_access import claim_jobs, complete_jobs, retry_job, fail_job
+
+logger = logging.getLogger('birthday_bot')
+
+# "inline" sends deliveries inside the birthday check, "queue" writes them to the
+# delivery_jobs table for the workers on every replica to send
+DELIVERY_MODE = os.getenv("DELIVERY_MODE", "inline")
+
+# Worker coroutines per process, each sending one job at a time
+DELIVERY_WORKERS = int(os.getenv("DELIVERY_WORKERS", "10"))
+
+# Jobs claimed per round trip, and how long they stay hidden from other workers
+JOB_BATCH_SIZE = int(os.getenv("JOB_BATCH_SIZE", "20"))
+JOB_LEASE = float(os.getenv("JOB_LEASE", "300"))
+
+# Seconds an idle worker waits before looking for due jobs again
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "5"))
+
+# Failed jobs are retried with jittered exponential backoff, then given up on
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_RETRY_BASE_DELAY = float(os.getenv("JOB_RETRY_BASE_DELAY", "30"))
+JOB_RETRY_MAX_DELAY = float(os.getenv("JOB_RETRY_MAX_DELAY", "3600"))
+
+class DeliveryWorkers:
+    """
+    Pool of workers that claim delivery jobs in batches and run them with
+    `handle(job)`, which returns True once the job needs no more work.
+
+    Jobs are completed once their whole batch has run. A worker that dies
+    before that leaves its jobs leased, and they become due again when the
+    lease runs out, so `handle` must skip work that was already done.
+    """
+
+    def __init__(self, handle, workers=DELIVERY_WORKERS, batch_size=JOB_BATCH_SIZE, lease=JOB_LEASE,
+                 poll_interval=JOB_POLL_INTERVAL, max_attempts=JOB_MAX_ATTEMPTS,
+                 retry_base_delay=JOB_RETRY_BASE_DELAY, retry_max_delay=JOB_RETRY_MAX_DELAY):
+        self._handle = handle
+        self.workers = workers
+        self.batch_size = batch_size
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.shard = None
+        self.completed = 0
+        self.retried = 0
+        self.failed = 0
+        self._tasks = []
+        self._wakeup = None
+
+    def start(self, shard=None):
+        """Start the workers, claiming only `shard`'s guilds' jobs if given"""
+        if self._tasks:
+            return
+        self.shard = shard
+        # Created here so it binds to the running loop rather than the one at import time
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    def stop(self):
+        """Stop the workers, leaving claimed jobs to be picked up after their lease"""
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    def notify(self):
+        """Wake idle workers after new jobs are queued"""
+        if self._wakeup:
+            self._wakeup.set()
+
+    def stats(self):
+        """Get job outcome counters"""
+        return {"workers": len(self._tasks), "completed": self.completed, "retried": self.retried, "failed": self.failed}
+
+    async def run_batch(self):
+        """Claim and run one batch of jobs. Returns how many were claimed."""
+        jobs = await claim_jobs(self.batch_size, self.lease, self.shard)
+        done = []
+        for job in jobs:
+            job_id, kind, attempts = job[0], job[1], job[6]
+            try:
+                error = None if await self._handle(job) else "not delivered"
+            except Exception as e:
+                error = str(e) or type(e).__name__
+
+            if error is None:
+                done.append(job_id)
+                self.completed += 1
+                metrics.deliveries.inc(kind, "sent")
+            elif attempts >= self.max_attempts:
+                logger.warning(f"Giving up on {kind} job {job_id} after {attempts} attempts: {error}")
+                await fail_job(job_id, error)
+                self.failed += 1
+                metrics.deliveries.inc(kind, "failed")
+            else:
+                await retry_job(job_id, backoff_delay(attempts, self.retry_base_delay, self.retry_max_delay), error)
+                self.retried += 1
+                metrics.deliveries.inc(kind, "retried")
+        await complete_jobs(done)
+        return len(jobs)
+
+    async def _work(self):
+        while True:
+            try:
+                claimed = await self.run_batch()
+            except Exception as e:
+                logger.error(f"Error in delivery worker: {e}")
+                claimed = 0
+            if claimed < self.batch_size:
+                # Queue drained, sleep until new jobs are queued or retries come due
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
@@ -0,0 +1,45 @@
+import asyncio
+import logging
+from collections import namedtuple
+
+logger = logging.getLogger('birthday_bot')
+
+class FanOutResult(namedtuple("FanOutResult", ["item", "value", "error"])):
+    """Outcome of one item in a fan-out batch"""
+
+    @property
+    def ok(self):
+        """True if the worker finished without raising and returned a truthy value"""
+        return self.error is None and bool(self.value)
+
+async def fan_out(items, worker, concurrency=10):
+    """
+    Run `worker(item)` for every item with at most `concurrency` running at once.
+    A failing item never stops the batch; its exception is kept in the result.
+    Returns a list of FanOutResult in the same order as `items`.
+    """
+    items = list(items)
+    results = [None] * len(items)
+    next_index = 0
+
+    async def run_worker():
+        nonlocal next_index
+        while next_index < len(items):
+            index = next_index
+            next_index += 1
+            item = items[index]
+            try:
+                results[index] = FanOutResult(item, await worker(item), None)
+            except Exception as e:
+                logger.error(f"Fan-out item failed: {e}")
+                results[index] = FanOutResult(item, None, e)
+
+    workers = [asyncio.create_task(run_worker()) for _ in range(min(concurrency, len(items)))]
+    if workers:
+        await asyncio.gather(*workers)
+    return results
+
+def count_results(results):
+    """Count succeeded and failed items in a fan-out batch"""
+    succeeded = sum(1 for result in results if result.ok)
+    return succeeded, len(results) - succeeded
@@ -0,0 +1,161 @@
+import os
+import asyncio
+import logging
+
+import database
+from db_executor import run_db
+
+logger = logging.getLogger('birthday_bot')
+
+# "postgres" elects one scheduling replica per partition with an advisory lock,
+# "none" lets every replica schedule birthdays
+COORDINATION = os.getenv("COORDINATION", "none")
+
+# Seconds between lock attempts by standbys and lock checks by the leader
+LEADER_CHECK_INTERVAL = float(os.getenv("LEADER_CHECK_INTERVAL", "5"))
+
+# A leader that can't confirm its lock within this many seconds steps down
+LEADER_CHECK_TIMEOUT = float(os.getenv("LEADER_CHECK_TIMEOUT", "10"))
+
+# First key of the advisory lock, the partition is the second
+LEADER_LOCK_ID = int(os.getenv("LEADER_LOCK_ID", "1714"))
+
+class AdvisoryLock:
+    """
+    A session-level Postgres advisory lock on (key, partition).
+
+    The lock lives as long as the session that took it, so it's held on a
+    connection checked out of the pool for as long as this replica leads.
+    That connection is closed rather than returned when the lock is given up,
+    and if it drops Postgres releases the lock for another replica to take.
+    Blocking, call through the database executor.
+    """
+
+    def __init__(self, key=LEADER_LOCK_ID, partition=0):
+        self.key = key
+        self.partition = partition
+        self._conn = None
+
+    @property
+    def held(self):
+        return self._conn is not None
+
+    def try_acquire(self):
+        """Take the lock if it's free. Returns True if this session holds it."""
+        if self._conn:
+            return True
+        conn = database.get_connection()
+        if not conn:
+            return False
+        acquired = False
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_try_advisory_lock(%s, %s)", (self.key, self.partition))
+                acquired = cur.fetchone()[0]
+        except Exception as e:
+            logger.error(f"Error taking advisory lock {self.key}/{self.partition}: {e}")
+        if acquired:
+            self._conn = conn
+        else:
+            database.release_connection(conn, close=True)
+        return acquired
+
+    def check(self):
+        """Confirm the session is alive and still holds the lock, releasing it if not"""
+        conn = self._conn
+        if not conn:
+            return False
+        held = False
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT count(*) FROM pg_locks
+                    WHERE locktype = 'advisory' AND pid = pg_backend_pid() AND granted
+                      AND classid = %s AND objid = %s AND objsubid = 2
+                """, (self.key, self.partition))
+                held = cur.fetchone()[0] > 0
+            if not held:
+                logger.warning(f"Advisory lock {self.key}/{self.partition} is no longer held")
+        except Exception as e:
+            logger.warning(f"Lost connection holding advisory lock {self.key}/{self.partition}: {e}")
+        if held and self._conn is conn:
+            return True
+        # Lost, or abandoned while this check was stuck on the network
+        if self._conn is conn:
+            self._conn = None
+        database.release_connection(conn, close=True)
+        return False
+
+    def abandon(self):
+        """Stop treating the lock as held without waiting on its session, which the pending check closes"""
+        self._conn = None
+
+    def release(self):
+        """Give up the lock by closing its session"""
+        conn, self._conn = self._conn, None
+        if conn:
+            database.release_connection(conn, close=True)
+
+class LeaderElection:
+    """
+    Keeps trying to take `lock` and runs `on_elected()` once this replica holds
+    it, then checks it every `interval` seconds and runs `on_lost()` as soon as
+    the lock is gone or can't be confirmed within `timeout` seconds.
+    Standbys retry every `interval`, so failover takes about that long once the
+    old leader's session ends.
+    """
+
+    def __init__(self, lock, on_elected, on_lost, interval=LEADER_CHECK_INTERVAL, timeout=LEADER_CHECK_TIMEOUT):
+        self.lock = lock
+        self._on_elected = on_elected
+        self._on_lost = on_lost
+        self.interval = interval
+        self.timeout = timeout
+        self.is_leader = False
+        self.elections = 0
+        self._task = None
+
+    def start(self):
+        """Start campaigning on the running event loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop campaigning and give up the lock"""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        if self.is_leader:
+            await self._step_down()
+        await run_db(self.lock.release)
+
+    async def _step_down(self):
+        self.is_leader = False
+        try:
+            await self._on_lost()
+        except Exception as e:
+            logger.error(f"Error stepping down as scheduler leader: {e}")
+
+    async def _run(self):
+        while True:
+            if not self.is_leader:
+                if await run_db(self.lock.try_acquire):
+                    self.is_leader = True
+                    self.elections += 1
+                    logger.info(f"Elected scheduler leader for partition {self.lock.partition}")
+                    try:
+                        await self._on_elected()
+                    except Exception as e:
+                        logger.error(f"Error taking over as scheduler leader: {e}")
+            else:
+                try:
+                    held = await asyncio.wait_for(run_db(self.lock.check), self.timeout)
+                except asyncio.TimeoutError:
+                    logger.warning(f"Advisory lock check timed out after {self.timeout}s")
+                    self.lock.abandon()
+                    held = False
+                if not held:
+                    logger.warning(f"Lost scheduler leadership for partition {self.lock.partition}")
+                    await self._step_down()
+            await asyncio.sleep(self.interval)
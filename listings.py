@@ -0,0 +1,133 @@
+import os
+import calendar
+import logging
+
+import discord
+
+from async_data_access import list_guild_birthdays
+from utils import decode_birthday, birthday_days
+
+logger = logging.getLogger('birthday_bot')
+
+# Birthdays shown per page of !upcoming and !birthdays
+LISTING_PAGE_SIZE = int(os.getenv("LISTING_PAGE_SIZE", "20"))
+
+# Days ahead !upcoming looks when no count is given
+UPCOMING_DAYS = int(os.getenv("UPCOMING_DAYS", "30"))
+
+# Seconds a listing's page buttons keep working
+LISTING_TIMEOUT = float(os.getenv("LISTING_TIMEOUT", "300"))
+
+async def fetch_page(guild_id, ranges, cursor=None, limit=LISTING_PAGE_SIZE):
+    """
+    Get one page of a guild's birthdays across `ranges`, (first, last) ranges
+    of encoded birthdays read in order, plus the cursor for the next page,
+    None on the last one. A cursor is (range index, birthday, user_id) of the
+    last row shown, so a page is at most one index scan per range.
+    """
+    index, after = (cursor[0], cursor[1:]) if cursor else (0, None)
+    rows = []
+    while index < len(ranges):
+        # One row more than the page shows whether there's a next page
+        wanted = limit + 1 - len(rows)
+        found = await list_guild_birthdays(guild_id, ranges[index], after, wanted)
+        rows.extend((index, row) for row in found)
+        if len(found) == wanted:
+            break
+        index, after = index + 1, None
+
+    page = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        last_index, (user_id, birthday, _, _) = page[-1]
+        next_cursor = (last_index, birthday, user_id)
+    return [row for _, row in page], next_cursor
+
+def format_entry(guild, row, today=None):
+    """
+    Format a listing row as a line, naming the member from the guild cache.
+    With `today`, members sharing their age show the age they're turning.
+    """
+    user_id, birthday, birth_year, share_age = row
+    mmdd = decode_birthday(birthday)
+    member = guild.get_member(user_id)
+    # Members outside the cache render as a mention, which doesn't ping in an embed
+    name = discord.utils.escape_markdown(member.display_name) if member else f"<@{user_id}>"
+    line = f"**{calendar.month_abbr[int(mmdd[:2])]} {int(mmdd[2:])}** - {name}"
+    if today and birth_year and share_age:
+        year = today.year if birthday >= birthday_days(today)[0] else today.year + 1
+        line += f" (turning {year - birth_year})"
+    return line
+
+class BirthdayPages(discord.ui.View):
+    """
+    Previous/Next buttons over a guild birthday listing. Pages are fetched on
+    demand with keyset cursors; the cursors of the pages seen so far are kept
+    so Previous can go back without an offset.
+    """
+
+    def __init__(self, guild, author_id, title, ranges, today=None, page_size=LISTING_PAGE_SIZE,
+                 timeout=LISTING_TIMEOUT):
+        super().__init__(timeout=timeout)
+        self.guild = guild
+        self.author_id = author_id
+        self.title = title
+        self.ranges = ranges
+        self.today = today
+        self.page_size = page_size
+        self.cursors = [None]
+        self.next_cursor = None
+        self.message = None
+
+    async def load(self):
+        """Fetch the current page and build its embed"""
+        rows, self.next_cursor = await fetch_page(self.guild.id, self.ranges, self.cursors[-1], self.page_size)
+        self.previous_page.disabled = len(self.cursors) == 1
+        self.next_page.disabled = self.next_cursor is None
+
+        embed = discord.Embed(
+            title=self.title,
+            description="\n".join(format_entry(self.guild, row, self.today) for row in rows)
+                        or "No birthdays to show.",
+            color=discord.Color.blue()
+        )
+        embed.set_footer(text=f"Page {len(self.cursors)}")
+        return embed
+
+    async def interaction_check(self, interaction):
+        if interaction.user.id != self.author_id:
+            await interaction.response.send_message("Only the person who ran the command can turn its pages.",
+                                                    ephemeral=True)
+            return False
+        return True
+
+    @discord.ui.button(label="Previous", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction, button):
+        if len(self.cursors) > 1:
+            self.cursors.pop()
+        await interaction.response.edit_message(embed=await self.load(), view=self)
+
+    @discord.ui.button(label="Next", style=discord.ButtonStyle.primary)
+    async def next_page(self, interaction, button):
+        if self.next_cursor:
+            self.cursors.append(self.next_cursor)
+        await interaction.response.edit_message(embed=await self.load(), view=self)
+
+    async def on_timeout(self):
+        for item in self.children:
+            item.disabled = True
+        if self.message:
+            try:
+                await self.message.edit(view=self)
+            except discord.HTTPException as e:
+                logger.debug(f"Couldn't disable listing buttons: {e}")
+
+async def send_listing(ctx, title, ranges, today=None):
+    """Send the first page of a birthday listing, with page buttons if there's more than one"""
+    view = BirthdayPages(ctx.guild, ctx.author.id, title, ranges, today)
+    embed = await view.load()
+    if view.next_cursor is None:
+        view.stop()
+        await ctx.send(embed=embed, allowed_mentions=discord.AllowedMentions.none())
+        return
+    view.message = await ctx.send(embed=embed, view=view, allowed_mentions=discord.AllowedMentions.none())
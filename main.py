@@ -1,20 +1,37 @@
 import os
 import discord
-from discord.ext import commands, tasks
+from discord.ext import commands
 import datetime
 import asyncio
+import time
 import logging
 from dotenv import load_dotenv
 
-from database import initialize_database, close_all_connections
-from data_access import (
+from database import pool_stats, pool_metrics
+from storage import STORAGE_BACKEND, start_storage, wait_until_ready, get_storage
+import metrics
+from db_executor import shutdown_executor
+from fanout import fan_out, count_results
+from user_resolver import UserResolver
+from midnight_scheduler import MidnightScheduler
+from command_policy import CommandChannelGate, WrongChannel
+from sharding import shard_config, shard_filter
+from leader import COORDINATION, AdvisoryLock, LeaderElection
+from delivery_queue import DELIVERY_MODE, DeliveryWorkers
+from listings import UPCOMING_DAYS, send_listing
+from command_limits import CommandLimiter, LoadShedder, RateLimited, Overloaded
+from outbound import OutboundScheduler, PRIORITY_REPLY, PRIORITY_ANNOUNCE, PRIORITY_DM
+from data_access import settings_cache, DELIVERY_DM, DELIVERY_ANNOUNCE, DM_LEDGER_GUILD, TARGET_USER, TARGET_CHANNEL
+from async_data_access import (
     set_birthday, set_birth_year, toggle_user_setting, get_user_birthday,
-    get_birthdays_for_date, set_server_setting, get_server_setting, clean_up_user_data,
-    clear_birthday
+    get_birthdays_for_date, get_birthdays_for_guilds, get_guild_config, get_guild_configs, update_guild_config,
+    clean_up_user_data, clear_birthday, get_guild_dates, get_guild_timezones, get_delivered, record_deliveries,
+    prune_deliveries, mark_undeliverable, get_undeliverable, clear_undeliverable, list_undeliverable,
+    prune_undeliverable, enqueue_jobs, prune_jobs
 )
 from utils import (
-    parse_birthday, validate_year, get_current_date_mmdd, 
-    get_guild_timezone, calculate_age, is_admin
+    parse_birthday, validate_year, get_current_date, encode_birthday, birthday_days, birthday_window,
+    BIRTHDAY_DAYS, calculate_age, is_admin, build_coalesced_announcements
 )
 
 # Setup logging
@@ -29,11 +46,50 @@ load_dotenv()
 BOT_TOKEN = os.getenv('BOT_TOKEN')
 MASTER_KEY_ID = int(os.getenv('MASTER_KEY_ID', 0))
 
+# How long a command waits for the database while the bot is still starting up
+DB_READY_TIMEOUT = float(os.getenv('DB_READY_TIMEOUT', '30'))
+
 # Setup Discord bot with required intents
 intents = discord.Intents.default()
 intents.message_content = True
 intents.members = True
-bot = commands.Bot(command_prefix='!', intents=intents, help_command=None)
+
+# Central queue for every outbound message, see outbound.py
+outbound = OutboundScheduler()
+
+class BirthdayContext(commands.Context):
+    """Command context whose replies go through the outbound scheduler"""
+    
+    async def send(self, *args, **kwargs):
+        parent_send = super().send
+        return await outbound.submit(PRIORITY_REPLY, ("channel", self.channel.id), lambda: parent_send(*args, **kwargs))
+
+class BirthdayBot(commands.AutoShardedBot):
+    """Sharded bot that creates BirthdayContext for every command"""
+    
+    async def get_context(self, origin, *, cls=BirthdayContext):
+        return await super().get_context(origin, cls=cls)
+    
+    async def on_command_error(self, ctx, error):
+        # The command checks have already replied to the user where needed
+        if isinstance(error, (WrongChannel, RateLimited, Overloaded)):
+            return
+        await super().on_command_error(ctx, error)
+    
+    async def setup_hook(self):
+        # Connect to storage alongside the gateway login instead of before it
+        run_in_background(start_storage())
+        load_shedder.start()
+        if metrics.ENABLED:
+            metrics.add_collector(pool_metrics)
+            await metrics.start_metrics_server()
+            run_in_background(metrics.monitor_loop_lag())
+
+# Runs every shard by default; SHARD_COUNT/SHARD_IDS split shards across processes
+bot = BirthdayBot(command_prefix='!', intents=intents, help_command=None, **shard_config())
+
+# Resolves DM recipients from the gateway cache before falling back to REST
+user_resolver = UserResolver(bot)
 
 # Private warning message for setting birthday/birth year
 PRIVACY_WARNING = """
@@ -46,25 +102,135 @@ You are about to share personal information with this bot. This data is stored s
 Your data will only be used for birthday announcements as configured by your preferences.
 """
 
+# References to fire-and-forget tasks so they aren't garbage collected
+background_tasks = set()
+
+def run_in_background(coro):
+    """Run a coroutine as a task without waiting for it"""
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+async def send_privacy_warning(member, message):
+    """DM a privacy warning as part of a command reply"""
+    # Sent at reply priority since the user is waiting on the command
+    return await outbound.submit(PRIORITY_REPLY, ("dm", member.id), lambda: member.send(message))
+
 @bot.event
 async def on_ready():
     """Called when the bot is ready"""
     logger.info(f'Logged in as {bot.user.name} ({bot.user.id})')
-    initialize_database()
+    # Nothing below works without storage, keep waiting but say so
+    while not await wait_until_ready(DB_READY_TIMEOUT):
+        logger.warning(f"Database still not ready after {DB_READY_TIMEOUT}s, holding off birthday checks and delivery workers")
+    
+    # Read every guild's config in one query rather than one per guild as they're used
+    configs = await get_guild_configs(guild.id for guild in bot.guilds)
+    logger.info(f'Loaded config for {len(configs)} guilds')
     
-    # Start birthday check task
-    check_birthdays.start()
-    logger.info('Bot is ready and birthday checking is running')
+    if DELIVERY_MODE == "queue":
+        # Workers run on every replica and only claim jobs for this process's shards
+        delivery_workers.start(shard_filter(bot.shard_count, bot.shard_ids))
+    
+    if leader_election:
+        # Commands run on every replica, birthdays only on the elected one
+        logger.info('Bot is ready, campaigning for scheduler leadership')
+        leader_election.start()
+        return
+    
+    # Bucket guilds by timezone, catch up on anything missed while offline,
+    # then wake only at local midnights
+    await schedule_guilds(bot.guilds)
+    await check_birthdays()
+    birthday_scheduler.start()
+    logger.info(f'Bot is ready, next birthday check at {birthday_scheduler.next_rollover()[0]}')
+
+async def load_command_channel(guild_id):
+    """Read a guild's command channel once storage is up"""
+    await wait_until_ready(DB_READY_TIMEOUT)
+    return (await get_guild_config(guild_id)).command_channel
+
+# Compiled per-guild command channel policies, see command_policy.py
+command_gate = CommandChannelGate(
+    load_command_channel,
+    lambda member: member.id == MASTER_KEY_ID or is_admin(member)
+)
+
+# Per-user and per-guild command rate limits, see command_limits.py
+command_limiter = CommandLimiter()
+
+# Sheds write commands while the database pool or event loop is saturated
+load_shedder = LoadShedder(pool_stats)
+
+# Commands that write to storage or send DMs, shed first under load
+WRITE_COMMANDS = {
+    "setbirthday", "clearbirthday", "setbirthyear", "toggledms", "toggleannounce", "toggleshareage",
+    "setannouncechannel", "clearuserbirthday", "setcommandchannel", "toggleeveryone", "togglecoalesce",
+    "settimezone", "forceannounce",
+}
+
+@bot.check
+async def command_rate_check(ctx):
+    """Rate limit commands per user and per guild, and shed writes while overloaded"""
+    if ctx.author.id == MASTER_KEY_ID:
+        return True
+    guild_id = ctx.guild.id if ctx.guild else None
+    try:
+        command_limiter.check(ctx.author.id, guild_id)
+        if ctx.command.name in WRITE_COMMANDS:
+            await load_shedder.admit()
+    except RateLimited as e:
+        metrics.commands_rejected.inc(f"{e.scope}_rate")
+        # Only the first rejected command in a burst gets a reply
+        if command_limiter.should_warn(e, ctx.author.id, guild_id):
+            await ctx.send(f"You're using commands too quickly, please try again in {max(1, round(e.retry_after))} seconds.")
+        raise
+    except Overloaded:
+        metrics.commands_rejected.inc("overloaded")
+        await ctx.send("The bot is very busy right now, please try again in a minute.")
+        raise
+    return True
+
+@bot.check
+async def command_channel_check(ctx):
+    """Only run commands in the guild's command channel, unless used by an admin"""
+    command_channel = await command_gate.redirect_for(ctx)
+    if command_channel:
+        await ctx.send(f"Please use {command_channel.mention} for birthday commands.")
+        raise WrongChannel()
+    return True
+
+@bot.before_invoke
+async def before_command(ctx):
+    """Start the command timer and hold commands that arrive before the database is ready"""
+    ctx.started_at = time.perf_counter()
+    if not await wait_until_ready(DB_READY_TIMEOUT):
+        logger.warning(f"Database still not ready after {DB_READY_TIMEOUT}s, running {ctx.command} anyway")
+
+@bot.after_invoke
+async def after_command(ctx):
+    """Record the command's latency"""
+    status = "error" if ctx.command_failed else "ok"
+    metrics.command_latency.observe(ctx.command.qualified_name, status, value=time.perf_counter() - ctx.started_at)
+
+@bot.event
+async def on_shard_ready(shard_id):
+    """Called when one of this process's shards is ready"""
+    logger.info(f'Shard {shard_id} ready ({bot.shard_count} shards in total)')
 
 @bot.event
 async def on_guild_join(guild):
     """Called when the bot joins a guild"""
     logger.info(f'Joined guild: {guild.name} ({guild.id})')
+    await schedule_guilds([guild])
     
 @bot.event
 async def on_guild_remove(guild):
     """Called when the bot is removed from a guild"""
     logger.info(f'Left guild: {guild.name} ({guild.id})')
+    birthday_scheduler.remove_guild(guild.id)
+    command_gate.invalidate(guild.id)
 
 @bot.event
 async def on_member_remove(member):
@@ -81,16 +247,6 @@ async def set_birthday_cmd(ctx, birthday_str: str = None):
         await ctx.send("Please provide your birthday in MMDD or DDMM format. Example: `!setbirthday 1225` for December 25")
         return
     
-    # Get command channel setting
-    command_channel_id = get_server_setting(ctx.guild.id, "command_channel")
-    
-    # Check if command is allowed in this channel
-    if command_channel_id and ctx.channel.id != int(command_channel_id) and not ctx.author.guild_permissions.administrator:
-        command_channel = ctx.guild.get_channel(int(command_channel_id))
-        if command_channel:
-            await ctx.send(f"Please use {command_channel.mention} for birthday commands.")
-            return
-    
     # Parse and validate birthday
     parsed_birthday = parse_birthday(birthday_str)
     if not parsed_birthday:
@@ -99,13 +255,13 @@ async def set_birthday_cmd(ctx, birthday_str: str = None):
     
     # Send privacy warning - handle users with DMs disabled
     try:
-        await ctx.author.send(PRIVACY_WARNING)
+        await send_privacy_warning(ctx.author, PRIVACY_WARNING)
     except discord.errors.Forbidden:
         # User has DMs disabled, send the message in the channel instead
         await ctx.send(f"⚠️ **{ctx.author.mention}**: I couldn't send you a privacy warning via DM because you have DMs disabled.\n\nPlease note that by setting your birthday, you're sharing personal information. You can disable announcements at any time using `!toggleannounce` and `!toggledms`.")
     
     # Set the birthday in the database
-    if set_birthday(ctx.author.id, ctx.guild.id, parsed_birthday):
+    if await set_birthday(ctx.author.id, ctx.guild.id, encode_birthday(parsed_birthday)):
         month, day = parsed_birthday[:2], parsed_birthday[2:]
         await ctx.send(f"Your birthday has been set to {month}/{day}. You can use `!toggleannounce` to disable server announcements or `!toggledms` to disable DM messages.")
     else:
@@ -114,24 +270,14 @@ async def set_birthday_cmd(ctx, birthday_str: str = None):
 @bot.command(name="clearbirthday")
 async def clear_birthday_cmd(ctx):
     """Clear your birthday"""
-    # Get command channel setting
-    command_channel_id = get_server_setting(ctx.guild.id, "command_channel")
-    
-    # Check if command is allowed in this channel
-    if command_channel_id and ctx.channel.id != int(command_channel_id) and not ctx.author.guild_permissions.administrator:
-        command_channel = ctx.guild.get_channel(int(command_channel_id))
-        if command_channel:
-            await ctx.send(f"Please use {command_channel.mention} for birthday commands.")
-            return
-    
     # Check if user has a birthday set
-    birthday_info = get_user_birthday(ctx.author.id, ctx.guild.id)
+    birthday_info = await get_user_birthday(ctx.author.id, ctx.guild.id)
     if not birthday_info:
         await ctx.send("You don't have a birthday set in this server.")
         return
     
     # Clear the birthday from the database
-    if clear_birthday(ctx.author.id, ctx.guild.id):
+    if await clear_birthday(ctx.author.id, ctx.guild.id):
         await ctx.send("Your birthday has been cleared from this server.")
     else:
         await ctx.send("There was an error clearing your birthday. Please try again later.")
@@ -150,20 +296,20 @@ async def set_birth_year_cmd(ctx, year_str: str = None):
         return
     
     # Check if user has registered a birthday
-    birthday_info = get_user_birthday(ctx.author.id, ctx.guild.id)
+    birthday_info = await get_user_birthday(ctx.author.id, ctx.guild.id)
     if not birthday_info:
         await ctx.send("Please set your birthday first using `!setbirthday`.")
         return
     
     # Send privacy warning
     try:
-        await ctx.author.send(PRIVACY_WARNING + "\nAdding your birth year allows the bot to calculate your age. Use `!toggleshareage` to control whether your age is shared in birthday announcements.")
+        await send_privacy_warning(ctx.author, PRIVACY_WARNING + "\nAdding your birth year allows the bot to calculate your age. Use `!toggleshareage` to control whether your age is shared in birthday announcements.")
     except discord.errors.Forbidden:
         # User has DMs disabled, send the message in the channel instead
         await ctx.send(f"⚠️ **{ctx.author.mention}**: I couldn't send you a privacy warning via DM because you have DMs disabled.\n\nPlease note that adding your birth year allows the bot to calculate your age. You can control whether your age is shared using `!toggleshareage`.")
     
     # Set the birth year in the database
-    if set_birth_year(ctx.author.id, ctx.guild.id, year):
+    if await set_birth_year(ctx.author.id, ctx.guild.id, year):
         await ctx.send(f"Your birth year has been set to {year}. You can use `!toggleshareage` to control whether your age is shown in birthday announcements.")
     else:
         await ctx.send("There was an error setting your birth year. Please try again later.")
@@ -171,7 +317,10 @@ async def set_birth_year_cmd(ctx, year_str: str = None):
 @bot.command(name="toggledms")
 async def toggle_dms_cmd(ctx):
     """Toggle whether you receive birthday DMs"""
-    result = toggle_user_setting(ctx.author.id, ctx.guild.id, "receive_dms")
+    result = await toggle_user_setting(ctx.author.id, ctx.guild.id, "receive_dms")
+    if result == 1:
+        # Give DMs another try in case the user has opened them since
+        await clear_undeliverable(TARGET_USER, ctx.author.id)
     if result is not None:
         status = "enabled" if result == 1 else "disabled"
         await ctx.send(f"Birthday DMs are now {status}.")
@@ -181,7 +330,7 @@ async def toggle_dms_cmd(ctx):
 @bot.command(name="toggleannounce")
 async def toggle_announce_cmd(ctx):
     """Toggle whether your birthday is announced in servers"""
-    result = toggle_user_setting(ctx.author.id, ctx.guild.id, "announce_in_servers")
+    result = await toggle_user_setting(ctx.author.id, ctx.guild.id, "announce_in_servers")
     if result is not None:
         status = "enabled" if result == 1 else "disabled"
         await ctx.send(f"Server birthday announcements are now {status}.")
@@ -192,18 +341,34 @@ async def toggle_announce_cmd(ctx):
 async def toggle_share_age_cmd(ctx):
     """Toggle whether your age is shared in birthday announcements"""
     # Check if user has a birth year set
-    birthday_info = get_user_birthday(ctx.author.id, ctx.guild.id)
+    birthday_info = await get_user_birthday(ctx.author.id, ctx.guild.id)
     if not birthday_info or not birthday_info[1]:  # Index 1 is birth_year
         await ctx.send("Please set your birth year first using `!setbirthyear`.")
         return
     
-    result = toggle_user_setting(ctx.author.id, ctx.guild.id, "share_age")
+    result = await toggle_user_setting(ctx.author.id, ctx.guild.id, "share_age")
     if result is not None:
         status = "enabled" if result == 1 else "disabled"
         await ctx.send(f"Age sharing in birthday announcements is now {status}.")
     else:
         await ctx.send("There was an error toggling age sharing. Please try again later.")
 
+@bot.command(name="upcoming")
+async def upcoming_cmd(ctx, days: int = UPCOMING_DAYS):
+    """List birthdays coming up in this server"""
+    if not 1 <= days <= BIRTHDAY_DAYS:
+        await ctx.send(f"Please choose between 1 and {BIRTHDAY_DAYS} days. Example: `!upcoming 14`")
+        return
+    
+    # Count from the server's own date, wrapping past the end of the year
+    today = (await get_guild_dates([ctx.guild.id]))[ctx.guild.id]
+    await send_listing(ctx, f"Upcoming Birthdays (next {days} days)", birthday_window(today, days), today)
+
+@bot.command(name="birthdays")
+async def birthdays_cmd(ctx):
+    """List every birthday in this server"""
+    await send_listing(ctx, f"Birthdays in {ctx.guild.name}", [(1, BIRTHDAY_DAYS)])
+
 # Admin commands
 @bot.command(name="setannouncechannel")
 async def set_announce_channel_cmd(ctx, channel: discord.TextChannel = None):
@@ -216,7 +381,8 @@ async def set_announce_channel_cmd(ctx, channel: discord.TextChannel = None):
         await ctx.send("Please mention a channel. Example: `!setannouncechannel #birthdays`")
         return
     
-    if set_server_setting(ctx.guild.id, "announce_channel", str(channel.id)):
+    if await update_guild_config(ctx.guild.id, announce_channel=channel.id):
+        await clear_undeliverable(TARGET_CHANNEL, channel.id)
         await ctx.send(f"Birthday announcements will now be sent to {channel.mention}.")
     else:
         await ctx.send("There was an error setting the announcement channel. Please try again later.")
@@ -233,13 +399,13 @@ async def clear_user_birthday_cmd(ctx, user: discord.Member = None):
         return
     
     # Check if user has a birthday set
-    birthday_info = get_user_birthday(user.id, ctx.guild.id)
+    birthday_info = await get_user_birthday(user.id, ctx.guild.id)
     if not birthday_info:
         await ctx.send(f"{user.display_name} doesn't have a birthday set in this server.")
         return
     
     # Clear the birthday from the database
-    if clear_birthday(user.id, ctx.guild.id):
+    if await clear_birthday(user.id, ctx.guild.id):
         await ctx.send(f"{user.display_name}'s birthday has been cleared from this server.")
     else:
         await ctx.send(f"There was an error clearing {user.display_name}'s birthday. Please try again later.")
@@ -255,7 +421,8 @@ async def set_command_channel_cmd(ctx, channel: discord.TextChannel = None):
         await ctx.send("Please mention a channel. Example: `!setcommandchannel #commands`")
         return
     
-    if set_server_setting(ctx.guild.id, "command_channel", str(channel.id)):
+    if await update_guild_config(ctx.guild.id, command_channel=channel.id):
+        command_gate.set_channel(ctx.guild.id, channel.id)
         await ctx.send(f"Birthday commands will now only be processed in {channel.mention}.")
     else:
         await ctx.send("There was an error setting the command channel. Please try again later.")
@@ -267,16 +434,56 @@ async def toggle_everyone_cmd(ctx):
         await ctx.send("You don't have permission to use this command.")
         return
     
-    # Get current setting or default to 0 (disabled)
-    current_setting = get_server_setting(ctx.guild.id, "mention_everyone")
-    new_setting = "0" if current_setting == "1" else "1"
+    # Disabled unless the guild has turned it on
+    mention_everyone = not (await get_guild_config(ctx.guild.id)).mention_everyone
     
-    if set_server_setting(ctx.guild.id, "mention_everyone", new_setting):
-        status = "enabled" if new_setting == "1" else "disabled"
+    if await update_guild_config(ctx.guild.id, mention_everyone=mention_everyone):
+        status = "enabled" if mention_everyone else "disabled"
         await ctx.send(f"@everyone mentions in birthday announcements are now {status}.")
     else:
         await ctx.send("There was an error toggling @everyone mentions. Please try again later.")
 
+@bot.command(name="togglecoalesce")
+async def toggle_coalesce_cmd(ctx):
+    """Toggle whether the day's birthdays are announced in a single message (Admin only)"""
+    if not is_admin(ctx.author) and ctx.author.id != MASTER_KEY_ID:
+        await ctx.send("You don't have permission to use this command.")
+        return
+    
+    # One message per birthday unless the guild has turned it on
+    coalesce = not (await get_guild_config(ctx.guild.id)).coalesce_announcements
+    
+    if await update_guild_config(ctx.guild.id, coalesce_announcements=coalesce):
+        status = "combined into one message" if coalesce else "sent as one message per member"
+        await ctx.send(f"Birthday announcements will now be {status}.")
+    else:
+        await ctx.send("There was an error toggling combined announcements. Please try again later.")
+
+@bot.command(name="undeliverable")
+async def undeliverable_cmd(ctx):
+    """List channels and members the bot currently can't deliver to (Admin only)"""
+    if not is_admin(ctx.author) and ctx.author.id != MASTER_KEY_ID:
+        await ctx.send("You don't have permission to use this command.")
+        return
+    
+    entries = await list_undeliverable(ctx.guild.id)
+    if not entries:
+        await ctx.send("All birthday DMs and announcements in this server are currently deliverable.")
+        return
+    
+    lines = []
+    for target_type, target_id, reason, failed_at, expires_at in entries:
+        target = f"<#{target_id}>" if target_type == TARGET_CHANNEL else f"<@{target_id}>"
+        lines.append(f"{target} - {reason} (skipped until <t:{int(expires_at.timestamp())}:R>)")
+    
+    embed = discord.Embed(
+        title="Undeliverable Birthday Targets",
+        description="\n".join(lines),
+        color=discord.Color.orange()
+    )
+    embed.set_footer(text="Setting a new announcement channel or re-enabling DMs clears an entry.")
+    await ctx.send(embed=embed, allowed_mentions=discord.AllowedMentions.none())
+
 @bot.command(name="settimezone")
 async def set_timezone_cmd(ctx, timezone: str = None):
     """Set the timezone for the server (Admin only)"""
@@ -291,7 +498,11 @@ async def set_timezone_cmd(ctx, timezone: str = None):
     try:
         import pytz
         tz = pytz.timezone(timezone)
-        if set_server_setting(ctx.guild.id, "timezone", timezone):
+        if await update_guild_config(ctx.guild.id, timezone=timezone):
+            # Move the guild to its new bucket and catch up if its date changed
+            birthday_scheduler.set_guild_timezone(ctx.guild.id, timezone)
+            if owns_scheduling():
+                run_in_background(check_birthdays([ctx.guild.id], include_dms=False))
             await ctx.send(f"Server timezone has been set to {timezone}.")
         else:
             await ctx.send("There was an error setting the timezone. Please try again later.")
@@ -318,6 +529,8 @@ async def help_cmd(ctx):
         `!toggledms` - Toggle birthday DMs
         `!toggleannounce` - Toggle server announcements
         `!toggleshareage` - Toggle age sharing (requires birth year)
+        `!upcoming [days]` - List upcoming birthdays in this server
+        `!birthdays` - List every birthday in this server
         """,
         inline=False
     )
@@ -351,6 +564,8 @@ async def admin_help_cmd(ctx):
         `!setannouncechannel #channel` - Set channel for birthday announcements
         `!setcommandchannel #channel` - Set channel for birthday commands
         `!toggleeveryone` - Toggle @everyone mentions in announcements
+        `!togglecoalesce` - Toggle combining the day's birthdays into one announcement
+        `!undeliverable` - List channels and members the bot can't deliver to
         `!settimezone timezone` - Set server timezone (e.g., 'America/New_York')
         `!clearuserbirthday @user` - Clear a specific user's birthday
         """,
@@ -371,7 +586,43 @@ async def admin_help_cmd(ctx):
     
     await ctx.send(embed=admin_embed)
 
-async def send_birthday_dm(user, birth_year=None, share_age=0):
+# How long, in seconds, a user or channel that can't be delivered to is skipped
+UNDELIVERABLE_TTL = int(os.getenv("UNDELIVERABLE_TTL", str(7 * 24 * 3600)))
+
+# Discord error codes that mean retrying the same target won't help
+UNDELIVERABLE_ERRORS = {
+    10003: "Unknown Channel",
+    10013: "Unknown User",
+    50001: "Missing Access",
+    50007: "Cannot send messages to this user",
+    50013: "Missing Permissions",
+}
+
+def undeliverable_reason(error):
+    """Get why an error makes its target undeliverable, or None if a retry might succeed"""
+    if isinstance(error, (discord.Forbidden, discord.NotFound)):
+        return UNDELIVERABLE_ERRORS.get(error.code, error.text or f"HTTP {error.status}")
+    return None
+
+async def get_announce_channel(guild, channel_id):
+    """
+    Get a guild's announcement channel if the bot can post in it.
+    Records the channel as undeliverable and returns None otherwise.
+    """
+    channel = guild.get_channel(channel_id)
+    reason = None
+    if not channel:
+        reason = "Unknown Channel"
+    elif guild.me and not channel.permissions_for(guild.me).send_messages:
+        reason = "Missing Permissions"
+    
+    if reason:
+        logger.info(f"Announcement channel {channel_id} in guild {guild.id} is undeliverable: {reason}")
+        await mark_undeliverable(TARGET_CHANNEL, channel_id, guild.id, reason, UNDELIVERABLE_TTL)
+        return None
+    return channel
+
+async def send_birthday_dm(user, birth_year=None, share_age=0, guild_id=None):
     """Send birthday DM to a user"""
     try:
         age_text = ""
@@ -379,17 +630,21 @@ async def send_birthday_dm(user, birth_year=None, share_age=0):
             age = calculate_age(birth_year)
             age_text = f"\nYou're turning {age} today! 🎂"
             
-        await user.send(f"Happy Birthday, {user.mention}! 🎉🎂🎈{age_text}")
+        message = f"Happy Birthday, {user.mention}! 🎉🎂🎈{age_text}"
+        await outbound.submit(PRIORITY_DM, ("dm", user.id), lambda: user.send(message))
         return True
     except Exception as e:
         logger.error(f"Error sending DM to user {user.id}: {e}")
+        reason = undeliverable_reason(e)
+        if reason:
+            await mark_undeliverable(TARGET_USER, user.id, guild_id, reason, UNDELIVERABLE_TTL)
         return False
 
 async def send_server_announcement(guild, member, channel_id, birth_year=None, share_age=0, mention_everyone=False):
     """Send birthday announcement to a server channel"""
     try:
         # Get the announcement channel
-        channel = guild.get_channel(int(channel_id))
+        channel = await get_announce_channel(guild, channel_id)
         if not channel:
             return False
         
@@ -402,12 +657,53 @@ async def send_server_announcement(guild, member, channel_id, birth_year=None, s
         message = f"🎉 Today is {member.mention}'s birthday!{age_text} Wish them a happy birthday! 🎂🎈"
         
         # Send announcement
-        await channel.send(message, allowed_mentions=discord.AllowedMentions(everyone=mention_everyone))
+        allowed_mentions = discord.AllowedMentions(everyone=mention_everyone)
+        await outbound.submit(
+            PRIORITY_ANNOUNCE, ("channel", channel.id),
+            lambda: channel.send(message, allowed_mentions=allowed_mentions)
+        )
         return True
     except Exception as e:
         logger.error(f"Error sending announcement in guild {guild.id}: {e}")
+        reason = undeliverable_reason(e)
+        if reason:
+            await mark_undeliverable(TARGET_CHANNEL, channel_id, guild.id, reason, UNDELIVERABLE_TTL)
         return False
 
+async def send_coalesced_announcement(guild, entries, channel_id, mention_everyone=False):
+    """
+    Send one birthday announcement covering several members.
+    entries is a list of (member, birth_year, share_age) tuples.
+    Returns how many entries were announced, in order.
+    """
+    announced = 0
+    try:
+        # Get the announcement channel
+        channel = await get_announce_channel(guild, channel_id)
+        if not channel:
+            return 0
+        
+        lines = []
+        for member, birth_year, share_age in entries:
+            age = calculate_age(birth_year) if birth_year and share_age == 1 else None
+            lines.append((member.mention, age))
+        
+        # Send announcement, split at Discord's message length limit
+        allowed_mentions = discord.AllowedMentions(everyone=mention_everyone)
+        for message, count in build_coalesced_announcements(lines):
+            await outbound.submit(
+                PRIORITY_ANNOUNCE, ("channel", channel.id),
+                lambda message=message: channel.send(message, allowed_mentions=allowed_mentions)
+            )
+            announced += count
+    except Exception as e:
+        logger.error(f"Error sending announcement in guild {guild.id}: {e}")
+        reason = undeliverable_reason(e)
+        if reason:
+            await mark_undeliverable(TARGET_CHANNEL, channel_id, guild.id, reason, UNDELIVERABLE_TTL)
+    
+    return announced
+
 @bot.command(name="forceannounce")
 async def force_announce_cmd(ctx, user: discord.Member = None):
     """Force a birthday announcement for a user (Master only)"""
@@ -421,18 +717,18 @@ async def force_announce_cmd(ctx, user: discord.Member = None):
         return
     
     # Get user's birthday info
-    birthday_info = get_user_birthday(user.id, ctx.guild.id)
+    birthday_info = await get_user_birthday(user.id, ctx.guild.id)
     
     # If no birthday info, attempt to create one for this announcement
     if not birthday_info:
         # Create a temporary record
-        today = datetime.datetime.now().strftime("%m%d")
-        if not set_birthday(user.id, ctx.guild.id, today):
+        today = birthday_days(datetime.datetime.now().date())[0]
+        if not await set_birthday(user.id, ctx.guild.id, today):
             await ctx.send(f"Failed to create temporary birthday record for {user.display_name}")
             return
         
         # Get the newly created record
-        birthday_info = get_user_birthday(user.id, ctx.guild.id)
+        birthday_info = await get_user_birthday(user.id, ctx.guild.id)
         if not birthday_info:
             await ctx.send(f"Failed to retrieve birthday info for {user.display_name}")
             return
@@ -452,13 +748,10 @@ async def force_announce_cmd(ctx, user: discord.Member = None):
     # Force server announcement if enabled
     if announce_in_servers == 1:
         # Check if announce channel is set
-        announce_channel_id = get_server_setting(ctx.guild.id, "announce_channel")
-        if announce_channel_id:
-            # Determine if @everyone should be mentioned
-            mention_everyone = get_server_setting(ctx.guild.id, "mention_everyone") == "1"
-            
+        config = await get_guild_config(ctx.guild.id)
+        if config.announce_channel:
             announcement_sent = await send_server_announcement(
-                ctx.guild, user, announce_channel_id, birth_year, share_age, mention_everyone
+                ctx.guild, user, config.announce_channel, birth_year, share_age, config.mention_everyone
             )
             results.append(f"Server announcement: {'✅ Sent' if announcement_sent else '❌ Failed'}")
         else:
@@ -470,71 +763,288 @@ async def force_announce_cmd(ctx, user: discord.Member = None):
     summary = "\n".join(results)
     await ctx.send(f"Force announcement results for {user.display_name}:\n{summary}")
 
-@tasks.loop(hours=1)
-async def check_birthdays():
-    """Background task to check for birthdays"""
+# Days of delivery history kept in the ledger
+DELIVERY_RETENTION_DAYS = 7
+
+# Maximum number of DMs or announcements sent at the same time
+DELIVERY_CONCURRENCY = int(os.getenv("DELIVERY_CONCURRENCY", "10"))
+
+# Stats from the most recent birthday check
+last_tick_stats = {}
+
+async def plan_birthday_dms(today):
+    """Get today's birthday DMs that haven't been sent yet, as (ledger key, users row) pairs"""
+    # One row per user, for their lowest guild ID. Each process only DMs users
+    # whose lowest guild is on its own shards.
+    shard = shard_filter(bot.shard_count, bot.shard_ids)
+    birthdays = await get_birthdays_for_date(birthday_days(today), dms_only=True, shard=shard)
+    
+    # Skip DMs that were already sent today, from any guild
+    dm_keys = [(user_id, DM_LEDGER_GUILD, DELIVERY_DM, today) for user_id, *_ in birthdays]
+    delivered = await get_delivered(dm_keys)
+    pending = [(key, row) for key, row in zip(dm_keys, birthdays) if key not in delivered]
+    
+    # Skip users whose DMs are known to be closed
+    blocked = await get_undeliverable(TARGET_USER, {row[0] for _, row in pending})
+    if blocked:
+        logger.info(f"Skipping DMs to {len(blocked)} undeliverable users")
+        pending = [(key, row) for key, row in pending if row[0] not in blocked]
+    return pending
+
+async def send_dm_item(item):
+    """Send one planned birthday DM. Returns True if it was sent."""
+    _, (user_id, guild_id, birth_year, announce_in_servers, receive_dms, share_age) = item
+    user = await user_resolver.resolve(user_id, guild_id)
+    return bool(user) and await send_birthday_dm(user, birth_year, share_age, guild_id)
+
+async def deliver_birthday_dms(today):
+    """Send today's birthday DMs that haven't been sent yet"""
+    pending = await plan_birthday_dms(today)
+    results = await fan_out(pending, send_dm_item, DELIVERY_CONCURRENCY)
+    await record_deliveries([result.item[0] for result in results if result.ok])
+    return results
+
+async def plan_announcements(guilds):
+    """
+    Get the birthday announcements still to be made in each guild on its own local date,
+    as (rows, guild, announce_channel_id, mention_everyone, coalesced) items, one per message
+    """
+    guild_dates = await get_guild_dates(guilds)
+    birthdays = await get_birthdays_for_guilds(
+        {guild_id: birthday_days(date) for guild_id, date in guild_dates.items()},
+        announce_only=True
+    )
+    
+    # Skip announcements that were already made for the guild's local date
+    announce_keys = [(user_id, guild_id, DELIVERY_ANNOUNCE, guild_dates[guild_id]) for user_id, guild_id, *_ in birthdays]
+    delivered = await get_delivered(announce_keys)
+    
+    # Group rows by guild so each guild's config is read once, all in one call
+    birthdays_by_guild = {}
+    for key, row in zip(announce_keys, birthdays):
+        if key not in delivered:
+            birthdays_by_guild.setdefault(row[1], []).append((key, row))
+    configs = await get_guild_configs(birthdays_by_guild)
+    
+    announce_guilds = []
+    for guild_id, rows in birthdays_by_guild.items():
+        guild = guilds.get(guild_id)
+        # Skip guilds without an announce channel
+        if guild and configs[guild_id].announce_channel:
+            announce_guilds.append((guild, configs[guild_id], rows))
+    
+    # Skip channels that are known to be deleted or unwritable
+    blocked = await get_undeliverable(TARGET_CHANNEL, {config.announce_channel for _, config, _ in announce_guilds})
+    if blocked:
+        logger.info(f"Skipping announcements in {len(blocked)} undeliverable channels")
+    
+    pending = []
+    for guild, config, rows in announce_guilds:
+        if config.announce_channel in blocked:
+            continue
+        
+        # Coalesced guilds get one item covering all of the day's birthdays
+        if config.coalesce_announcements:
+            pending.append((rows, guild, config.announce_channel, config.mention_everyone, True))
+        else:
+            pending.extend(([row], guild, config.announce_channel, config.mention_everyone, False) for row in rows)
+    return pending
+
+async def send_announcement_item(item):
+    """Send one planned announcement message. Returns the ledger keys it delivered."""
+    rows, guild, announce_channel_id, mention_everyone, _ = item
+    entries = []
+    for key, (user_id, _, birth_year, announce_in_servers, receive_dms, share_age) in rows:
+        member = guild.get_member(user_id)
+        if member:
+            entries.append((key, member, birth_year, share_age))
+    
+    # Everyone left the guild, there's nothing to send
+    if not entries:
+        return []
+    if len(entries) == 1:
+        key, member, birth_year, share_age = entries[0]
+        sent = await send_server_announcement(
+            guild, member, announce_channel_id, birth_year, share_age, mention_everyone
+        )
+        return [key] if sent else []
+    
+    announced = await send_coalesced_announcement(
+        guild, [entry[1:] for entry in entries], announce_channel_id, mention_everyone
+    )
+    return [entry[0] for entry in entries[:announced]]
+
+async def deliver_announcements(guilds):
+    """Send birthday announcements for each guild on its own local date"""
+    pending = await plan_announcements(guilds)
+    # Each result's value is the list of ledger keys it delivered
+    results = await fan_out(pending, send_announcement_item, DELIVERY_CONCURRENCY)
+    await record_deliveries([key for result in results if result.ok for key in result.value])
+    return results
+
+async def queue_birthday_dms(today):
+    """Write today's unsent birthday DMs to the job queue. Returns how many were added."""
+    pending = await plan_birthday_dms(today)
+    return await enqueue_jobs([
+        (DELIVERY_DM, guild_id, user_id, today, {"birth_year": birth_year, "share_age": share_age})
+        for _, (user_id, guild_id, birth_year, _, _, share_age) in pending
+    ])
+
+async def queue_announcements(guilds):
+    """Write each unsent announcement message to the job queue. Returns how many were added."""
+    jobs = []
+    for rows, guild, announce_channel_id, mention_everyone, coalesced in await plan_announcements(guilds):
+        # Keyed by the member, or by the guild alone in coalesced guilds so that
+        # members planned later are merged into the day's one message
+        target_id = 0 if coalesced else rows[0][1][0]
+        jobs.append((DELIVERY_ANNOUNCE, guild.id, target_id, rows[0][0][3], {
+            "channel_id": announce_channel_id,
+            "mention_everyone": mention_everyone,
+            "rows": [[user_id, birth_year, share_age] for _, (user_id, _, birth_year, _, _, share_age) in rows],
+        }))
+    return await enqueue_jobs(jobs)
+
+async def run_delivery_job(job):
+    """
+    Send one queued DM or announcement. Returns True once nothing is left to do:
+    it was sent, was already sent by an earlier attempt, or its target is undeliverable.
+    """
+    _, kind, guild_id, target_id, delivery_date, payload, _ = job
+    if kind == DELIVERY_DM:
+        key = (target_id, DM_LEDGER_GUILD, DELIVERY_DM, delivery_date)
+        if await get_delivered([key]) or await get_undeliverable(TARGET_USER, {target_id}):
+            return True
+        row = (target_id, guild_id, payload["birth_year"], 1, 1, payload["share_age"])
+        if await send_dm_item((key, row)):
+            await record_deliveries([key])
+            return True
+        # send_birthday_dm marks users with closed DMs, there's no point retrying those
+        return bool(await get_undeliverable(TARGET_USER, {target_id}))
+
+    guild = bot.get_guild(guild_id)
+    if not guild or guild.unavailable:
+        # Retry guilds in an outage or still loading, a guild missing once every shard is ready has been left
+        return not guild and bot.is_ready()
+    channel_id = payload["channel_id"]
+    if await get_undeliverable(TARGET_CHANNEL, {channel_id}):
+        return True
+    rows = [
+        ((user_id, guild_id, DELIVERY_ANNOUNCE, delivery_date), (user_id, guild_id, birth_year, 1, 1, share_age))
+        for user_id, birth_year, share_age in payload["rows"]
+    ]
+    delivered = await get_delivered([key for key, _ in rows])
+    rows = [(key, row) for key, row in rows if key not in delivered and guild.get_member(row[0])]
+    if not rows:
+        return True
+    keys = await send_announcement_item((rows, guild, channel_id, payload["mention_everyone"], target_id == 0))
+    await record_deliveries(keys)
+    return len(keys) == len(rows) or bool(await get_undeliverable(TARGET_CHANNEL, {channel_id}))
+
+# Sends queued deliveries when DELIVERY_MODE=queue, see delivery_queue.py
+delivery_workers = DeliveryWorkers(run_delivery_job)
+
+async def check_birthdays(guild_ids=None, include_dms=True):
+    """
+    Deliver birthday DMs and announcements.
+    guild_ids limits announcements to those guilds (all guilds if None), and
+    include_dms controls whether today's UTC birthday DMs are sent too.
+    Returns the run's stats.
+    """
     logger.info("Checking for birthdays...")
+    started = time.perf_counter()
+    stats = {}
+    user_resolver.reset_stats()
     
     try:
-        # Check for UTC birthdays (for DMs)
-        utc_date = get_current_date_mmdd()
-        birthdays = get_birthdays_for_date(utc_date)
+        utc_today = get_current_date()
+        if include_dms:
+            # Check for UTC birthdays (for DMs)
+            if DELIVERY_MODE == "queue":
+                stats["dms_queued"] = await queue_birthday_dms(utc_today)
+                delivery_workers.notify()
+            else:
+                dm_results = await deliver_birthday_dms(utc_today)
+                stats["dms_sent"], stats["dms_failed"] = count_results(dm_results)
         
-        for user_id, guild_id, birth_year, announce_in_servers, receive_dms, share_age in birthdays:
-            # Send DM if enabled
-            if receive_dms == 1:
-                try:
-                    user = await bot.fetch_user(user_id)
-                    if user:
-                        await send_birthday_dm(user, birth_year, share_age)
-                except Exception as e:
-                    logger.error(f"Error sending DM to user {user_id}: {e}")
+        # Check for server-specific birthdays, each guild on its own local date
+        if guild_ids is None:
+            guilds = {guild.id: guild for guild in bot.guilds}
+        else:
+            guilds = {guild_id: bot.get_guild(guild_id) for guild_id in guild_ids if bot.get_guild(guild_id)}
+        if DELIVERY_MODE == "queue":
+            stats["announcements_queued"] = await queue_announcements(guilds)
+            delivery_workers.notify()
+        else:
+            announce_results = await deliver_announcements(guilds)
+            stats["announcements_sent"] = sum(len(result.value) for result in announce_results if result.ok)
+            stats["announcements_failed"] = count_results(announce_results)[1]
+            stats["announcement_messages"] = len(announce_results)
         
-        # Check for server-specific birthdays
-        for guild in bot.guilds:
-            # Get guild timezone
-            guild_tz = get_guild_timezone(guild.id)
-            guild_date = get_current_date_mmdd(guild_tz)
-            
-            # Skip if it's the same as UTC (already processed)
-            if guild_date == utc_date:
-                continue
-            
-            # Check for birthdays in this timezone
-            birthdays = get_birthdays_for_date(guild_date)
-            
-            for user_id, guild_id, birth_year, announce_in_servers, receive_dms, share_age in birthdays:
-                # Make sure user is in this guild and has server announcements enabled
-                if guild_id != guild.id or announce_in_servers != 1:
-                    continue
-                
-                # Check if announce channel is set
-                announce_channel_id = get_server_setting(guild.id, "announce_channel")
-                if not announce_channel_id:
-                    continue
-                
-                try:
-                    # Get the member
-                    member = guild.get_member(user_id)
-                    if not member:
-                        continue
-                    
-                    # Determine if @everyone should be mentioned
-                    mention_everyone = get_server_setting(guild.id, "mention_everyone") == "1"
-                    
-                    await send_server_announcement(
-                        guild, member, announce_channel_id, birth_year, share_age, mention_everyone
-                    )
-                except Exception as e:
-                    logger.error(f"Error sending announcement in guild {guild.id}: {e}")
+        if include_dms:
+            retention_cutoff = utc_today - datetime.timedelta(days=DELIVERY_RETENTION_DAYS)
+            await prune_deliveries(retention_cutoff)
+            await prune_jobs(retention_cutoff)
+            await prune_undeliverable()
     
     except Exception as e:
         logger.error(f"Error in birthday check task: {e}")
+        stats["error"] = str(e)
+    
+    stats["users"] = user_resolver.stats()
+    stats["duration_s"] = round(time.perf_counter() - started, 3)
+    last_tick_stats.clear()
+    last_tick_stats.update(stats)
+    metrics.record_check(stats)
+    logger.info(f"Birthday check finished: {stats}")
+    logger.info(f"Guild config cache stats: {settings_cache.stats()}")
+    logger.info(f"Command channel policy stats: {command_gate.stats()}")
+    logger.info(f"Command limiter stats: {command_limiter.stats()}, load shedding: {load_shedder.stats()}")
+    logger.info(f"Outbound queue stats: {outbound.stats()}")
+    if DELIVERY_MODE == "queue":
+        logger.info(f"Delivery worker stats: {delivery_workers.stats()}")
+    logger.info(f"Database pool stats: {pool_stats()}")
+    return stats
+
+async def on_timezone_rollover(timezone, guild_ids):
+    """Process one timezone bucket at its local midnight. Returns True to retry later."""
+    stats = await check_birthdays(guild_ids, include_dms=(timezone == "UTC"))
+    return bool(stats.get("error") or stats.get("dms_failed") or stats.get("announcements_failed"))
 
-@check_birthdays.before_loop
-async def before_check_birthdays():
-    """Wait until the bot is ready before starting the task"""
-    await bot.wait_until_ready()
+# Wakes at each timezone's local midnight, see midnight_scheduler.py
+birthday_scheduler = MidnightScheduler(on_timezone_rollover)
+
+async def schedule_guilds(guilds):
+    """Put guilds into their timezone buckets"""
+    timezones = await get_guild_timezones(guild.id for guild in guilds)
+    for guild_id, timezone in timezones.items():
+        birthday_scheduler.set_guild_timezone(guild_id, timezone)
+
+async def start_scheduling():
+    """Take over birthday scheduling after being elected leader"""
+    await schedule_guilds(bot.guilds)
+    birthday_scheduler.start()
+    # Catch up on anything the previous leader didn't get to
+    run_in_background(check_birthdays())
+
+async def stop_scheduling():
+    """Stop scheduling birthdays after losing leadership"""
+    birthday_scheduler.stop()
+
+def owns_scheduling():
+    """True if this replica delivers birthdays"""
+    return leader_election is None or leader_election.is_leader
+
+# With COORDINATION=postgres, replicas running the same shards elect one
+# scheduler between them through an advisory lock keyed by their first shard
+leader_election = None
+if COORDINATION == "postgres":
+    if STORAGE_BACKEND != "postgres":
+        logger.warning("COORDINATION=postgres needs the postgres storage backend, scheduling on every replica")
+    else:
+        shard_ids = shard_config()["shard_ids"]
+        leader_election = LeaderElection(
+            AdvisoryLock(partition=shard_ids[0] if shard_ids else 0), start_scheduling, stop_scheduling
+        )
 
 if __name__ == '__main__':
     try:
@@ -543,4 +1053,5 @@ if __name__ == '__main__':
         logger.error(f"Error starting the bot: {e}")
     finally:
         # Cleanup
-        close_all_connections()
+        shutdown_executor()
+        get_storage().close()
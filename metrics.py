@@ -0,0 +1,209 @@
+"""
+Prometheus-style metrics for the bot and its database hot paths.
+
+Metrics are only recorded when METRICS_PORT is set. Otherwise `timed` returns
+functions unchanged and every inc/observe returns straight away, so the
+instrumentation costs next to nothing. When enabled, `start_metrics_server`
+serves everything in the text exposition format at http://METRICS_HOST:METRICS_PORT/metrics.
+"""
+import os
+import time
+import asyncio
+import logging
+import threading
+from bisect import bisect_left
+from functools import wraps
+
+logger = logging.getLogger('birthday_bot')
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+ENABLED = METRICS_PORT > 0
+
+# Seconds between event-loop lag samples
+LOOP_LAG_INTERVAL = float(os.getenv("METRICS_LOOP_LAG_INTERVAL", "0.5"))
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_metrics = []
+_collectors = []
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    """Base for a named metric with optional labels"""
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+    type = "counter"
+
+    def inc(self, *labels, amount=1):
+        if not ENABLED:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+class Histogram(_Metric):
+    """Distribution of observations in cumulative buckets"""
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, *labels, value):
+        if not ENABLED:
+            return
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                # Per-bucket counts (the last one is +Inf), then sum
+                entry = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            entry[index] += 1
+            entry[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            items = sorted((labels, list(entry)) for labels, entry in self._values.items())
+        for labels, entry in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), entry[:-1]):
+                cumulative += count
+                le = _format_labels(self.labelnames, labels, [("le", _format_value(float(bound)))])
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            label_str = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_str} {_format_value(entry[-1])}")
+            lines.append(f"{self.name}_count{label_str} {cumulative}")
+        return lines
+
+def add_collector(collect):
+    """
+    Register a function called at scrape time. It returns an iterable of
+    (name, type, documentation, value) for values read from elsewhere, e.g. pool stats.
+    """
+    _collectors.append(collect)
+
+def render():
+    """Render every metric in the text exposition format"""
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    for collect in _collectors:
+        try:
+            samples = list(collect())
+        except Exception as e:
+            logger.error(f"Error collecting metrics: {e}")
+            continue
+        for name, metric_type, documentation, value in samples:
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            lines.append(f"{name} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+# Database
+db_calls = Counter("birthday_bot_db_calls_total", "Calls to each data_access function", ["function"])
+db_latency = Histogram("birthday_bot_db_call_duration_seconds", "Latency of each data_access function", ["function"])
+db_errors = Counter("birthday_bot_db_errors_total", "Database operations that raised inside a pooled connection")
+
+# Commands
+command_latency = Histogram(
+    "birthday_bot_command_duration_seconds", "Latency of each bot command", ["command", "status"]
+)
+
+# Birthday checks
+check_duration = Histogram(
+    "birthday_bot_check_duration_seconds", "Duration of each birthday check",
+    buckets=(0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0)
+)
+check_errors = Counter("birthday_bot_check_errors_total", "Birthday checks that ended with an error")
+deliveries = Counter("birthday_bot_deliveries_total", "Birthday DMs and announcements by result", ["kind", "result"])
+commands_rejected = Counter("birthday_bot_commands_rejected_total", "Commands rejected by rate limits or load shedding", ["reason"])
+
+# Event loop
+loop_lag = Histogram("birthday_bot_event_loop_lag_seconds", "How late the event loop wakes from a timed sleep")
+
+def timed(func):
+    """Count calls to a blocking function and record their latency"""
+    if not ENABLED:
+        return func
+    name = func.__name__
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            db_calls.inc(name)
+            db_latency.observe(name, value=time.perf_counter() - started)
+    return wrapper
+
+def record_check(stats):
+    """Record the stats returned by one birthday check"""
+    if not ENABLED:
+        return
+    check_duration.observe(value=stats.get("duration_s", 0.0))
+    if stats.get("error"):
+        check_errors.inc()
+    deliveries.inc("dm", "sent", amount=stats.get("dms_sent", 0))
+    deliveries.inc("dm", "failed", amount=stats.get("dms_failed", 0))
+    deliveries.inc("announce", "sent", amount=stats.get("announcements_sent", 0))
+    deliveries.inc("announce", "failed", amount=stats.get("announcements_failed", 0))
+
+async def monitor_loop_lag(interval=LOOP_LAG_INTERVAL):
+    """Sample event-loop lag forever"""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        loop_lag.observe(value=max(0.0, loop.time() - started - interval))
+
+async def start_metrics_server(host=METRICS_HOST, port=METRICS_PORT):
+    """Serve /metrics over HTTP. Returns the runner, or None when metrics are disabled."""
+    if not ENABLED:
+        return None
+    from aiohttp import web
+
+    async def handle(request):
+        return web.Response(body=render().encode(), headers={"Content-Type": CONTENT_TYPE})
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+    return runner
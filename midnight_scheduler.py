@@ -0,0 +1,141 @@
+import os
+import heapq
+import asyncio
+import datetime
+import logging
+import itertools
+
+import pytz
+
+from utils import next_local_midnight
+
+logger = logging.getLogger('birthday_bot')
+
+# Delay before re-running a timezone whose deliveries had failures, and how many times
+RETRY_DELAY = float(os.getenv("BIRTHDAY_RETRY_DELAY", "900"))
+MAX_RETRIES = int(os.getenv("BIRTHDAY_MAX_RETRIES", "3"))
+
+# Longest single sleep, so clock jumps and suspends are noticed
+MAX_SLEEP = 3600
+
+class MidnightScheduler:
+    """
+    Wake at each timezone's local midnight and process only that timezone's guilds.
+
+    Guilds are grouped into one bucket per timezone. A min-heap holds the next
+    local-midnight instant of every bucket, so the scheduler sleeps until the
+    earliest rollover instead of polling. `on_rollover(timezone, guild_ids)` is
+    awaited for each rollover and may return True to ask for a retry later.
+    The "UTC" bucket is always kept, even with no guilds, since DMs follow UTC.
+    """
+
+    def __init__(self, on_rollover, retry_delay=RETRY_DELAY, max_retries=MAX_RETRIES,
+                 clock=lambda: datetime.datetime.now(pytz.UTC)):
+        self.on_rollover = on_rollover
+        self.retry_delay = retry_delay
+        self.max_retries = max_retries
+        self._clock = clock
+        self.buckets = {"UTC": set()}
+        self.guild_timezones = {}
+        self._heap = []  # (when, seq, timezone, is_retry)
+        self._scheduled = set()
+        self._retries = {}
+        self._seq = itertools.count()
+        self._wakeup = None
+        self._task = None
+        self._schedule("UTC")
+
+    def set_guild_timezone(self, guild_id, timezone):
+        """Add a guild to a timezone bucket, moving it out of its old one"""
+        old_timezone = self.guild_timezones.get(guild_id)
+        if old_timezone == timezone:
+            return
+        if old_timezone is not None:
+            self._discard(guild_id, old_timezone)
+
+        self.guild_timezones[guild_id] = timezone
+        self.buckets.setdefault(timezone, set()).add(guild_id)
+        if timezone not in self._scheduled:
+            self._schedule(timezone)
+            if self._wakeup:
+                self._wakeup.set()
+
+    def remove_guild(self, guild_id):
+        """Stop scheduling a guild"""
+        timezone = self.guild_timezones.pop(guild_id, None)
+        if timezone is not None:
+            self._discard(guild_id, timezone)
+
+    def next_rollover(self):
+        """Get the next (instant, timezone) the scheduler will wake for, or None"""
+        return (self._heap[0][0], self._heap[0][2]) if self._heap else None
+
+    def start(self):
+        """Start the scheduler loop on the running event loop"""
+        if self._task is None or self._task.done():
+            # Created here so it binds to the running loop rather than the one at import time
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        """Stop the scheduler loop"""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def _discard(self, guild_id, timezone):
+        bucket = self.buckets.get(timezone)
+        if bucket is not None:
+            bucket.discard(guild_id)
+            if not bucket and timezone != "UTC":
+                # The heap entry is dropped lazily when it comes due
+                del self.buckets[timezone]
+
+    def _schedule(self, timezone):
+        when = next_local_midnight(timezone, self._clock())
+        heapq.heappush(self._heap, (when, next(self._seq), timezone, False))
+        self._scheduled.add(timezone)
+
+    def _schedule_retry(self, timezone):
+        count = self._retries.get(timezone, 0)
+        if count >= self.max_retries:
+            return
+        self._retries[timezone] = count + 1
+        when = self._clock() + datetime.timedelta(seconds=self.retry_delay)
+        heapq.heappush(self._heap, (when, next(self._seq), timezone, True))
+
+    async def _run(self):
+        while True:
+            now = self._clock()
+            due = []
+            while self._heap and self._heap[0][0] <= now:
+                _, _, timezone, is_retry = heapq.heappop(self._heap)
+                if not is_retry:
+                    self._scheduled.discard(timezone)
+                    self._retries.pop(timezone, None)
+                    if timezone in self.buckets:
+                        self._schedule(timezone)
+                if timezone in self.buckets and timezone not in due:
+                    due.append(timezone)
+
+            for timezone in due:
+                guild_ids = set(self.buckets.get(timezone, ()))
+                logger.info(f"Local midnight in {timezone}: processing {len(guild_ids)} guilds")
+                try:
+                    if await self.on_rollover(timezone, guild_ids):
+                        self._schedule_retry(timezone)
+                except Exception as e:
+                    logger.error(f"Error processing timezone {timezone}: {e}")
+                    self._schedule_retry(timezone)
+
+            if due:
+                continue
+
+            delay = MAX_SLEEP
+            if self._heap:
+                delay = min(delay, max(0.0, (self._heap[0][0] - self._clock()).total_seconds()))
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
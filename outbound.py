@@ -0,0 +1,230 @@
+import os
+import time
+import heapq
+import asyncio
+import logging
+import itertools
+
+logger = logging.getLogger('birthday_bot')
+
+# Priority classes, lowest value is sent first
+PRIORITY_REPLY = 0
+PRIORITY_ANNOUNCE = 1
+PRIORITY_DM = 2
+
+PRIORITY_NAMES = {
+    PRIORITY_REPLY: "reply",
+    PRIORITY_ANNOUNCE: "announce",
+    PRIORITY_DM: "dm",
+}
+
+# Defaults stay under Discord's limits of 50 requests/second globally
+# and 5 messages per 5 seconds per channel
+OUTBOUND_GLOBAL_RATE = float(os.getenv("OUTBOUND_GLOBAL_RATE", "40"))
+OUTBOUND_GLOBAL_BURST = float(os.getenv("OUTBOUND_GLOBAL_BURST", "40"))
+OUTBOUND_ROUTE_RATE = float(os.getenv("OUTBOUND_ROUTE_RATE", "1"))
+OUTBOUND_ROUTE_BURST = float(os.getenv("OUTBOUND_ROUTE_BURST", "5"))
+
+class TokenBucket:
+    """Token bucket refilled at `rate` tokens per second up to `capacity`"""
+
+    def __init__(self, rate, capacity, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self._clock = clock
+        self._updated = clock()
+
+    def _refill(self):
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay(self):
+        """Seconds until a token is available, 0 if one is available now"""
+        self._refill()
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def try_acquire(self):
+        """Take a token if one is available. Returns True on success."""
+        if self.delay() > 0:
+            return False
+        self.tokens -= 1
+        return True
+
+    def is_full(self):
+        """True if the bucket has refilled completely"""
+        self._refill()
+        return self.tokens >= self.capacity
+
+class _Route:
+    """Pending jobs and rate limit for one channel or DM recipient"""
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self.jobs = []  # heap of (priority, seq, send, future)
+        self.state = None  # None, "ready" or "waiting"
+        self.ready_seq = None
+
+class OutboundScheduler:
+    """
+    Central queue for outbound Discord messages.
+
+    Jobs are sent in priority order (replies, then announcements, then DMs),
+    limited by a global token bucket and one token bucket per route, so a burst
+    of announcements is smoothed out over time and never starves command replies.
+    """
+
+    # Seconds between sweeps of idle route state
+    EVICT_INTERVAL = 5.0
+
+    def __init__(self, global_rate=OUTBOUND_GLOBAL_RATE, global_burst=OUTBOUND_GLOBAL_BURST,
+                 route_rate=OUTBOUND_ROUTE_RATE, route_burst=OUTBOUND_ROUTE_BURST,
+                 clock=time.monotonic):
+        self.route_rate = route_rate
+        self.route_burst = route_burst
+        self._clock = clock
+        self._global = TokenBucket(global_rate, global_burst, clock)
+        self._routes = {}
+        self._ready = []    # heap of (priority, seq, route) for routes that can send
+        self._waiting = []  # heap of (ready_at, seq, route) for routes out of tokens
+        self._seq = itertools.count()
+        self._last_evict = clock()
+        self._wakeup = None
+        self._task = None
+        self._in_flight = set()
+        self.sent = {name: 0 for name in PRIORITY_NAMES.values()}
+        self.failed = {name: 0 for name in PRIORITY_NAMES.values()}
+
+    def start(self):
+        """Start the dispatcher task on the running event loop"""
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._dispatch())
+
+    async def stop(self):
+        """Stop the dispatcher and wait for in-flight sends to finish"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+
+    async def submit(self, priority, route, send):
+        """
+        Queue a send and wait for it to go out.
+        `send` is a zero-argument function returning an awaitable, e.g.
+        `lambda: channel.send(message)`. Returns its result or raises its exception.
+        """
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        entry = self._routes.get(route)
+        if entry is None:
+            entry = self._routes[route] = _Route(TokenBucket(self.route_rate, self.route_burst, self._clock))
+
+        job = (priority, next(self._seq), send, future)
+        heapq.heappush(entry.jobs, job)
+        if entry.state is None or (entry.state == "ready" and entry.jobs[0] is job):
+            # Queue the route, or re-queue it at the new head's priority
+            self._push_ready(route, entry)
+        self._wakeup.set()
+        return await future
+
+    def pending(self):
+        """Number of jobs waiting to be sent"""
+        return sum(len(entry.jobs) for entry in self._routes.values())
+
+    def stats(self):
+        """Get queue depth and sent/failed counters per priority class"""
+        return {
+            "pending": self.pending(),
+            "routes": len(self._routes),
+            "sent": dict(self.sent),
+            "failed": dict(self.failed),
+        }
+
+    def _push_ready(self, route, entry):
+        priority, seq = entry.jobs[0][:2]
+        entry.state = "ready"
+        entry.ready_seq = seq
+        heapq.heappush(self._ready, (priority, seq, route))
+
+    def _next_delay(self):
+        """Seconds until the dispatcher could have something to do, None if idle"""
+        if self._ready:
+            return self._global.delay()
+        if self._waiting:
+            return max(0.0, self._waiting[0][0] - self._clock())
+        return None
+
+    async def _dispatch(self):
+        while True:
+            now = self._clock()
+            while self._waiting and self._waiting[0][0] <= now:
+                _, _, route = heapq.heappop(self._waiting)
+                entry = self._routes.get(route)
+                if entry:
+                    entry.state = None
+                    if entry.jobs:
+                        self._push_ready(route, entry)
+
+            if now - self._last_evict >= self.EVICT_INTERVAL:
+                self._evict_idle_routes()
+                self._last_evict = now
+
+            delay = self._next_delay()
+            if delay is None or delay > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            priority, seq, route = heapq.heappop(self._ready)
+            entry = self._routes.get(route)
+            if not entry or entry.state != "ready" or entry.ready_seq != seq:
+                # Superseded by a newer entry for the same route
+                continue
+
+            route_delay = entry.bucket.delay()
+            if route_delay > 0:
+                entry.state = "waiting"
+                heapq.heappush(self._waiting, (now + route_delay, seq, route))
+                continue
+
+            entry.bucket.try_acquire()
+            self._global.try_acquire()
+            priority, _, send, future = heapq.heappop(entry.jobs)
+            entry.state = None
+            if entry.jobs:
+                self._push_ready(route, entry)
+
+            task = asyncio.create_task(self._run(priority, send, future))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    def _evict_idle_routes(self):
+        # Drop rate-limit state for routes with nothing queued and a full bucket
+        idle = [route for route, entry in self._routes.items() if not entry.jobs and entry.bucket.is_full()]
+        for route in idle:
+            del self._routes[route]
+
+    async def _run(self, priority, send, future):
+        name = PRIORITY_NAMES.get(priority, str(priority))
+        try:
+            result = await send()
+        except Exception as e:
+            self.failed[name] = self.failed.get(name, 0) + 1
+            if not future.done():
+                future.set_exception(e)
+            return
+        self.sent[name] = self.sent.get(name, 0) + 1
+        if not future.done():
+            future.set_result(result)
@@ -0,0 +1,140 @@
+"""
+Check the query plans of the hot-path queries against a large seeded dataset.
+
+Creates a scratch schema, builds the bot's tables and indexes in it with
+database.create_schema, seeds it with generated profiles, memberships and guild configs, then runs
+EXPLAIN on each query used by check_birthdays and the commands. Exits with a
+non-zero status if any of them falls back to a sequential scan of those tables.
+
+Usage:
+    python scripts/check_query_plans.py --rows 1000000 --guilds 100000
+"""
+import os
+import sys
+import json
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import init_pool, get_connection, release_connection, create_schema
+from storage_postgres import (
+    USER_BIRTHDAY_SQL, BIRTHDAYS_FOR_GUILDS_SQL, LIST_GUILD_BIRTHDAYS_SQL, GUILD_CONFIGS_SQL, birthdays_for_date_sql,
+)
+
+SCHEMA = "plan_check"
+CHECKED_RELATIONS = {"profiles", "memberships", "guild_config"}
+
+# The bot's own SQL, with parameters overridden per query where the shared ones don't fit
+QUERIES = {
+    "get_birthdays_for_date": (birthdays_for_date_sql(), {}),
+    "get_birthdays_for_date (dms_only)": (birthdays_for_date_sql(dms_only=True), {}),
+    "get_birthdays_for_date (dms_only, sharded)": (birthdays_for_date_sql(dms_only=True, sharded=True), {}),
+    "get_birthdays_for_guilds": (BIRTHDAYS_FOR_GUILDS_SQL, {}),
+    "list_guild_birthdays": (LIST_GUILD_BIRTHDAYS_SQL, {"last_day": 366}),
+    "get_user_birthday": (USER_BIRTHDAY_SQL, {}),
+    "get_guild_configs": (GUILD_CONFIGS_SQL, {}),
+}
+
+def seed(cur, rows, guilds):
+    """Fill the scratch tables with generated data and refresh statistics"""
+    # About one user in five is registered in a second guild
+    cur.execute("""
+        INSERT INTO profiles (user_id, birthday, birth_year, receive_dms, share_age)
+        SELECT n,
+               1 + n %% 366,
+               CASE WHEN n %% 3 = 0 THEN 1950 + n %% 60 END,
+               (n %% 4 = 0)::int,
+               (n %% 5 = 0)::int
+        FROM generate_series(1, %(users)s) AS n
+    """, {"users": max(1, rows * 4 // 5)})
+    cur.execute("""
+        INSERT INTO memberships (user_id, guild_id, birthday, announce_in_servers)
+        SELECT p.user_id, m.n %% %(guilds)s, p.birthday, (m.n %% 10 <> 0)::int
+        FROM generate_series(1, %(rows)s) AS m(n)
+        JOIN profiles p ON p.user_id = 1 + (m.n - 1) %% %(users)s
+        ON CONFLICT (user_id, guild_id) DO NOTHING
+    """, {"rows": rows, "users": max(1, rows * 4 // 5), "guilds": guilds})
+    cur.execute("""
+        INSERT INTO guild_config (guild_id, timezone, announce_channel)
+        SELECT g, 'UTC', 1
+        FROM generate_series(0, %(guilds)s - 1) AS g
+    """, {"guilds": guilds})
+    cur.execute("ANALYZE profiles")
+    cur.execute("ANALYZE memberships")
+    cur.execute("ANALYZE guild_config")
+
+def find_seq_scans(plan):
+    """Return the relations that a JSON plan reads with a sequential scan"""
+    found = []
+    if plan.get("Node Type") == "Seq Scan" and plan.get("Relation Name") in CHECKED_RELATIONS:
+        found.append(plan["Relation Name"])
+    for child in plan.get("Plans", []):
+        found.extend(find_seq_scans(child))
+    return found
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000000, help="Number of memberships rows to seed")
+    parser.add_argument("--guilds", type=int, default=100000, help="Number of distinct guilds")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch schema afterwards")
+    args = parser.parse_args()
+
+    params = {
+        "first_day": 186,
+        "last_day": 186,
+        "guild_ids": list(range(200)),
+        "firsts": [186] * 200,
+        "lasts": [186] * 200,
+        "announce_only": True,
+        "shard_count": 16,
+        "shard_ids": [0, 1, 2, 3],
+        "user_id": 12345,
+        "guild_id": 12345 % args.guilds,
+        "after_birthday": 186,
+        "after_user": 12345,
+        "limit": 21,
+    }
+
+    init_pool()
+    conn = get_connection()
+    if not conn:
+        print("No database connection available")
+        return 2
+
+    failures = 0
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+            cur.execute(f"CREATE SCHEMA {SCHEMA}")
+            cur.execute(f"SET search_path TO {SCHEMA}")
+            create_schema(cur)
+            print(f"Seeding {args.rows} memberships across {args.guilds} guilds...")
+            seed(cur, args.rows, args.guilds)
+            conn.commit()
+
+            for name, (query, overrides) in QUERIES.items():
+                cur.execute("EXPLAIN (FORMAT JSON) " + query, dict(params, **overrides))
+                plan = cur.fetchone()[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                root = plan[0]["Plan"]
+                seq_scans = find_seq_scans(root)
+                status = "FAIL" if seq_scans else "ok"
+                detail = f" (seq scan on {', '.join(seq_scans)})" if seq_scans else ""
+                print(f"[{status}] {name}: {root['Node Type']}, cost {root['Total Cost']}{detail}")
+                failures += bool(seq_scans)
+    finally:
+        conn.rollback()
+        if not args.keep:
+            with conn.cursor() as cur:
+                cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+            conn.commit()
+        with conn.cursor() as cur:
+            cur.execute("RESET search_path")
+        conn.commit()
+        release_connection(conn)
+
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,73 @@
+import time
+import threading
+from collections import OrderedDict
+
+# Returned by SettingsCache.get when there is no usable entry
+MISSING = object()
+
+class SettingsCache:
+    """
+    Bounded in-process cache of per-guild configs, one entry per guild.
+    Entries expire after `ttl` seconds and the least recently used entry is
+    evicted once `max_size` is reached. Safe to use from executor threads.
+    """
+
+    def __init__(self, max_size=10000, ttl=300, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, guild_id):
+        """Get a cached value, or MISSING if it isn't cached or has expired"""
+        with self._lock:
+            entry = self._entries.get(guild_id)
+            if entry is None:
+                self.misses += 1
+                return MISSING
+
+            expires_at, value = entry
+            if expires_at <= self._clock():
+                del self._entries[guild_id]
+                self.misses += 1
+                return MISSING
+
+            self._entries.move_to_end(guild_id)
+            self.hits += 1
+            return value
+
+    def set(self, guild_id, value):
+        """Store a value, evicting the least recently used entry if full"""
+        with self._lock:
+            self._entries[guild_id] = (self._clock() + self.ttl, value)
+            self._entries.move_to_end(guild_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, guild_id):
+        """Drop a guild's entry"""
+        with self._lock:
+            self._entries.pop(guild_id, None)
+
+    def clear(self):
+        """Drop every entry and reset the counters"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """Get hit/miss counters for reporting"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
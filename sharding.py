@@ -0,0 +1,55 @@
+import os
+from collections import namedtuple
+
+# Total shards across every process, 0 to let Discord recommend a count
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "0"))
+
+# Shards this process runs, e.g. "0-3" or "0,2,4". Empty runs every shard.
+SHARD_IDS = os.getenv("SHARD_IDS", "")
+
+def parse_shard_ids(value):
+    """Parse a shard list like "0-3,8" into sorted shard IDs, None if empty"""
+    ids = set()
+    for part in value.replace(" ", "").split(","):
+        if not part:
+            continue
+        if "-" in part:
+            first, last = part.split("-", 1)
+            ids.update(range(int(first), int(last) + 1))
+        else:
+            ids.add(int(part))
+    return sorted(ids) or None
+
+def shard_for_guild(guild_id, shard_count):
+    """The shard Discord routes a guild's events to"""
+    return (guild_id >> 22) % shard_count
+
+def shard_config(shard_count=SHARD_COUNT, shard_ids=SHARD_IDS):
+    """
+    Get (shard_count, shard_ids) keyword arguments for AutoShardedBot.
+    A process running a subset of shards needs an explicit shard count.
+    """
+    ids = parse_shard_ids(shard_ids)
+    if ids is not None and not shard_count:
+        raise ValueError("SHARD_COUNT must be set when SHARD_IDS is")
+    if ids is not None and ids[-1] >= shard_count:
+        raise ValueError(f"SHARD_IDS {shard_ids!r} out of range for {shard_count} shards")
+    return {"shard_count": shard_count or None, "shard_ids": ids}
+
+class ShardFilter(namedtuple("ShardFilter", "count ids")):
+    """
+    The guilds owned by a subset of shards: guild_id's shard must be in `ids`.
+    Storage backends apply it in their queries so a process only reads its own guilds.
+    """
+
+    def owns(self, guild_id):
+        return shard_for_guild(guild_id, self.count) in self.ids
+
+def shard_filter(shard_count, shard_ids):
+    """Build a ShardFilter for the shards a bot runs, None if it runs all of them"""
+    if not shard_count or shard_count <= 1 or shard_ids is None:
+        return None
+    ids = frozenset(shard_ids)
+    if ids >= set(range(shard_count)):
+        return None
+    return ShardFilter(shard_count, ids)
@@ -0,0 +1,263 @@
+"""
+Storage backends behind data_access.
+
+STORAGE_BACKEND picks the implementation: "postgres" (default), "sqlite" for
+small self-hosted deployments without a database server, or "memory" for
+tests and benchmarks. Every backend implements the Storage interface with the
+same arguments and return shapes as the data_access functions. Birthdays are
+stored as their day of the leap year (see utils.encode_birthday) and looked up
+by (first, last) ranges of those days.
+"""
+import os
+import abc
+import asyncio
+import logging
+from collections import namedtuple
+
+from db_executor import run_db
+from settings_cache import MISSING
+
+logger = logging.getLogger('database')
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "postgres").lower()
+SQLITE_PATH = os.getenv("SQLITE_PATH", "birthday_bot.db")
+
+# Per-user settings. announce_in_servers is kept per guild, the others are
+# part of the user's profile and apply in every guild.
+USER_SETTINGS = ("announce_in_servers", "receive_dms", "share_age")
+GUILD_SETTINGS = ("announce_in_servers",)
+
+# A guild's configuration, one typed row per guild in guild_config. Channels are
+# IDs or None, timezone is None until an admin sets one.
+GuildConfig = namedtuple(
+    "GuildConfig", "timezone announce_channel command_channel mention_everyone coalesce_announcements"
+)
+DEFAULT_GUILD_CONFIG = GuildConfig(None, None, None, False, False)
+
+def split_users(users):
+    """
+    Split users rows (user_id, guild_id, birthday, birth_year, announce_in_servers,
+    receive_dms, share_age) into profile rows (user_id, birthday, birth_year,
+    receive_dms, share_age) and membership rows (user_id, guild_id, birthday,
+    announce_in_servers). A user's first row supplies their profile.
+    """
+    profiles = {}
+    memberships = []
+    for user_id, guild_id, birthday, birth_year, announce, receive_dms, share_age in users:
+        profile = profiles.setdefault(user_id, (user_id, birthday, birth_year, receive_dms, share_age))
+        memberships.append((user_id, guild_id, profile[1], announce))
+    return list(profiles.values()), memberships
+
+def merge_job_payload(queued, payload):
+    """
+    Merge the payload of a job queued again into the queued job's payload.
+    Announcement payloads carry [user_id, birth_year, share_age] rows, and
+    members the queued job lacks are added to it. Returns the merged payload,
+    or None if there's nothing new to send.
+    """
+    if "rows" not in queued or "rows" not in payload:
+        return None
+    queued_users = {row[0] for row in queued["rows"]}
+    added = [row for row in payload["rows"] if row[0] not in queued_users]
+    if not added:
+        return None
+    return dict(payload, rows=queued["rows"] + added)
+
+class Storage(abc.ABC):
+    """
+    Interface for a storage backend. See data_access for what each method does.
+    Methods report errors by returning the same defaults data_access always has,
+    except get_guild_configs, which returns MISSING so the failure isn't cached.
+    A backend missing any abstract method fails when it's created.
+    """
+    name = None
+
+    async def start(self):
+        """Prepare the backend without blocking the event loop. Returns True when ready."""
+        await run_db(self.initialize)
+        return True
+
+    def initialize(self):
+        """Create tables and indexes if they don't exist"""
+
+    def close(self):
+        """Release connections and files"""
+
+    @abc.abstractmethod
+    def ping(self):
+        """Check the backend answers a trivial query, for health checks. Returns True on success."""
+
+    @abc.abstractmethod
+    def load(self, users, guild_configs=()):
+        """
+        Bulk load users rows (user_id, guild_id, birthday, birth_year, announce_in_servers,
+        receive_dms, share_age) and guild_configs rows (guild_id, *GuildConfig), splitting
+        users rows with split_users. Returns the membership count.
+        """
+
+    # User operations
+    @abc.abstractmethod
+    def set_birthday(self, user_id, guild_id, birthday):
+        ...
+
+    @abc.abstractmethod
+    def clear_birthday(self, user_id, guild_id):
+        ...
+
+    @abc.abstractmethod
+    def set_birth_year(self, user_id, guild_id, birth_year):
+        ...
+
+    @abc.abstractmethod
+    def toggle_user_setting(self, user_id, guild_id, setting, value=None):
+        ...
+
+    @abc.abstractmethod
+    def get_user_birthday(self, user_id, guild_id):
+        ...
+
+    @abc.abstractmethod
+    def get_birthdays_for_date(self, days, dms_only=False, shard=None):
+        ...
+
+    @abc.abstractmethod
+    def get_birthdays_for_guilds(self, guild_days, announce_only=False):
+        ...
+
+    @abc.abstractmethod
+    def list_guild_birthdays(self, guild_id, days, after=None, limit=25):
+        ...
+
+    @abc.abstractmethod
+    def clean_up_user_data(self, user_id, guild_id=None):
+        ...
+
+    # Guild config operations
+    @abc.abstractmethod
+    def get_guild_configs(self, guild_ids):
+        ...
+
+    @abc.abstractmethod
+    def update_guild_config(self, guild_id, changes):
+        ...
+
+    # Delivery ledger operations
+    @abc.abstractmethod
+    def get_delivered(self, keys):
+        ...
+
+    @abc.abstractmethod
+    def record_deliveries(self, keys):
+        ...
+
+    @abc.abstractmethod
+    def prune_deliveries(self, before_date):
+        ...
+
+    # Undeliverable target operations
+    @abc.abstractmethod
+    def mark_undeliverable(self, target_type, target_id, guild_id, reason, ttl_seconds):
+        ...
+
+    @abc.abstractmethod
+    def get_undeliverable(self, target_type, target_ids):
+        ...
+
+    @abc.abstractmethod
+    def clear_undeliverable(self, target_type, target_id):
+        ...
+
+    @abc.abstractmethod
+    def list_undeliverable(self, guild_id, limit=25):
+        ...
+
+    @abc.abstractmethod
+    def prune_undeliverable(self):
+        ...
+
+    # Delivery job operations
+    @abc.abstractmethod
+    def enqueue_jobs(self, jobs):
+        ...
+
+    @abc.abstractmethod
+    def claim_jobs(self, limit, lease_seconds, shard=None):
+        ...
+
+    @abc.abstractmethod
+    def complete_jobs(self, job_ids):
+        ...
+
+    @abc.abstractmethod
+    def retry_job(self, job_id, delay_seconds, error):
+        ...
+
+    @abc.abstractmethod
+    def fail_job(self, job_id, error):
+        ...
+
+    @abc.abstractmethod
+    def prune_jobs(self, before_date):
+        ...
+
+    @abc.abstractmethod
+    def job_counts(self):
+        ...
+
+_storage = None
+_ready_event = None
+
+def create_storage(backend=STORAGE_BACKEND):
+    """Create a backend by name"""
+    if backend == "postgres":
+        from storage_postgres import PostgresStorage
+        return PostgresStorage()
+    if backend == "sqlite":
+        from storage_sqlite import SQLiteStorage
+        return SQLiteStorage(SQLITE_PATH)
+    if backend == "memory":
+        from storage_memory import MemoryStorage
+        return MemoryStorage()
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+def get_storage():
+    """Get the configured backend, creating it on first use"""
+    global _storage
+    if _storage is None:
+        _storage = create_storage()
+    return _storage
+
+def set_storage(storage):
+    """Replace the backend, e.g. with a preloaded one in tests and benchmarks"""
+    global _storage
+    _storage = storage
+    return storage
+
+def _get_ready_event():
+    # Created lazily so it binds to the running event loop, not whichever existed at import
+    global _ready_event
+    if _ready_event is None:
+        _ready_event = asyncio.Event()
+    return _ready_event
+
+async def start_storage():
+    """Start the configured backend and signal readiness once it can serve queries"""
+    storage = get_storage()
+    logger.info(f"Starting {storage.name} storage")
+    try:
+        started = await storage.start()
+    except Exception as e:
+        # A failed schema or migration never signals ready, commands would hit missing tables
+        logger.error(f"Failed to start {storage.name} storage: {e}")
+        return False
+    if started:
+        _get_ready_event().set()
+    return started
+
+async def wait_until_ready(timeout=None):
+    """Wait for start_storage() to finish. Returns False if `timeout` seconds pass first."""
+    try:
+        await asyncio.wait_for(_get_ready_event().wait(), timeout)
+        return True
+    except asyncio.TimeoutError:
+        return False
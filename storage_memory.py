@@ -0,0 +1,356 @@
+"""
+In-memory storage backend for tests and benchmarks.
+
+Rows live in dicts indexed the way the SQL indexes are (by birthday and by
+guild and birthday), so lookups stay cheap at millions of users. Nothing is
+persisted. A lock makes each operation atomic across executor threads.
+"""
+import time
+import heapq
+import datetime
+import itertools
+import threading
+from functools import wraps
+
+from storage import Storage, USER_SETTINGS, GUILD_SETTINGS, GuildConfig, DEFAULT_GUILD_CONFIG, split_users, merge_job_payload
+
+PROFILE_SETTINGS = ("receive_dms", "share_age")
+
+def _locked(method):
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+class MemoryStorage(Storage):
+    """Storage in process memory"""
+    name = "memory"
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.profiles = {}  # user_id -> [birthday, birth_year, receive_dms, share_age]
+        self.memberships = {}  # (user_id, guild_id) -> announce_in_servers
+        self.guilds_of = {}  # user_id -> set of guild_id
+        self.by_birthday = {}  # encoded birthday -> set of user_id
+        self.by_guild_birthday = {}  # (guild_id, birthday) -> set of user_id
+        self.guild_configs = {}  # guild_id -> GuildConfig
+        self.deliveries = set()
+        self.undeliverable = {}  # (target_type, target_id) -> (guild_id, reason, failed_at, expires_at)
+        self.jobs = {}  # job_id -> [kind, guild_id, target_id, delivery_date, payload, status, attempts, run_at, last_error]
+        self.job_keys = {}  # (kind, guild_id, target_id, delivery_date) -> job_id
+        self.due_jobs = []  # heap of (run_at, job_id), entries whose run_at has since changed are skipped
+        self._job_ids = itertools.count(1)
+
+    def ping(self):
+        return True
+
+    @_locked
+    def load(self, users, guild_configs=()):
+        profiles, memberships = split_users(users)
+        for user_id, birthday, birth_year, receive_dms, share_age in profiles:
+            self.profiles[user_id] = [birthday, birth_year, receive_dms, share_age]
+            self.by_birthday.setdefault(birthday, set()).add(user_id)
+        for user_id, guild_id, birthday, announce in memberships:
+            self.memberships[(user_id, guild_id)] = announce
+            self.guilds_of.setdefault(user_id, set()).add(guild_id)
+            self.by_guild_birthday.setdefault((guild_id, birthday), set()).add(user_id)
+        for guild_id, *config in guild_configs:
+            self.guild_configs[guild_id] = GuildConfig(*config)
+        return len(memberships)
+
+    def _row(self, user_id, guild_id):
+        _, birth_year, receive_dms, share_age = self.profiles[user_id]
+        return (user_id, guild_id, birth_year, self.memberships[(user_id, guild_id)], receive_dms, share_age)
+
+    def _leave(self, user_id, guild_id):
+        """Remove a membership, and the profile with the user's last one"""
+        if self.memberships.pop((user_id, guild_id), None) is None:
+            return False
+        birthday = self.profiles[user_id][0]
+        self.by_guild_birthday[(guild_id, birthday)].discard(user_id)
+        guilds = self.guilds_of[user_id]
+        guilds.discard(guild_id)
+        if not guilds:
+            del self.guilds_of[user_id]
+            del self.profiles[user_id]
+            self.by_birthday[birthday].discard(user_id)
+        return True
+
+    def _users_between(self, days, guild_id=None):
+        """Yield users with birthdays in a (first, last) range, in one guild if given"""
+        first, last = days
+        for day in range(first, last + 1):
+            if guild_id is None:
+                yield from self.by_birthday.get(day, ())
+            else:
+                yield from self.by_guild_birthday.get((guild_id, day), ())
+
+    # User operations
+    @_locked
+    def set_birthday(self, user_id, guild_id, birthday):
+        profile = self.profiles.get(user_id)
+        guilds = self.guilds_of.setdefault(user_id, set())
+        if profile:
+            # Move the user in the date indexes of every guild they're in
+            self.by_birthday[profile[0]].discard(user_id)
+            for member_guild in guilds:
+                self.by_guild_birthday[(member_guild, profile[0])].discard(user_id)
+            profile[0] = birthday
+        else:
+            self.profiles[user_id] = [birthday, None, 1, 0]
+        self.memberships.setdefault((user_id, guild_id), 1)
+        guilds.add(guild_id)
+        self.by_birthday.setdefault(birthday, set()).add(user_id)
+        for member_guild in guilds:
+            self.by_guild_birthday.setdefault((member_guild, birthday), set()).add(user_id)
+        return True
+
+    @_locked
+    def clear_birthday(self, user_id, guild_id):
+        return self._leave(user_id, guild_id)
+
+    @_locked
+    def set_birth_year(self, user_id, guild_id, birth_year):
+        if (user_id, guild_id) not in self.memberships:
+            return False
+        self.profiles[user_id][1] = birth_year
+        return True
+
+    @_locked
+    def toggle_user_setting(self, user_id, guild_id, setting, value=None):
+        if setting not in USER_SETTINGS:
+            return False
+        key = (user_id, guild_id)
+        if key not in self.memberships:
+            return None
+        if setting in GUILD_SETTINGS:
+            current = self.memberships[key]
+            self.memberships[key] = (0 if current == 1 else 1) if value is None else value
+            return self.memberships[key]
+        profile = self.profiles[user_id]
+        index = 2 + PROFILE_SETTINGS.index(setting)
+        profile[index] = (0 if profile[index] == 1 else 1) if value is None else value
+        return profile[index]
+
+    @_locked
+    def get_user_birthday(self, user_id, guild_id):
+        if (user_id, guild_id) not in self.memberships:
+            return None
+        birthday, birth_year, receive_dms, share_age = self.profiles[user_id]
+        return (birthday, birth_year, self.memberships[(user_id, guild_id)], receive_dms, share_age)
+
+    @_locked
+    def get_birthdays_for_date(self, days, dms_only=False, shard=None):
+        rows = []
+        for user_id in self._users_between(days):
+            if dms_only and self.profiles[user_id][2] != 1:
+                continue
+            # One row per user, for their lowest guild ID
+            guild_id = min(self.guilds_of[user_id])
+            if shard and not shard.owns(guild_id):
+                continue
+            rows.append(self._row(user_id, guild_id))
+        return rows
+
+    @_locked
+    def get_birthdays_for_guilds(self, guild_days, announce_only=False):
+        rows = []
+        for guild_id, days in guild_days.items():
+            for user_id in self._users_between(days, guild_id):
+                row = self._row(user_id, guild_id)
+                if not announce_only or row[3] == 1:
+                    rows.append(row)
+        return rows
+
+    @_locked
+    def list_guild_birthdays(self, guild_id, days, after=None, limit=25):
+        first, last = days
+        if after:
+            first = max(first, after[0])
+        rows = []
+        for day in range(first, last + 1):
+            for user_id in sorted(self.by_guild_birthday.get((guild_id, day), ())):
+                if after and (day, user_id) <= tuple(after):
+                    continue
+                if self.memberships[(user_id, guild_id)] != 1:
+                    continue
+                _, birth_year, _, share_age = self.profiles[user_id]
+                rows.append((user_id, day, birth_year, share_age))
+                if len(rows) == limit:
+                    return rows
+        return rows
+
+    @_locked
+    def clean_up_user_data(self, user_id, guild_id=None):
+        if guild_id is not None:
+            guilds = [guild_id]
+        else:
+            guilds = list(self.guilds_of.get(user_id, ()))
+        return sum(1 for guild in guilds if self._leave(user_id, guild))
+
+    # Guild config operations
+    @_locked
+    def get_guild_configs(self, guild_ids):
+        return {guild_id: self.guild_configs[guild_id] for guild_id in guild_ids if guild_id in self.guild_configs}
+
+    @_locked
+    def update_guild_config(self, guild_id, changes):
+        if not changes or not set(changes) <= set(GuildConfig._fields):
+            return None
+        config = self.guild_configs.get(guild_id, DEFAULT_GUILD_CONFIG)._replace(**changes)
+        self.guild_configs[guild_id] = config
+        return config
+
+    # Delivery ledger operations
+    @_locked
+    def get_delivered(self, keys):
+        return {key for key in keys if key in self.deliveries}
+
+    @_locked
+    def record_deliveries(self, keys):
+        before = len(self.deliveries)
+        self.deliveries.update(keys)
+        return len(self.deliveries) - before
+
+    @_locked
+    def prune_deliveries(self, before_date):
+        old = {key for key in self.deliveries if key[3] < before_date}
+        self.deliveries -= old
+        return len(old)
+
+    # Undeliverable target operations
+    @_locked
+    def mark_undeliverable(self, target_type, target_id, guild_id, reason, ttl_seconds):
+        now = _now()
+        self.undeliverable[(target_type, target_id)] = (
+            guild_id, reason, now, now + datetime.timedelta(seconds=ttl_seconds)
+        )
+        return True
+
+    @_locked
+    def get_undeliverable(self, target_type, target_ids):
+        now = _now()
+        blocked = set()
+        for target_id in target_ids:
+            entry = self.undeliverable.get((target_type, target_id))
+            if entry and entry[3] > now:
+                blocked.add(target_id)
+        return blocked
+
+    @_locked
+    def clear_undeliverable(self, target_type, target_id):
+        return self.undeliverable.pop((target_type, target_id), None) is not None
+
+    @_locked
+    def list_undeliverable(self, guild_id, limit=25):
+        now = _now()
+        rows = [
+            (target_type, target_id, reason, failed_at, expires_at)
+            for (target_type, target_id), (entry_guild, reason, failed_at, expires_at) in self.undeliverable.items()
+            if expires_at > now
+            and (entry_guild == guild_id or (target_type == "user" and (target_id, guild_id) in self.memberships))
+        ]
+        rows.sort(key=lambda row: row[3], reverse=True)
+        return rows[:limit]
+
+    @_locked
+    def prune_undeliverable(self):
+        now = _now()
+        expired = [key for key, entry in self.undeliverable.items() if entry[3] <= now]
+        for key in expired:
+            del self.undeliverable[key]
+        return len(expired)
+
+    # Delivery job operations
+    @_locked
+    def enqueue_jobs(self, jobs):
+        now = time.time()
+        added = 0
+        for kind, guild_id, target_id, delivery_date, payload in jobs:
+            key = (kind, guild_id, target_id, delivery_date)
+            if key in self.job_keys:
+                job_id = self.job_keys[key]
+                job = self.jobs[job_id]
+                merged = merge_job_payload(job[4], payload)
+                if merged is not None:
+                    # A job being run keeps its lease, and isn't completed by that run.
+                    # A finished one is due again straight away.
+                    run_at = max(job[7], now) if job[5] == "pending" else now
+                    job[4:9] = [merged, "pending", 0, run_at, None]
+                    heapq.heappush(self.due_jobs, (job[7], job_id))
+                    added += 1
+                continue
+            job_id = next(self._job_ids)
+            self.jobs[job_id] = [kind, guild_id, target_id, delivery_date, payload, "pending", 0, now, None]
+            self.job_keys[key] = job_id
+            heapq.heappush(self.due_jobs, (now, job_id))
+            added += 1
+        return added
+
+    @_locked
+    def claim_jobs(self, limit, lease_seconds, shard=None):
+        now = time.time()
+        claimed, skipped = [], []
+        while self.due_jobs and self.due_jobs[0][0] <= now and len(claimed) < limit:
+            run_at, job_id = heapq.heappop(self.due_jobs)
+            job = self.jobs.get(job_id)
+            if job is None or job[5] != "pending" or job[7] != run_at:
+                continue
+            if shard and not shard.owns(job[1]):
+                skipped.append((run_at, job_id))
+                continue
+            job[6] += 1
+            job[7] = now + lease_seconds
+            claimed.append(job_id)
+        for entry in skipped:
+            heapq.heappush(self.due_jobs, entry)
+        for job_id in claimed:
+            heapq.heappush(self.due_jobs, (self.jobs[job_id][7], job_id))
+        return [(job_id, *self.jobs[job_id][:5], self.jobs[job_id][6]) for job_id in claimed]
+
+    @_locked
+    def complete_jobs(self, job_ids):
+        count = 0
+        for job_id in job_ids:
+            job = self.jobs.get(job_id)
+            # Jobs merged into since they were claimed have attempts reset and must run again
+            if job and job[6] > 0:
+                job[5], job[8] = "done", None
+                count += 1
+        return count
+
+    @_locked
+    def retry_job(self, job_id, delay_seconds, error):
+        job = self.jobs.get(job_id)
+        if not job or job[5] != "pending":
+            return False
+        job[7], job[8] = time.time() + delay_seconds, error
+        heapq.heappush(self.due_jobs, (job[7], job_id))
+        return True
+
+    @_locked
+    def fail_job(self, job_id, error):
+        job = self.jobs.get(job_id)
+        if not job or job[6] == 0:
+            return False
+        job[5], job[8] = "failed", error
+        return True
+
+    @_locked
+    def prune_jobs(self, before_date):
+        old = [job_id for job_id, job in self.jobs.items() if job[3] < before_date]
+        for job_id in old:
+            job = self.jobs.pop(job_id)
+            del self.job_keys[tuple(job[:4])]
+        return len(old)
+
+    @_locked
+    def job_counts(self):
+        counts = {}
+        for job in self.jobs.values():
+            counts[job[5]] = counts.get(job[5], 0) + 1
+        return counts
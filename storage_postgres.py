@@ -0,0 +1,629 @@
+"""
+Postgres storage backend, the default.
+
+Uses the shared connection pool in database.py and Postgres-specific SQL:
+ON CONFLICT upserts, unnest() set queries, partial indexes and
+FOR UPDATE SKIP LOCKED for claiming delivery jobs.
+"""
+import io
+
+from psycopg2.extras import execute_values, Json
+
+import database
+from database import connection
+from storage import Storage, MISSING, USER_SETTINGS, GUILD_SETTINGS, GuildConfig, split_users
+
+# SQL for an announcement row r, [user_id, birth_year, share_age], whose member
+# isn't in the queued job's payload yet
+NEW_ROW = "NOT EXISTS (SELECT 1 FROM jsonb_array_elements(delivery_jobs.payload->'rows') queued WHERE queued->0 = r->0)"
+
+# Hot-path queries, also run through EXPLAIN by scripts/check_query_plans.py
+USER_BIRTHDAY_SQL = """
+    SELECT p.birthday, p.birth_year, m.announce_in_servers, p.receive_dms, p.share_age
+    FROM memberships m
+    JOIN profiles p ON p.user_id = m.user_id
+    WHERE m.user_id = %(user_id)s AND m.guild_id = %(guild_id)s
+"""
+
+def birthdays_for_date_sql(dms_only=False, sharded=False):
+    """get_birthdays_for_date's query, the dms_only filter matches the partial index on receive_dms = 1"""
+    return f"""
+        SELECT user_id, guild_id, birth_year, announce_in_servers, receive_dms, share_age
+        FROM (
+            SELECT DISTINCT ON (p.user_id)
+                   p.user_id, m.guild_id, p.birth_year, m.announce_in_servers, p.receive_dms, p.share_age
+            FROM profiles p
+            JOIN memberships m ON m.user_id = p.user_id
+            WHERE p.birthday BETWEEN %(first_day)s AND %(last_day)s {"AND p.receive_dms = 1" if dms_only else ""}
+            ORDER BY p.user_id, m.guild_id
+        ) birthdays
+        {"WHERE ((guild_id >> 22) %% %(shard_count)s) = ANY(%(shard_ids)s)" if sharded else ""}
+    """
+
+# Scans narrow membership rows, profiles are only read for matches
+BIRTHDAYS_FOR_GUILDS_SQL = """
+    SELECT m.user_id, m.guild_id, p.birth_year, m.announce_in_servers, p.receive_dms, p.share_age
+    FROM unnest(%(guild_ids)s::bigint[], %(firsts)s::smallint[], %(lasts)s::smallint[]) AS g(guild_id, first_day, last_day)
+    JOIN memberships m ON m.guild_id = g.guild_id AND m.birthday BETWEEN g.first_day AND g.last_day
+    JOIN profiles p ON p.user_id = m.user_id
+    WHERE NOT %(announce_only)s OR m.announce_in_servers = 1
+"""
+
+# Walks idx_memberships_guild_listing from the cursor, so a page costs the
+# same in a guild of any size
+LIST_GUILD_BIRTHDAYS_SQL = """
+    SELECT m.user_id, m.birthday, p.birth_year, p.share_age
+    FROM memberships m
+    JOIN profiles p ON p.user_id = m.user_id
+    WHERE m.guild_id = %(guild_id)s AND m.announce_in_servers = 1
+      AND (m.birthday, m.user_id) > (%(after_birthday)s, %(after_user)s) AND m.birthday <= %(last_day)s
+    ORDER BY m.birthday, m.user_id
+    LIMIT %(limit)s
+"""
+
+GUILD_CONFIGS_SQL = f"""
+    SELECT guild_id, {", ".join(GuildConfig._fields)}
+    FROM guild_config
+    WHERE guild_id = ANY(%(guild_ids)s)
+"""
+
+class PostgresStorage(Storage):
+    """Storage backed by the Postgres connection pool"""
+    name = "postgres"
+
+    async def start(self):
+        return await database.start_database()
+
+    def initialize(self):
+        database.initialize_database()
+
+    def close(self):
+        database.close_all_connections()
+
+    def ping(self):
+        return database.check_connection()
+
+    def load(self, users, guild_configs=()):
+        """Bulk load users rows into profiles and memberships, and guild config rows, with COPY"""
+        profiles, memberships = split_users(users)
+        try:
+            with connection() as conn, conn.cursor() as cur:
+                _copy(cur, "profiles", ("user_id", "birthday", "birth_year", "receive_dms", "share_age"), profiles)
+                membership_count = _copy(cur, "memberships", (
+                    "user_id", "guild_id", "birthday", "announce_in_servers"
+                ), memberships)
+                _copy(cur, "guild_config", ("guild_id",) + GuildConfig._fields, guild_configs)
+                cur.execute("ANALYZE profiles")
+                cur.execute("ANALYZE memberships")
+                cur.execute("ANALYZE guild_config")
+                conn.commit()
+                return membership_count
+        except Exception as e:
+            print(f"Error bulk loading data: {e}")
+            return 0
+
+    # User operations
+    def set_birthday(self, user_id, guild_id, birthday):
+        """Set a user's birthday, joining the guild if needed"""
+        try:
+            with connection() as conn, conn.cursor() as cur:
+                cur.execute("""
+                    INSERT INTO profiles (user_id, birthday)
+                    VALUES (%s, %s)
+                    ON CONFLICT (user_id)
+                    DO UPDATE SET birthday = EXCLUDED.birthday
+                """, (user_id, birthday))
+                cur.execute("""
+                    INSERT INTO memberships (user_id, guild_id, birthday)
+                    VALUES (%s, %s, %s)
+                    ON CONFLICT (user_id, guild_id) DO NOTHING
+                """, (user_id, guild_id, birthday))
+                # Keep the copy in the user's other guilds in step
+                cur.execute("""
+                    UPDATE memberships
+                    SET birthday = %s
+                    WHERE user_id = %s AND birthday <> %s
+                """, (birthday, user_id, birthday))
+                conn.commit()
+                return True
+        except Exception as e:
+            print(f"Error setting birthday: {e}")
+            return False
+
+    def clear_birthday(self, user_id, guild_id):
+        """Remove a user's birthday from a guild, and their profile once it's in no guild"""
+        try:
+            with connection() as conn, conn.cursor() as cur:
+                cur.execute("""
+                    DELETE FROM memberships
+                    WHERE user_id = %s AND guild_id = %s
+                """, (user_id, guild_id))
+                removed = cur.rowcount > 0
+                _delete_orphaned_profile(cur, user_id)
+                conn.commit()
+                return removed
+        except Exception as e:
+            print(f"Error clearing birthday: {e}")
+            return False
+
+    def set_birth_year(self, user_id, guild_id, birth_year):
+        """Set a user's birth year"""
+        try:
+            with connection() as conn, conn.cursor() as cur:
+                cur.execute("""
+                    UPDATE profiles
+                    SET birth_year = %s
+                    WHERE user_id = %s
+                      AND EXISTS (SELECT 1 FROM memberships WHERE user_id = %s AND guild_id = %s)
+                """, (birth_year, user_id, user_id, guild_id))
+                conn.commit()
+                return cur.rowcount > 0
+        except Exception as e:
+            print(f"Error setting birth year: {e}")
+            return False
+
+    def toggle_user_setting(self, user_id, guild_id, setting, value=None):
+        """Toggle a user setting or set to a specific value"""
+        if setting not in USER_SETTINGS:
+            return False
+
+        # announce_in_servers is per guild, the rest follow the user everywhere
+        if setting in GUILD_SETTINGS:
+            table, condition, params = "memberships", "user_id = %s AND guild_id = %s", (user_id, guild_id)
+        else:
+            table = "profiles"
+            condition = "user_id = %s AND EXISTS (SELECT 1 FROM memberships WHERE user_id = %s AND guild_id = %s)"
+            params = (user_id, user_id, guild_id)
+
+        try:
+            with connection() as conn, conn.cursor() as cur:
+                # If value is None, toggle the current value
+                if value is None:
+                    cur.execute(f"""
+                        UPDATE {table}
+                        SET {setting} = CASE WHEN {setting} = 1 THEN 0 ELSE 1 END
+                        WHERE {condition}
+                        RETURNING {setting}
+                    """, params)
+                    result = cur.fetchone()
+                    conn.commit()
+                    return result[0] if result else None
+                # Otherwise set to the specified value
+                else:
+                    cur.execute(f"""
+                        UPDATE {table}
+                        SET {setting} = %s
+                        WHERE {condition}
+                    """, (value, *params))
+                    conn.commit()
+                    return value if cur.rowcount > 0 else None
+        except Exception as e:
+            print(f"Error toggling {setting}: {e}")
+            return None
+
+    def get_user_birthday(self, user_id, guild_id):
+        """Get a user's birthday information"""
+        try:
+            with connection() as conn, conn.cursor() as cur:
+                cur.execute(USER_BIRTHDAY_SQL, {"user_id": user_id, "guild_id": guild_id})
+                return cur.fetchone()
+        except Exception as e:
+            print(f"Error getting birthday: {e}")
+            return None
+
+    def get_birthdays_for_date(self, days, dms_only=False, shard=None):
+        """
+        Get all users with birthdays on a specific date, once each. The guild
+        returned is the user's lowest guild ID, and `shard` keeps only users
+        whose lowest guild is in its shards, so each user has one owner.
+        """
+        params = {"first_day": days[0], "last_day": days[1]}
+        if shard:
+            params.update(shard_count=shard.count, shard_ids=sorted(shard.ids))
+        try:
+            with connection() as conn, conn.cursor() as cur:
+                cur.execute(birthdays_for_date_sql(dms_only, sharded=bool(shard)), params)
+                return cur.fetchall()
+        except Exception as e:
+            print(f"Error getting birthdays for date: {e}")
+            return []
+
+    def get_birthdays_for_guilds(self, guild_days, announce_only=False):
+        """
+        Get birthdays for several guilds, each on its own local date, in one query.
+        guild_days maps guild_id to a (first, last) range of encoded birthdays.
+        """
+        if not guild_days:
+            return []
+
+        guild_ids = list(guild_days)
+        params = {
+            "guild_ids": guild_ids,
+            "firsts": [guild_days[guild_id][0] for guild_id in guild_ids],
+            "lasts": [guild_days[guild_id][1] for guild_id in guild_ids],
+            "announce_only": announce_only,
+        }
+
+        try:
+            with connection() as conn, conn.cursor() as cur:
+                cur.execute(BIRTHDAYS_FOR_GUILDS_SQL, params)
+                return cur.fetchall()
+        except Exception as e:
+            print(f"Error getting birthdays for guilds: {e}")
+            return []
+
+    def list_guild_birthdays(self, guild_id, days, after=None, limit=25):
+        """List one page of a guild's birthdays in a range, after a (birthday, user_id) cursor"""
+        # Without a cursor, start just before the range, user IDs are all above 0
+        after_birthday, after_user = max(tuple(after or ()), (days[0], 0))
+        try:
+            with connection() as conn, conn.cursor() as cur:
+                cur.execute(LIST_GUILD_BIRTHDAYS_SQL, {
+                    "guild_id": guild_id, "after_birthday": after_birthday, "after_user": after_user,
+                    "last_day": days[1], "limit": limit,
+                })
+                return cur.fetchall()
+        except Exception as e:
+            print(f"Error listing guild birthdays: {e}")
+            return []
+
+    def clean_up_user_data(self, user_id, guild_id=None):
+        """Remove user data from database"""
+        try:
+            with connection() as conn, conn.cursor() as cur:
+                if guild_id:
+                    # Remove user from specific guild
+                    cur.execute("""
+                        DELETE FROM memberships
+                        WHERE user_id = %s AND guild_id = %s
+                    """, (user_id, guild_id))
+                else:
+                    # Remove user from all guilds
+                    cur.execute("""
+                        DELETE FROM memberships
+                        WHERE user_id = %s
+                    """, (user_id,))
+                removed = cur.rowcount
+                _delete_orphaned_profile(cur, user_id)
+                conn.commit()
+                return removed
+        except Exception as e:
+            print(f"Error cleaning up user data: {e}")
+            return 0
+
+    # Guild config operations
+    def get_guild_configs(self, guild_ids):
+        """Get the GuildConfig of each configured guild in guild_ids, in one query"""
+        try:
+            with connection() as conn, conn.cursor() as cur:
+                cur.execute(GUILD_CONFIGS_SQL, {"guild_ids": list(guild_ids)})
+                return {row[0]: GuildConfig(*row[1:]) for row in cur.fetchall()}
+        except Exception as e:
+            print(f"Error getting guild configs: {e}")
+            return MISSING
+
+    def update_guild_config(self, guild_id, changes):
+        """Change some fields of a guild's config, creating it if needed. Returns the new GuildConfig."""
+        if not changes or not set(changes) <= set(GuildConfig._fields):
+            return None
+        columns = list(changes)
+        try:
+            with connection() as conn, conn.cursor() as cur:
+                cur.execute(f"""
+                    INSERT INTO guild_config (guild_id, {", ".join(columns)})
+                    VALUES (%s, {", ".join(["%s"] * len(columns))})
+                    ON CONFLICT (guild_id)
+                    DO UPDATE SET {", ".join(f"{column} = EXCLUDED.{column}" for column in columns)}
+                    RETURNING {", ".join(GuildConfig._fields)}
+                """, (guild_id, *changes.values()))
+                config = GuildConfig(*cur.fetchone())
+                conn.commit()
+                return config
+        except Exception as e:
+            print(f"Error updating guild config: {e}")
+            return None
+
+    # Delivery ledger operations
+    def get_delivered(self, keys):
+        """
+        Check which deliveries have already been made.
+        keys is a list of (user_id, guild_id, kind, delivery_date) tuples.
+        Returns the set of keys that are already in the ledger.
+        """
+        if not keys:
+            return set()
+
+        user_ids, guild_ids, kinds, dates = (list(column) for column in zip(*keys))
+
+        try:
+            with connection() as conn, conn.cursor() as cur:
+                cur.execute("""
+                    SELECT d.user_id, d.guild_id, d.kind, d.delivery_date
+                    FROM unnest(%s::bigint[], %s::bigint[], %s::varchar[], %s::date[])
+                        AS k(user_id, guild_id, kind, delivery_date)
+                    JOIN deliveries d USING (user_id, guild_id, kind, delivery_date)
+                """, (user_ids, guild_ids, kinds, dates))
+                return set(cur.fetchall())
+        except Exception as e:
+            print(f"Error checking delivery ledger: {e}")
+            return set()
+
+    def record_deliveries(self, keys):
+        """
+        Record completed deliveries in the ledger.
+        keys is a list of (user_id, guild_id, kind, delivery_date) tuples.
+        """
+        if not keys:
+            return 0
+
+        try:
+            with connection() as conn, conn.cursor() as cur:
+                execute_values(cur, """
+                    INSERT INTO deliveries (user_id, guild_id, kind, delivery_date)
+                    VALUES %s
+                    ON CONFLICT DO NOTHING
+                """, list(keys), page_size=1000)
+                conn.commit()
+                return cur.rowcount
+        except Exception as e:
+            print(f"Error recording deliveries: {e}")
+            return 0
+
+    def prune_deliveries(self, before_date):
+        """Remove ledger entries older than the given date"""
+        try:
+            with connection() as conn, conn.cursor() as cur:
+                cur.execute("""
+                    DELETE FROM deliveries
+                    WHERE delivery_date < %s
+                """, (before_date,))
+                conn.commit()
+                return cur.rowcount
+        except Exception as e:
+            print(f"Error pruning deliveries: {e}")
+            return 0
+
+    # Undeliverable target operations
+    def mark_undeliverable(self, target_type, target_id, guild_id, reason, ttl_seconds):
+        """Record that a user or channel can't be delivered to for `ttl_seconds`"""
+        try:
+            with connection() as conn, conn.cursor() as cur:
+                cur.execute("""
+                    INSERT INTO undeliverable (target_type, target_id, guild_id, reason, failed_at, expires_at)
+                    VALUES (%s, %s, %s, %s, NOW(), NOW() + make_interval(secs => %s))
+                    ON CONFLICT (target_type, target_id)
+                    DO UPDATE SET guild_id = EXCLUDED.guild_id, reason = EXCLUDED.reason,
+                                  failed_at = EXCLUDED.failed_at, expires_at = EXCLUDED.expires_at
+                """, (target_type, target_id, guild_id, reason, ttl_seconds))
+                conn.commit()
+                return True
+        except Exception as e:
+            print(f"Error marking target undeliverable: {e}")
+            return False
+
+    def get_undeliverable(self, target_type, target_ids):
+        """Get which of the given targets are currently undeliverable"""
+        if not target_ids:
+            return set()
+
+        try:
+            with connection() as conn, conn.cursor() as cur:
+                cur.execute("""
+                    SELECT target_id
+                    FROM undeliverable
+                    WHERE target_type = %s AND target_id = ANY(%s::bigint[]) AND expires_at > NOW()
+                """, (target_type, list(target_ids)))
+                return {row[0] for row in cur.fetchall()}
+        except Exception as e:
+            print(f"Error getting undeliverable targets: {e}")
+            return set()
+
+    def clear_undeliverable(self, target_type, target_id):
+        """Forget that a target was undeliverable"""
+        try:
+            with connection() as conn, conn.cursor() as cur:
+                cur.execute("""
+                    DELETE FROM undeliverable
+                    WHERE target_type = %s AND target_id = %s
+                """, (target_type, target_id))
+                conn.commit()
+                return cur.rowcount > 0
+        except Exception as e:
+            print(f"Error clearing undeliverable target: {e}")
+            return False
+
+    def list_undeliverable(self, guild_id, limit=25):
+        """List a guild's undeliverable channels and members"""
+        try:
+            with connection() as conn, conn.cursor() as cur:
+                cur.execute("""
+                    SELECT target_type, target_id, reason, failed_at, expires_at
+                    FROM undeliverable
+                    WHERE expires_at > NOW()
+                      AND (guild_id = %s
+                           OR (target_type = 'user'
+                               AND target_id IN (SELECT user_id FROM memberships WHERE guild_id = %s)))
+                    ORDER BY failed_at DESC
+                    LIMIT %s
+                """, (guild_id, guild_id, limit))
+                return cur.fetchall()
+        except Exception as e:
+            print(f"Error listing undeliverable targets: {e}")
+            return []
+
+    def prune_undeliverable(self):
+        """Remove expired undeliverable entries"""
+        try:
+            with connection() as conn, conn.cursor() as cur:
+                cur.execute("""
+                    DELETE FROM undeliverable
+                    WHERE expires_at <= NOW()
+                """)
+                conn.commit()
+                return cur.rowcount
+        except Exception as e:
+            print(f"Error pruning undeliverable targets: {e}")
+            return 0
+
+    # Delivery job operations
+    def enqueue_jobs(self, jobs):
+        """
+        Queue delivery jobs. A job already queued for the same key is left alone,
+        unless it's an announcement the new payload adds members to, see
+        storage.merge_job_payload.
+        """
+        rows = [(kind, guild_id, target_id, date, Json(payload)) for kind, guild_id, target_id, date, payload in jobs]
+        if not rows:
+            return 0
+
+        try:
+            with connection() as conn, conn.cursor() as cur:
+                added = execute_values(cur, f"""
+                    INSERT INTO delivery_jobs (kind, guild_id, target_id, delivery_date, payload)
+                    VALUES %s
+                    ON CONFLICT (kind, guild_id, target_id, delivery_date) DO UPDATE
+                    SET payload = jsonb_set(EXCLUDED.payload, '{{rows}}', delivery_jobs.payload->'rows' || (
+                            SELECT jsonb_agg(r) FROM jsonb_array_elements(EXCLUDED.payload->'rows') r
+                            WHERE {NEW_ROW}
+                        )),
+                        status = 'pending', attempts = 0, last_error = NULL,
+                        -- A job being run keeps its lease, and isn't completed by that run.
+                        -- A finished one is due again straight away.
+                        run_at = CASE WHEN delivery_jobs.status = 'pending'
+                                      THEN GREATEST(delivery_jobs.run_at, NOW()) ELSE NOW() END
+                    WHERE EXISTS (
+                        SELECT 1 FROM jsonb_array_elements(EXCLUDED.payload->'rows') r
+                        WHERE {NEW_ROW}
+                    )
+                    RETURNING id
+                """, rows, page_size=1000, fetch=True)
+                conn.commit()
+                return len(added)
+        except Exception as e:
+            print(f"Error enqueueing delivery jobs: {e}")
+            return 0
+
+    def claim_jobs(self, limit, lease_seconds, shard=None):
+        """
+        Claim due jobs. SKIP LOCKED lets any number of workers claim at once
+        without waiting on or double-claiming each other's rows.
+        """
+        shard_condition = "AND ((guild_id >> 22) %% %s) = ANY(%s)" if shard else ""
+        shard_params = (shard.count, sorted(shard.ids)) if shard else ()
+        try:
+            with connection() as conn, conn.cursor() as cur:
+                cur.execute(f"""
+                    UPDATE delivery_jobs j
+                    SET run_at = NOW() + make_interval(secs => %s), attempts = j.attempts + 1
+                    FROM (
+                        SELECT id
+                        FROM delivery_jobs
+                        WHERE status = 'pending' AND run_at <= NOW() {shard_condition}
+                        ORDER BY run_at
+                        LIMIT %s
+                        FOR UPDATE SKIP LOCKED
+                    ) due
+                    WHERE j.id = due.id
+                    RETURNING j.id, j.kind, j.guild_id, j.target_id, j.delivery_date, j.payload, j.attempts
+                """, (lease_seconds, *shard_params, limit))
+                conn.commit()
+                return cur.fetchall()
+        except Exception as e:
+            print(f"Error claiming delivery jobs: {e}")
+            return []
+
+    def complete_jobs(self, job_ids):
+        """Mark jobs as done, unless members were merged into them since they were claimed"""
+        if not job_ids:
+            return 0
+
+        try:
+            with connection() as conn, conn.cursor() as cur:
+                cur.execute("""
+                    UPDATE delivery_jobs
+                    SET status = 'done', last_error = NULL
+                    WHERE id = ANY(%s) AND attempts > 0
+                """, (list(job_ids),))
+                conn.commit()
+                return cur.rowcount
+        except Exception as e:
+            print(f"Error completing delivery jobs: {e}")
+            return 0
+
+    def retry_job(self, job_id, delay_seconds, error):
+        """Make a failed job due again in `delay_seconds`"""
+        try:
+            with connection() as conn, conn.cursor() as cur:
+                cur.execute("""
+                    UPDATE delivery_jobs
+                    SET run_at = NOW() + make_interval(secs => %s), last_error = %s
+                    WHERE id = %s AND status = 'pending'
+                """, (delay_seconds, error, job_id))
+                conn.commit()
+                return cur.rowcount > 0
+        except Exception as e:
+            print(f"Error retrying delivery job: {e}")
+            return False
+
+    def fail_job(self, job_id, error):
+        """Give up on a job"""
+        try:
+            with connection() as conn, conn.cursor() as cur:
+                cur.execute("""
+                    UPDATE delivery_jobs
+                    SET status = 'failed', last_error = %s
+                    WHERE id = %s AND attempts > 0
+                """, (error, job_id))
+                conn.commit()
+                return cur.rowcount > 0
+        except Exception as e:
+            print(f"Error failing delivery job: {e}")
+            return False
+
+    def prune_jobs(self, before_date):
+        """Remove jobs for delivery dates before the given date"""
+        try:
+            with connection() as conn, conn.cursor() as cur:
+                cur.execute("""
+                    DELETE FROM delivery_jobs
+                    WHERE delivery_date < %s
+                """, (before_date,))
+                conn.commit()
+                return cur.rowcount
+        except Exception as e:
+            print(f"Error pruning delivery jobs: {e}")
+            return 0
+
+    def job_counts(self):
+        """Count jobs by status"""
+        try:
+            with connection() as conn, conn.cursor() as cur:
+                cur.execute("SELECT status, count(*) FROM delivery_jobs GROUP BY status")
+                return dict(cur.fetchall())
+        except Exception as e:
+            print(f"Error counting delivery jobs: {e}")
+            return {}
+
+
+def _copy(cur, table, columns, rows, chunk_size=200000):
+    """COPY rows into a table in chunks"""
+    copied = 0
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join("\\N" if value is None else str(value) for value in row) + "\n")
+        copied += 1
+        if copied % chunk_size == 0:
+            buffer.seek(0)
+            cur.copy_from(buffer, table, columns=columns)
+            buffer = io.StringIO()
+    buffer.seek(0)
+    cur.copy_from(buffer, table, columns=columns)
+    return copied
+
+def _delete_orphaned_profile(cur, user_id):
+    """Delete a user's profile if they're no longer in any guild"""
+    cur.execute("""
+        DELETE FROM profiles
+        WHERE user_id = %s
+          AND NOT EXISTS (SELECT 1 FROM memberships WHERE user_id = %s)
+    """, (user_id, user_id))
@@ -0,0 +1,753 @@
+"""
+SQLite storage backend for small self-hosted deployments.
+
+Uses one connection in WAL mode shared by the executor threads behind a lock;
+SQLite serializes writes anyway. Set queries are chunked to stay under
+SQLite's bound-parameter limit. Dates are stored as ISO strings,
+timestamps as Unix seconds and job payloads as JSON text.
+"""
+import json
+import time
+import sqlite3
+import datetime
+import threading
+from contextlib import contextmanager
+from itertools import groupby
+
+from storage import Storage, MISSING, USER_SETTINGS, GUILD_SETTINGS, GuildConfig, split_users, merge_job_payload
+
+# Rows per chunk in set queries, kept well under SQLite's 999-parameter limit
+CHUNK_SIZE = 400
+
+# Birthdays are days of the leap year, see utils.encode_birthday
+PROFILES_TABLE = """
+    CREATE TABLE IF NOT EXISTS profiles (
+        user_id INTEGER PRIMARY KEY,
+        birthday INTEGER NOT NULL CHECK (birthday BETWEEN 1 AND 366),
+        birth_year INTEGER,
+        receive_dms INTEGER DEFAULT 1,
+        share_age INTEGER DEFAULT 0
+    )
+"""
+
+MEMBERSHIPS_TABLE = """
+    CREATE TABLE IF NOT EXISTS memberships (
+        user_id INTEGER NOT NULL,
+        guild_id INTEGER NOT NULL,
+        birthday INTEGER NOT NULL CHECK (birthday BETWEEN 1 AND 366),
+        announce_in_servers INTEGER DEFAULT 1,
+        PRIMARY KEY (user_id, guild_id)
+    )
+"""
+
+SCHEMA = [
+    PROFILES_TABLE,
+    MEMBERSHIPS_TABLE,
+    """
+    CREATE TABLE IF NOT EXISTS guild_config (
+        guild_id INTEGER PRIMARY KEY,
+        timezone TEXT,
+        announce_channel INTEGER,
+        command_channel INTEGER,
+        mention_everyone INTEGER NOT NULL DEFAULT 0,
+        coalesce_announcements INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS deliveries (
+        user_id INTEGER NOT NULL,
+        guild_id INTEGER NOT NULL,
+        kind TEXT NOT NULL,
+        delivery_date TEXT NOT NULL,
+        delivered_at REAL NOT NULL,
+        PRIMARY KEY (user_id, guild_id, kind, delivery_date)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS undeliverable (
+        target_type TEXT NOT NULL,
+        target_id INTEGER NOT NULL,
+        guild_id INTEGER,
+        reason TEXT NOT NULL,
+        failed_at REAL NOT NULL,
+        expires_at REAL NOT NULL,
+        PRIMARY KEY (target_type, target_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS delivery_jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,
+        guild_id INTEGER NOT NULL,
+        target_id INTEGER NOT NULL,
+        delivery_date TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        run_at REAL NOT NULL,
+        last_error TEXT,
+        UNIQUE (kind, guild_id, target_id, delivery_date)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_profiles_birthday ON profiles (birthday)",
+    # user_id makes (birthday, user_id) listing cursors an index range too
+    "CREATE INDEX IF NOT EXISTS idx_memberships_guild_birthday_user ON memberships (guild_id, birthday, user_id)",
+    "CREATE INDEX IF NOT EXISTS idx_deliveries_date ON deliveries (delivery_date)",
+    "CREATE INDEX IF NOT EXISTS idx_undeliverable_guild ON undeliverable (guild_id)",
+    "CREATE INDEX IF NOT EXISTS idx_delivery_jobs_due ON delivery_jobs (status, run_at)",
+    "CREATE INDEX IF NOT EXISTS idx_delivery_jobs_date ON delivery_jobs (delivery_date)",
+]
+
+# SQL for utils.encode_birthday, the day of the leap year of an MMDD string
+MMDD_TO_DAY = "CAST(strftime('%j', '2000-' || substr({column}, 1, 2) || '-' || substr({column}, 3, 2)) AS INTEGER)"
+
+# Rebuilds profiles and memberships with MMDD text birthdays as days of the year.
+# SQLite can't change a column's type, and TEXT affinity would store the days as strings.
+MIGRATE_BIRTHDAY_ENCODING = [
+    "ALTER TABLE profiles RENAME TO profiles_mmdd",
+    "ALTER TABLE memberships RENAME TO memberships_mmdd",
+    PROFILES_TABLE,
+    MEMBERSHIPS_TABLE,
+    f"""
+    INSERT INTO profiles (user_id, birthday, birth_year, receive_dms, share_age)
+    SELECT user_id, {MMDD_TO_DAY.format(column="birthday")}, birth_year, receive_dms, share_age
+    FROM profiles_mmdd
+    """,
+    f"""
+    INSERT INTO memberships (user_id, guild_id, birthday, announce_in_servers)
+    SELECT user_id, guild_id, {MMDD_TO_DAY.format(column="birthday")}, announce_in_servers
+    FROM memberships_mmdd
+    """,
+    # Their indexes go with them, and are recreated on the new tables
+    "DROP TABLE profiles_mmdd",
+    "DROP TABLE memberships_mmdd",
+]
+
+# Moves rows from the old per-guild users table, a user's lowest guild ID supplies their profile
+MIGRATE_USERS = [
+    f"""
+    INSERT OR IGNORE INTO profiles (user_id, birthday, birth_year, receive_dms, share_age)
+    SELECT user_id, {MMDD_TO_DAY.format(column="birthday")}, birth_year, receive_dms, share_age
+    FROM users u
+    WHERE guild_id = (SELECT min(guild_id) FROM users WHERE user_id = u.user_id)
+    """,
+    """
+    INSERT OR IGNORE INTO memberships (user_id, guild_id, birthday, announce_in_servers)
+    SELECT u.user_id, u.guild_id, p.birthday, u.announce_in_servers
+    FROM users u
+    JOIN profiles p ON p.user_id = u.user_id
+    """,
+    "ALTER TABLE users RENAME TO users_premigration",
+]
+
+# SQL for a settings value that is a channel ID, NULL if it isn't one
+CHANNEL_ID = "CASE WHEN value GLOB '[0-9]*' AND value NOT GLOB '*[^0-9]*' THEN CAST(value AS INTEGER) END"
+
+# Pivots the old key/value settings table into guild_config, one row per guild
+MIGRATE_SETTINGS = [
+    f"""
+    INSERT OR IGNORE INTO guild_config (guild_id, timezone, announce_channel, command_channel,
+                                        mention_everyone, coalesce_announcements)
+    SELECT guild_id,
+           max(CASE WHEN setting = 'timezone' THEN NULLIF(value, '') END),
+           max(CASE WHEN setting = 'announce_channel' THEN {CHANNEL_ID} END),
+           max(CASE WHEN setting = 'command_channel' THEN {CHANNEL_ID} END),
+           max(setting = 'mention_everyone' AND value = '1'),
+           max(setting = 'coalesce_announcements' AND value = '1')
+    FROM settings
+    GROUP BY guild_id
+    """,
+    "ALTER TABLE settings RENAME TO settings_premigration",
+]
+
+def _chunks(items, size=CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def _placeholders(count, width=1):
+    group = "?" if width == 1 else "(" + ", ".join("?" * width) + ")"
+    return ", ".join([group] * count)
+
+def _timestamp(seconds):
+    return datetime.datetime.fromtimestamp(seconds, datetime.timezone.utc)
+
+def _guild_config(row):
+    timezone, announce_channel, command_channel, mention_everyone, coalesce_announcements = row
+    return GuildConfig(timezone, announce_channel, command_channel, bool(mention_everyone), bool(coalesce_announcements))
+
+class SQLiteStorage(Storage):
+    """Storage in a local SQLite file"""
+    name = "sqlite"
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _cursor(self):
+        """Run a block in a transaction on the shared connection"""
+        with self._lock:
+            if self._conn is None:
+                self._conn = sqlite3.connect(self.path, check_same_thread=False)
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute("PRAGMA synchronous=NORMAL")
+            cur = self._conn.cursor()
+            try:
+                yield cur
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+            finally:
+                cur.close()
+
+    def initialize(self):
+        try:
+            with self._cursor() as cur:
+                # One explicit transaction for the schema and migrations. sqlite3 doesn't
+                # open one for DDL, so table renames would otherwise commit on their own.
+                cur.execute("BEGIN")
+                for statement in SCHEMA:
+                    cur.execute(statement)
+                cur.execute("SELECT type FROM pragma_table_info('profiles') WHERE name = 'birthday'")
+                if cur.fetchone()[0].upper() == "TEXT":
+                    for statement in MIGRATE_BIRTHDAY_ENCODING + SCHEMA:
+                        cur.execute(statement)
+                # Replaced by idx_memberships_guild_birthday_user
+                cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_memberships_guild_birthday'")
+                if cur.fetchone():
+                    cur.execute("DROP INDEX idx_memberships_guild_birthday")
+                cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'users'")
+                if cur.fetchone():
+                    for statement in MIGRATE_USERS:
+                        cur.execute(statement)
+                cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'settings'")
+                if cur.fetchone():
+                    for statement in MIGRATE_SETTINGS:
+                        cur.execute(statement)
+        except Exception as e:
+            # Starting on a half-migrated database would look like one without users
+            print(f"Error initializing SQLite database: {e}")
+            raise
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def ping(self):
+        try:
+            with self._cursor() as cur:
+                cur.execute("SELECT 1")
+            return True
+        except Exception as e:
+            print(f"Health check failed: {e}")
+            return False
+
+    def load(self, users, guild_configs=()):
+        profiles, memberships = split_users(users)
+        try:
+            with self._cursor() as cur:
+                cur.executemany("""
+                    INSERT OR REPLACE INTO profiles (user_id, birthday, birth_year, receive_dms, share_age)
+                    VALUES (?, ?, ?, ?, ?)
+                """, profiles)
+                cur.executemany("""
+                    INSERT OR REPLACE INTO memberships (user_id, guild_id, birthday, announce_in_servers)
+                    VALUES (?, ?, ?, ?)
+                """, memberships)
+                count = cur.rowcount
+                cur.executemany(f"""
+                    INSERT OR REPLACE INTO guild_config (guild_id, {", ".join(GuildConfig._fields)})
+                    VALUES ({_placeholders(len(GuildConfig._fields) + 1)})
+                """, guild_configs)
+                cur.execute("ANALYZE")
+                return count
+        except Exception as e:
+            print(f"Error bulk loading data: {e}")
+            return 0
+
+    # User operations
+    def set_birthday(self, user_id, guild_id, birthday):
+        try:
+            with self._cursor() as cur:
+                cur.execute("""
+                    INSERT INTO profiles (user_id, birthday)
+                    VALUES (?, ?)
+                    ON CONFLICT (user_id)
+                    DO UPDATE SET birthday = excluded.birthday
+                """, (user_id, birthday))
+                cur.execute("""
+                    INSERT OR IGNORE INTO memberships (user_id, guild_id, birthday)
+                    VALUES (?, ?, ?)
+                """, (user_id, guild_id, birthday))
+                cur.execute("""
+                    UPDATE memberships SET birthday = ?
+                    WHERE user_id = ? AND birthday <> ?
+                """, (birthday, user_id, birthday))
+                return True
+        except Exception as e:
+            print(f"Error setting birthday: {e}")
+            return False
+
+    def clear_birthday(self, user_id, guild_id):
+        try:
+            with self._cursor() as cur:
+                cur.execute("DELETE FROM memberships WHERE user_id = ? AND guild_id = ?", (user_id, guild_id))
+                removed = cur.rowcount > 0
+                self._delete_orphaned_profile(cur, user_id)
+                return removed
+        except Exception as e:
+            print(f"Error clearing birthday: {e}")
+            return False
+
+    def set_birth_year(self, user_id, guild_id, birth_year):
+        try:
+            with self._cursor() as cur:
+                cur.execute("""
+                    UPDATE profiles SET birth_year = ?
+                    WHERE user_id = ?
+                      AND EXISTS (SELECT 1 FROM memberships WHERE user_id = ? AND guild_id = ?)
+                """, (birth_year, user_id, user_id, guild_id))
+                return cur.rowcount > 0
+        except Exception as e:
+            print(f"Error setting birth year: {e}")
+            return False
+
+    def toggle_user_setting(self, user_id, guild_id, setting, value=None):
+        if setting not in USER_SETTINGS:
+            return False
+
+        # announce_in_servers is per guild, the rest follow the user everywhere
+        if setting in GUILD_SETTINGS:
+            table, condition, params = "memberships", "user_id = ? AND guild_id = ?", (user_id, guild_id)
+        else:
+            table = "profiles"
+            condition = "user_id = ? AND EXISTS (SELECT 1 FROM memberships WHERE user_id = ? AND guild_id = ?)"
+            params = (user_id, user_id, guild_id)
+
+        try:
+            with self._cursor() as cur:
+                if value is None:
+                    cur.execute(f"""
+                        UPDATE {table} SET {setting} = CASE WHEN {setting} = 1 THEN 0 ELSE 1 END
+                        WHERE {condition}
+                    """, params)
+                else:
+                    cur.execute(f"""
+                        UPDATE {table} SET {setting} = ?
+                        WHERE {condition}
+                    """, (value, *params))
+                if cur.rowcount == 0:
+                    return None
+                # Read back in the same transaction, RETURNING needs SQLite 3.35
+                cur.execute(f"SELECT {setting} FROM {table} WHERE {condition}", params)
+                return cur.fetchone()[0]
+        except Exception as e:
+            print(f"Error toggling {setting}: {e}")
+            return None
+
+    def get_user_birthday(self, user_id, guild_id):
+        try:
+            with self._cursor() as cur:
+                cur.execute("""
+                    SELECT p.birthday, p.birth_year, m.announce_in_servers, p.receive_dms, p.share_age
+                    FROM memberships m
+                    JOIN profiles p ON p.user_id = m.user_id
+                    WHERE m.user_id = ? AND m.guild_id = ?
+                """, (user_id, guild_id))
+                return cur.fetchone()
+        except Exception as e:
+            print(f"Error getting birthday: {e}")
+            return None
+
+    def get_birthdays_for_date(self, days, dms_only=False, shard=None):
+        try:
+            params = list(days)
+            shard_condition = ""
+            if shard:
+                shard_condition = f"WHERE ((guild_id >> 22) % ?) IN ({', '.join('?' * len(shard.ids))})"
+                params += [shard.count, *shard.ids]
+            with self._cursor() as cur:
+                # One row per user for their lowest guild ID. SQLite takes the bare
+                # announce_in_servers from the row min() picked.
+                cur.execute(f"""
+                    SELECT user_id, guild_id, birth_year, announce_in_servers, receive_dms, share_age
+                    FROM (
+                        SELECT p.user_id, min(m.guild_id) AS guild_id, p.birth_year, m.announce_in_servers,
+                               p.receive_dms, p.share_age
+                        FROM profiles p
+                        JOIN memberships m ON m.user_id = p.user_id
+                        WHERE p.birthday BETWEEN ? AND ? {"AND p.receive_dms = 1" if dms_only else ""}
+                        GROUP BY p.user_id
+                    )
+                    {shard_condition}
+                """, params)
+                return cur.fetchall()
+        except Exception as e:
+            print(f"Error getting birthdays for date: {e}")
+            return []
+
+    def get_birthdays_for_guilds(self, guild_days, announce_only=False):
+        if not guild_days:
+            return []
+
+        # Most guilds share a handful of local dates, so query each date's guilds together
+        by_days = {}
+        for guild_id, days in guild_days.items():
+            by_days.setdefault(days, []).append(guild_id)
+
+        rows = []
+        try:
+            with self._cursor() as cur:
+                for (first, last), guild_ids in by_days.items():
+                    for chunk in _chunks(guild_ids):
+                        cur.execute(f"""
+                            SELECT m.user_id, m.guild_id, p.birth_year, m.announce_in_servers, p.receive_dms, p.share_age
+                            FROM memberships m
+                            JOIN profiles p ON p.user_id = m.user_id
+                            WHERE m.birthday BETWEEN ? AND ? AND m.guild_id IN ({_placeholders(len(chunk))})
+                              {"AND m.announce_in_servers = 1" if announce_only else ""}
+                        """, (first, last, *chunk))
+                        rows.extend(cur.fetchall())
+            return rows
+        except Exception as e:
+            print(f"Error getting birthdays for guilds: {e}")
+            return []
+
+    def list_guild_birthdays(self, guild_id, days, after=None, limit=25):
+        # Without a cursor, start just before the range, user IDs are all above 0
+        after_birthday, after_user = max(tuple(after or ()), (days[0], 0))
+        try:
+            with self._cursor() as cur:
+                cur.execute("""
+                    SELECT m.user_id, m.birthday, p.birth_year, p.share_age
+                    FROM memberships m
+                    JOIN profiles p ON p.user_id = m.user_id
+                    WHERE m.guild_id = ? AND m.announce_in_servers = 1
+                      AND (m.birthday, m.user_id) > (?, ?) AND m.birthday <= ?
+                    ORDER BY m.birthday, m.user_id
+                    LIMIT ?
+                """, (guild_id, after_birthday, after_user, days[1], limit))
+                return cur.fetchall()
+        except Exception as e:
+            print(f"Error listing guild birthdays: {e}")
+            return []
+
+    def clean_up_user_data(self, user_id, guild_id=None):
+        try:
+            with self._cursor() as cur:
+                if guild_id is not None:
+                    cur.execute("DELETE FROM memberships WHERE user_id = ? AND guild_id = ?", (user_id, guild_id))
+                else:
+                    cur.execute("DELETE FROM memberships WHERE user_id = ?", (user_id,))
+                removed = cur.rowcount
+                self._delete_orphaned_profile(cur, user_id)
+                return removed
+        except Exception as e:
+            print(f"Error cleaning up user data: {e}")
+            return 0
+
+    def _delete_orphaned_profile(self, cur, user_id):
+        cur.execute("""
+            DELETE FROM profiles
+            WHERE user_id = ? AND NOT EXISTS (SELECT 1 FROM memberships WHERE user_id = ?)
+        """, (user_id, user_id))
+
+    # Guild config operations
+    def get_guild_configs(self, guild_ids):
+        configs = {}
+        try:
+            with self._cursor() as cur:
+                for chunk in _chunks(list(guild_ids)):
+                    cur.execute(f"""
+                        SELECT guild_id, {", ".join(GuildConfig._fields)}
+                        FROM guild_config
+                        WHERE guild_id IN ({_placeholders(len(chunk))})
+                    """, chunk)
+                    configs.update((row[0], _guild_config(row[1:])) for row in cur.fetchall())
+            return configs
+        except Exception as e:
+            print(f"Error getting guild configs: {e}")
+            return MISSING
+
+    def update_guild_config(self, guild_id, changes):
+        if not changes or not set(changes) <= set(GuildConfig._fields):
+            return None
+        columns = list(changes)
+        try:
+            with self._cursor() as cur:
+                cur.execute(f"""
+                    INSERT INTO guild_config (guild_id, {", ".join(columns)})
+                    VALUES ({_placeholders(len(columns) + 1)})
+                    ON CONFLICT (guild_id)
+                    DO UPDATE SET {", ".join(f"{column} = excluded.{column}" for column in columns)}
+                """, (guild_id, *changes.values()))
+                # Read back in the same transaction, RETURNING needs SQLite 3.35
+                cur.execute(f"SELECT {', '.join(GuildConfig._fields)} FROM guild_config WHERE guild_id = ?", (guild_id,))
+                return _guild_config(cur.fetchone())
+        except Exception as e:
+            print(f"Error updating guild config: {e}")
+            return None
+
+    # Delivery ledger operations
+    def get_delivered(self, keys):
+        if not keys:
+            return set()
+
+        delivered = set()
+        ordered = sorted(keys, key=lambda key: (key[2], key[3]))
+        try:
+            with self._cursor() as cur:
+                for (kind, delivery_date), group in groupby(ordered, key=lambda key: (key[2], key[3])):
+                    pairs = [(user_id, guild_id) for user_id, guild_id, _, _ in group]
+                    for chunk in _chunks(pairs):
+                        cur.execute(f"""
+                            SELECT user_id, guild_id
+                            FROM deliveries
+                            WHERE kind = ? AND delivery_date = ?
+                              AND (user_id, guild_id) IN (VALUES {_placeholders(len(chunk), 2)})
+                        """, (kind, delivery_date.isoformat(), *(value for pair in chunk for value in pair)))
+                        delivered.update((user_id, guild_id, kind, delivery_date) for user_id, guild_id in cur.fetchall())
+            return delivered
+        except Exception as e:
+            print(f"Error checking delivery ledger: {e}")
+            return set()
+
+    def record_deliveries(self, keys):
+        if not keys:
+            return 0
+
+        now = time.time()
+        try:
+            with self._cursor() as cur:
+                before = self._conn.total_changes
+                cur.executemany("""
+                    INSERT OR IGNORE INTO deliveries (user_id, guild_id, kind, delivery_date, delivered_at)
+                    VALUES (?, ?, ?, ?, ?)
+                """, [(user_id, guild_id, kind, date.isoformat(), now) for user_id, guild_id, kind, date in keys])
+                return self._conn.total_changes - before
+        except Exception as e:
+            print(f"Error recording deliveries: {e}")
+            return 0
+
+    def prune_deliveries(self, before_date):
+        try:
+            with self._cursor() as cur:
+                cur.execute("DELETE FROM deliveries WHERE delivery_date < ?", (before_date.isoformat(),))
+                return cur.rowcount
+        except Exception as e:
+            print(f"Error pruning deliveries: {e}")
+            return 0
+
+    # Undeliverable target operations
+    def mark_undeliverable(self, target_type, target_id, guild_id, reason, ttl_seconds):
+        now = time.time()
+        try:
+            with self._cursor() as cur:
+                cur.execute("""
+                    INSERT OR REPLACE INTO undeliverable (target_type, target_id, guild_id, reason, failed_at, expires_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, (target_type, target_id, guild_id, reason, now, now + ttl_seconds))
+                return True
+        except Exception as e:
+            print(f"Error marking target undeliverable: {e}")
+            return False
+
+    def get_undeliverable(self, target_type, target_ids):
+        if not target_ids:
+            return set()
+
+        blocked = set()
+        now = time.time()
+        try:
+            with self._cursor() as cur:
+                for chunk in _chunks(list(target_ids)):
+                    cur.execute(f"""
+                        SELECT target_id
+                        FROM undeliverable
+                        WHERE target_type = ? AND target_id IN ({_placeholders(len(chunk))}) AND expires_at > ?
+                    """, (target_type, *chunk, now))
+                    blocked.update(row[0] for row in cur.fetchall())
+            return blocked
+        except Exception as e:
+            print(f"Error getting undeliverable targets: {e}")
+            return set()
+
+    def clear_undeliverable(self, target_type, target_id):
+        try:
+            with self._cursor() as cur:
+                cur.execute("DELETE FROM undeliverable WHERE target_type = ? AND target_id = ?", (target_type, target_id))
+                return cur.rowcount > 0
+        except Exception as e:
+            print(f"Error clearing undeliverable target: {e}")
+            return False
+
+    def list_undeliverable(self, guild_id, limit=25):
+        try:
+            with self._cursor() as cur:
+                cur.execute("""
+                    SELECT target_type, target_id, reason, failed_at, expires_at
+                    FROM undeliverable
+                    WHERE expires_at > ?
+                      AND (guild_id = ?
+                           OR (target_type = 'user'
+                               AND target_id IN (SELECT user_id FROM memberships WHERE guild_id = ?)))
+                    ORDER BY failed_at DESC
+                    LIMIT ?
+                """, (time.time(), guild_id, guild_id, limit))
+                return [
+                    (target_type, target_id, reason, _timestamp(failed_at), _timestamp(expires_at))
+                    for target_type, target_id, reason, failed_at, expires_at in cur.fetchall()
+                ]
+        except Exception as e:
+            print(f"Error listing undeliverable targets: {e}")
+            return []
+
+    def prune_undeliverable(self):
+        try:
+            with self._cursor() as cur:
+                cur.execute("DELETE FROM undeliverable WHERE expires_at <= ?", (time.time(),))
+                return cur.rowcount
+        except Exception as e:
+            print(f"Error pruning undeliverable targets: {e}")
+            return 0
+
+    # Delivery job operations
+    def enqueue_jobs(self, jobs):
+        now = time.time()
+        rows = [
+            (kind, guild_id, target_id, date.isoformat(), json.dumps(payload), now)
+            for kind, guild_id, target_id, date, payload in jobs
+        ]
+        if not rows:
+            return 0
+
+        try:
+            with self._cursor() as cur:
+                before = self._conn.total_changes
+                cur.executemany("""
+                    INSERT OR IGNORE INTO delivery_jobs (kind, guild_id, target_id, delivery_date, payload, run_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, rows)
+                added = self._conn.total_changes - before
+                # Merge new members into announcements that were already queued
+                for kind, guild_id, target_id, delivery_date, payload, _ in rows:
+                    payload = json.loads(payload)
+                    if "rows" not in payload:
+                        continue
+                    cur.execute("""
+                        SELECT id, payload, status, run_at FROM delivery_jobs
+                        WHERE kind = ? AND guild_id = ? AND target_id = ? AND delivery_date = ?
+                    """, (kind, guild_id, target_id, delivery_date))
+                    job_id, queued, status, run_at = cur.fetchone()
+                    merged = merge_job_payload(json.loads(queued), payload)
+                    if merged is None:
+                        continue
+                    # A job being run keeps its lease, and isn't completed by that run.
+                    # A finished one is due again straight away.
+                    cur.execute("""
+                        UPDATE delivery_jobs
+                        SET payload = ?, status = 'pending', attempts = 0, run_at = ?, last_error = NULL
+                        WHERE id = ?
+                    """, (json.dumps(merged), max(run_at, now) if status == "pending" else now, job_id))
+                    added += 1
+                return added
+        except Exception as e:
+            print(f"Error enqueueing delivery jobs: {e}")
+            return 0
+
+    def claim_jobs(self, limit, lease_seconds, shard=None):
+        now = time.time()
+        conditions, params = ["status = 'pending'", "run_at <= ?"], [now]
+        if shard:
+            conditions.append(f"((guild_id >> 22) % ?) IN ({_placeholders(len(shard.ids))})")
+            params += [shard.count, *shard.ids]
+        try:
+            with self._cursor() as cur:
+                # Take the write lock up front so other processes can't claim the same rows
+                cur.execute("BEGIN IMMEDIATE")
+                cur.execute(f"""
+                    SELECT id, kind, guild_id, target_id, delivery_date, payload, attempts
+                    FROM delivery_jobs
+                    WHERE {" AND ".join(conditions)}
+                    ORDER BY run_at
+                    LIMIT ?
+                """, (*params, limit))
+                rows = cur.fetchall()
+                if rows:
+                    cur.execute(f"""
+                        UPDATE delivery_jobs
+                        SET run_at = ?, attempts = attempts + 1
+                        WHERE id IN ({_placeholders(len(rows))})
+                    """, (now + lease_seconds, *(row[0] for row in rows)))
+                return [
+                    (job_id, kind, guild_id, target_id, datetime.date.fromisoformat(date), json.loads(payload), attempts + 1)
+                    for job_id, kind, guild_id, target_id, date, payload, attempts in rows
+                ]
+        except Exception as e:
+            print(f"Error claiming delivery jobs: {e}")
+            return []
+
+    def complete_jobs(self, job_ids):
+        job_ids = list(job_ids)
+        if not job_ids:
+            return 0
+
+        try:
+            with self._cursor() as cur:
+                count = 0
+                for chunk in _chunks(job_ids):
+                    cur.execute(f"""
+                        UPDATE delivery_jobs
+                        SET status = 'done', last_error = NULL
+                        WHERE id IN ({_placeholders(len(chunk))}) AND attempts > 0
+                    """, chunk)
+                    count += cur.rowcount
+                return count
+        except Exception as e:
+            print(f"Error completing delivery jobs: {e}")
+            return 0
+
+    def retry_job(self, job_id, delay_seconds, error):
+        try:
+            with self._cursor() as cur:
+                cur.execute("""
+                    UPDATE delivery_jobs
+                    SET run_at = ?, last_error = ?
+                    WHERE id = ? AND status = 'pending'
+                """, (time.time() + delay_seconds, error, job_id))
+                return cur.rowcount > 0
+        except Exception as e:
+            print(f"Error retrying delivery job: {e}")
+            return False
+
+    def fail_job(self, job_id, error):
+        try:
+            with self._cursor() as cur:
+                cur.execute("UPDATE delivery_jobs SET status = 'failed', last_error = ? WHERE id = ? AND attempts > 0",
+                            (error, job_id))
+                return cur.rowcount > 0
+        except Exception as e:
+            print(f"Error failing delivery job: {e}")
+            return False
+
+    def prune_jobs(self, before_date):
+        try:
+            with self._cursor() as cur:
+                cur.execute("DELETE FROM delivery_jobs WHERE delivery_date < ?", (before_date.isoformat(),))
+                return cur.rowcount
+        except Exception as e:
+            print(f"Error pruning delivery jobs: {e}")
+            return 0
+
+    def job_counts(self):
+        try:
+            with self._cursor() as cur:
+                cur.execute("SELECT status, count(*) FROM delivery_jobs GROUP BY status")
+                return dict(cur.fetchall())
+        except Exception as e:
+            print(f"Error counting delivery jobs: {e}")
+            return {}
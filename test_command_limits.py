@@ -0,0 +1,153 @@
+import unittest
+import sys
+import os
+import asyncio
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import the module to test
+from command_limits import KeyedRateLimiter, CommandLimiter, LoadShedder, RateLimited, Overloaded
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class TestCommandLimiter(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.limiter = CommandLimiter(user_rate=1, user_burst=2, guild_rate=1, guild_burst=3, clock=self.clock)
+
+    def test_user_burst_then_refill(self):
+        """Test that a user gets their burst, is limited, then refills"""
+        self.limiter.check(1, 10)
+        self.limiter.check(1, 10)
+        with self.assertRaises(RateLimited) as raised:
+            self.limiter.check(1, 10)
+        self.assertEqual(raised.exception.scope, "user")
+        self.assertAlmostEqual(raised.exception.retry_after, 1.0)
+
+        self.clock.now = 1.0
+        self.assertTrue(self.limiter.check(1, 10))
+
+    def test_guild_limit_and_user_rejections_dont_spend_it(self):
+        """Test the per-guild limit, and that throttled users don't use the guild's tokens"""
+        self.limiter.check(1, 10)
+        self.limiter.check(1, 10)
+        for _ in range(5):
+            with self.assertRaises(RateLimited):
+                self.limiter.check(1, 10)
+        self.limiter.check(2, 10)
+        with self.assertRaises(RateLimited) as raised:
+            self.limiter.check(3, 10)
+        self.assertEqual(raised.exception.scope, "guild")
+        self.assertTrue(self.limiter.check(3, 20))
+        self.assertEqual(self.limiter.stats()["rejected"], {"user": 5, "guild": 1})
+
+    def test_warns_once_per_burst(self):
+        """Test that only the first rejection in a burst is reported"""
+        self.limiter.check(1, None)
+        self.limiter.check(1, None)
+        warnings = []
+        for _ in range(3):
+            try:
+                self.limiter.check(1, None)
+            except RateLimited as e:
+                warnings.append(self.limiter.should_warn(e, 1, None))
+        self.assertEqual(warnings, [True, False, False])
+
+        self.clock.now = 1.0
+        self.limiter.check(1, None)
+        self.clock.now = 1.5
+        with self.assertRaises(RateLimited) as raised:
+            self.limiter.check(1, None)
+        self.assertTrue(self.limiter.should_warn(raised.exception, 1, None))
+
+class TestKeyedRateLimiter(unittest.TestCase):
+
+    def test_idle_buckets_are_evicted(self):
+        """Test that refilled buckets are dropped on the next sweep"""
+        clock = FakeClock()
+        limiter = KeyedRateLimiter(rate=1, burst=2, max_keys=100, clock=clock)
+        for key in range(10):
+            limiter.acquire(key)
+        self.assertEqual(len(limiter), 10)
+
+        clock.now = KeyedRateLimiter.SWEEP_INTERVAL
+        limiter.acquire("new")
+        self.assertEqual(len(limiter), 1)
+        self.assertEqual(limiter.evictions, 10)
+
+    def test_memory_is_bounded(self):
+        """Test that the least recently used buckets are dropped past max_keys"""
+        limiter = KeyedRateLimiter(rate=1, burst=2, max_keys=3, clock=FakeClock())
+        for key in range(5):
+            limiter.acquire(key)
+        limiter.acquire(2)
+        limiter.acquire(5)
+        self.assertEqual(len(limiter), 3)
+        self.assertEqual(list(limiter._buckets), [4, 2, 5])
+
+class TestLoadShedder(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = {}
+        self.shedder = LoadShedder(lambda: self.pool, pool_wait_ms=100, loop_lag_ms=200, max_defer=0.05)
+
+    def test_recent_pool_wait(self):
+        """Test that pool wait is averaged over checkouts since the last sample"""
+        self.assertIsNone(self.shedder.recent_pool_wait_ms())
+        self.pool.update(checkouts=10, wait_time_total_ms=5000.0)
+        self.assertIsNone(self.shedder.recent_pool_wait_ms())
+        self.pool.update(checkouts=20, wait_time_total_ms=6500.0)
+        self.assertEqual(self.shedder.recent_pool_wait_ms(), 150.0)
+        self.assertIsNone(self.shedder.recent_pool_wait_ms())
+
+    def test_overload_thresholds(self):
+        """Test entering and leaving the overloaded state"""
+        self.shedder.update(50, None)
+        self.assertFalse(self.shedder.overloaded)
+        self.shedder.update(250, None)
+        self.assertTrue(self.shedder.overloaded)
+        self.shedder.update(0, 150)
+        self.assertIn("pool wait", self.shedder.reason)
+        self.shedder.update(0, 50)
+        self.assertFalse(self.shedder.overloaded)
+
+    def test_reject_mode(self):
+        """Test that writes are rejected while overloaded"""
+        async def run():
+            self.assertTrue(await self.shedder.admit())
+            self.shedder.update(500, None)
+            with self.assertRaises(Overloaded):
+                await self.shedder.admit()
+
+        asyncio.run(run())
+        self.assertEqual(self.shedder.shed, 1)
+
+    def test_defer_mode(self):
+        """Test that writes wait for the overload to clear, and are shed if it doesn't"""
+        self.shedder.mode = "defer"
+
+        async def run():
+            self.shedder.start()
+            self.shedder.update(500, None)
+            with self.assertRaises(Overloaded):
+                await self.shedder.admit()
+
+            waiting = asyncio.create_task(self.shedder.admit())
+            await asyncio.sleep(0)
+            self.shedder.update(0, None)
+            self.assertTrue(await waiting)
+            self.shedder.stop()
+
+        asyncio.run(run())
+        self.assertEqual(self.shedder.stats()["deferred"], 2)
+        self.assertEqual(self.shedder.stats()["shed"], 1)
+
+if __name__ == '__main__':
+    unittest.main()
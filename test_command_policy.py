@@ -0,0 +1,93 @@
+import unittest
+import sys
+import os
+import asyncio
+from types import SimpleNamespace
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import the module to test
+from command_policy import CommandChannelGate, ChannelPolicy, UNRESTRICTED, compile_policy
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self):
+        return self.now
+
+def make_ctx(guild_id, channel_id, admin=False, existing_channels=(100,)):
+    guild = SimpleNamespace(
+        id=guild_id,
+        get_channel=lambda channel_id: SimpleNamespace(id=channel_id) if channel_id in existing_channels else None
+    )
+    return SimpleNamespace(guild=guild, channel=SimpleNamespace(id=channel_id), author=SimpleNamespace(admin=admin))
+
+class TestCommandChannelGate(unittest.TestCase):
+    
+    def setUp(self):
+        self.settings = {1: "100", 2: None, 3: "100"}
+        self.loads = []
+        self.clock = FakeClock()
+        
+        async def load_setting(guild_id):
+            self.loads.append(guild_id)
+            return self.settings.get(guild_id)
+        
+        self.gate = CommandChannelGate(load_setting, lambda member: member.admin, ttl=60, clock=self.clock)
+    
+    def redirect(self, ctx):
+        return asyncio.run(self.gate.redirect_for(ctx))
+    
+    def test_compile_policy(self):
+        """Test that stored settings compile to channel IDs"""
+        self.assertEqual(compile_policy("100"), ChannelPolicy(100))
+        self.assertEqual(compile_policy(None), UNRESTRICTED)
+        self.assertEqual(compile_policy("not-a-channel"), UNRESTRICTED)
+    
+    def test_redirects_outside_command_channel(self):
+        """Test that commands are only allowed in the command channel"""
+        self.assertIsNone(self.redirect(make_ctx(1, 100)))
+        self.assertEqual(self.redirect(make_ctx(1, 200)).id, 100)
+        self.assertIsNone(self.redirect(make_ctx(2, 200)))
+    
+    def test_admin_bypass(self):
+        """Test that privileged members can use commands anywhere"""
+        self.assertIsNone(self.redirect(make_ctx(1, 200, admin=True)))
+    
+    def test_missing_channel_restricts_nothing(self):
+        """Test that a deleted command channel doesn't block commands"""
+        self.assertIsNone(self.redirect(make_ctx(1, 200, existing_channels=())))
+    
+    def test_policy_is_cached(self):
+        """Test that the setting is loaded once per guild until it expires"""
+        for _ in range(5):
+            self.redirect(make_ctx(1, 200))
+        self.redirect(make_ctx(3, 200))
+        self.assertEqual(self.loads, [1, 3])
+        self.assertEqual(self.gate.stats(), {"guilds": 2, "hits": 4, "misses": 2})
+        
+        self.clock.now = 61
+        self.redirect(make_ctx(1, 200))
+        self.assertEqual(self.loads, [1, 3, 1])
+    
+    def test_set_channel_and_invalidate(self):
+        """Test that updates take effect without reloading"""
+        self.redirect(make_ctx(2, 200))
+        self.gate.set_channel(2, 100)
+        self.assertEqual(self.redirect(make_ctx(2, 200)).id, 100)
+        self.assertEqual(self.loads, [2])
+        
+        self.gate.invalidate(2)
+        self.assertIsNone(self.redirect(make_ctx(2, 200)))
+        self.assertEqual(self.loads, [2, 2])
+    
+    def test_direct_messages_are_allowed(self):
+        """Test that commands outside a guild are never redirected"""
+        ctx = SimpleNamespace(guild=None, channel=SimpleNamespace(id=1), author=SimpleNamespace(admin=False))
+        self.assertIsNone(self.redirect(ctx))
+        self.assertEqual(self.loads, [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+import sys
+import os
+import asyncio
+from unittest import mock
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import the module to test
+import database
+
+class TestDatabaseStartup(unittest.TestCase):
+
+    def setUp(self):
+        database.connection_pool = None
+
+    def tearDown(self):
+        database.connection_pool = None
+
+    def test_import_does_not_connect(self):
+        """Test that importing the module leaves the pool uncreated"""
+        self.assertIsNone(database.connection_pool)
+        with self.assertRaises(RuntimeError):
+            with database.connection():
+                pass
+
+    def test_backoff_delay(self):
+        """Test that backoff grows exponentially up to the cap"""
+        with mock.patch("database.random.uniform", side_effect=lambda low, high: high):
+            delays = [database.backoff_delay(attempt, base_delay=1, max_delay=10) for attempt in range(1, 6)]
+        self.assertEqual(delays, [1, 2, 4, 8, 10])
+
+        for attempt in range(1, 10):
+            self.assertTrue(0 <= database.backoff_delay(attempt, base_delay=1, max_delay=10) <= 10)
+
+    def test_start_database_retries(self):
+        """Test that startup retries failed attempts until the pool opens"""
+        pool = mock.Mock()
+        attempts = iter([None, None, pool])
+
+        with mock.patch("database._open_pool", side_effect=lambda: next(attempts)), \
+                mock.patch("database.initialize_database") as initialize, \
+                mock.patch("database.backoff_delay", return_value=0):
+            ok = asyncio.run(database.start_database())
+
+        self.assertTrue(ok)
+        self.assertIs(database.connection_pool, pool)
+        initialize.assert_called_once()
+
+    def test_start_database_gives_up(self):
+        """Test that startup stops after max_retries without creating the pool"""
+        with mock.patch("database._open_pool", return_value=None) as open_pool, \
+                mock.patch("database.backoff_delay", return_value=0):
+            ok = asyncio.run(database.start_database(max_retries=2))
+
+        self.assertFalse(ok)
+        self.assertIsNone(database.connection_pool)
+        self.assertEqual(open_pool.call_count, 2)
+
+    def test_start_database_raises_on_schema_failure(self):
+        """Test that a failed schema or migration is rolled back and fails startup"""
+        conn = mock.MagicMock()
+        with mock.patch("database._open_pool", return_value=mock.Mock()), \
+                mock.patch("database.get_connection", return_value=conn), \
+                mock.patch("database.release_connection") as release, \
+                mock.patch("database.create_schema", side_effect=RuntimeError("migration failed")):
+            with self.assertRaises(RuntimeError):
+                asyncio.run(database.start_database())
+
+        conn.rollback.assert_called_once()
+        conn.commit.assert_not_called()
+        release.assert_called_once_with(conn)
+
+if __name__ == '__main__':
+    unittest.main()
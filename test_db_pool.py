@@ -0,0 +1,99 @@
+import unittest
+import sys
+import os
+import threading
+
+from psycopg2 import extensions
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import the module to test
+from db_pool import ConnectionPool, PoolTimeout
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *args):
+        pass
+    
+    def execute(self, query):
+        if self.conn.dead:
+            raise Exception("server closed the connection unexpectedly")
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.dead = False
+    
+    def cursor(self):
+        return FakeCursor(self)
+    
+    def rollback(self):
+        pass
+    
+    def close(self):
+        self.closed = 1
+    
+    def get_transaction_status(self):
+        return extensions.TRANSACTION_STATUS_IDLE
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self):
+        return self.now
+
+class TestConnectionPool(unittest.TestCase):
+    
+    def setUp(self):
+        self.clock = FakeClock()
+        self.pool = ConnectionPool(1, 2, timeout=0.05, health_check_after=30, max_lifetime=3600,
+                                   connect=FakeConnection, clock=self.clock)
+    
+    def test_reuses_connections(self):
+        """Test that a returned connection is handed out again"""
+        conn = self.pool.getconn()
+        self.pool.putconn(conn)
+        self.assertIs(self.pool.getconn(), conn)
+        self.assertEqual(self.pool.stats()["size"], 1)
+    
+    def test_timeout_when_exhausted(self):
+        """Test that checkout waits and then raises once the pool is full"""
+        self.pool.getconn()
+        self.pool.getconn()
+        with self.assertRaises(PoolTimeout):
+            self.pool.getconn(timeout=0)
+        self.assertEqual(self.pool.stats()["timeouts"], 1)
+    
+    def test_waiter_gets_returned_connection(self):
+        """Test that a waiting thread receives a connection when one is returned"""
+        first = self.pool.getconn()
+        self.pool.getconn()
+        result = []
+        
+        waiter = threading.Thread(target=lambda: result.append(self.pool.getconn(timeout=5)))
+        waiter.start()
+        self.pool.putconn(first)
+        waiter.join()
+        self.assertIs(result[0], first)
+    
+    def test_dead_connection_is_recycled(self):
+        """Test that a connection failing its health check is replaced"""
+        conn = self.pool.getconn()
+        self.pool.putconn(conn)
+        conn.dead = True
+        self.clock.now = 60
+        
+        replacement = self.pool.getconn()
+        self.assertIsNot(replacement, conn)
+        self.assertTrue(conn.closed)
+        self.assertEqual(self.pool.stats()["recycled"], 1)
+        
+if __name__ == '__main__':
+    unittest.main()
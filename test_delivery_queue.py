@@ -0,0 +1,84 @@
+import unittest
+import sys
+import os
+import asyncio
+import datetime
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import the module to test
+from delivery_queue import DeliveryWorkers
+from storage import set_storage
+from storage_memory import MemoryStorage
+
+TODAY = datetime.date(2024, 7, 4)
+
+class TestDeliveryWorkers(unittest.TestCase):
+
+    def setUp(self):
+        self.storage = set_storage(MemoryStorage())
+        self.addCleanup(set_storage, None)
+        self.handled = []
+
+    def queue(self, count):
+        self.storage.enqueue_jobs([("dm", 10, user_id, TODAY, {}) for user_id in range(count)])
+
+    def make_workers(self, outcome=lambda job: True, **kwargs):
+        async def handle(job):
+            self.handled.append(job[3])
+            await asyncio.sleep(0)
+            return outcome(job)
+
+        kwargs.setdefault("retry_base_delay", 0)
+        return DeliveryWorkers(handle, **kwargs)
+
+    def test_workers_drain_queue_once(self):
+        """Test that concurrent workers send every job exactly once"""
+        self.queue(200)
+
+        async def run():
+            workers = self.make_workers(workers=8, batch_size=7, poll_interval=0.01)
+            workers.start()
+            while self.storage.job_counts().get("pending"):
+                await asyncio.sleep(0.01)
+            workers.stop()
+            return workers.stats()
+
+        stats = asyncio.run(run())
+        self.assertEqual(sorted(self.handled), list(range(200)))
+        self.assertEqual(stats["completed"], 200)
+        self.assertEqual(self.storage.job_counts(), {"done": 200})
+
+    def test_retry_then_give_up(self):
+        """Test that failures are retried and given up on after max_attempts"""
+        self.queue(2)
+
+        def outcome(job):
+            if job[3] == 1:
+                raise RuntimeError("Missing Access")
+            return job[6] >= 2
+
+        async def run():
+            workers = self.make_workers(outcome, max_attempts=3)
+            for _ in range(3):
+                await workers.run_batch()
+            return workers.stats()
+
+        stats = asyncio.run(run())
+        self.assertEqual(self.handled, [0, 1, 0, 1, 1])
+        self.assertEqual((stats["completed"], stats["retried"], stats["failed"]), (1, 3, 1))
+        self.assertEqual(self.storage.jobs[2][8], "Missing Access")
+        self.assertEqual(self.storage.job_counts(), {"done": 1, "failed": 1})
+
+    def test_crashed_worker_jobs_are_reclaimed(self):
+        """Test that jobs claimed by a worker that never finished are run after the lease"""
+        self.queue(3)
+        self.assertEqual(len(self.storage.claim_jobs(10, 0)), 3)
+
+        asyncio.run(self.make_workers().run_batch())
+        self.assertEqual(sorted(self.handled), [0, 1, 2])
+        self.assertEqual(self.storage.job_counts(), {"done": 3})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+import sys
+import os
+import asyncio
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import the module to test
+from fanout import fan_out, count_results
+
+class TestFanOut(unittest.TestCase):
+    
+    def test_respects_concurrency_limit(self):
+        """Test that no more than `concurrency` workers run at once"""
+        running = 0
+        peak = 0
+        
+        async def worker(item):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.001)
+            running -= 1
+            return True
+        
+        results = asyncio.run(fan_out(range(20), worker, concurrency=3))
+        self.assertEqual(peak, 3)
+        self.assertEqual(len(results), 20)
+    
+    def test_failures_do_not_stop_batch(self):
+        """Test that exceptions are collected per item"""
+        async def worker(item):
+            if item == 2:
+                raise RuntimeError("boom")
+            return item % 2 == 0
+        
+        results = asyncio.run(fan_out(range(5), worker, concurrency=2))
+        self.assertEqual([result.item for result in results], [0, 1, 2, 3, 4])
+        self.assertIsInstance(results[2].error, RuntimeError)
+        self.assertEqual(count_results(results), (2, 3))
+    
+    def test_empty_batch(self):
+        """Test fan-out over no items"""
+        self.assertEqual(asyncio.run(fan_out([], None)), [])
+        
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,165 @@
+import unittest
+import sys
+import os
+import time
+import asyncio
+from unittest.mock import patch
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import the module to test
+import leader
+from leader import AdvisoryLock, LeaderElection
+
+class FakeLock:
+    """Stands in for AdvisoryLock, shared between replicas through `owner`"""
+
+    owner = None
+
+    def __init__(self, name):
+        self.name = name
+        self.partition = 0
+        self.hang = False
+
+    def try_acquire(self):
+        if FakeLock.owner in (None, self.name):
+            FakeLock.owner = self.name
+            return True
+        return False
+
+    def check(self):
+        if self.hang:
+            time.sleep(0.2)
+        return FakeLock.owner == self.name
+
+    def abandon(self):
+        # The stuck session keeps the lock until Postgres notices it's gone
+        self.abandoned = True
+        FakeLock.owner = "stale session"
+
+    def release(self):
+        if FakeLock.owner == self.name:
+            FakeLock.owner = None
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params):
+        if self.conn.broken:
+            raise Exception("server closed the connection unexpectedly")
+        self.conn.queries.append(query)
+
+    def fetchone(self):
+        return (self.conn.result,)
+
+class FakeConnection:
+    def __init__(self, result):
+        self.result = result
+        self.broken = False
+        self.queries = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+class TestAdvisoryLock(unittest.TestCase):
+
+    def setUp(self):
+        self.released = []
+        patcher = patch.object(leader.database, "release_connection",
+                               side_effect=lambda conn, close=False: self.released.append((conn, close)))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_acquire_keeps_connection(self):
+        """Test that a taken lock keeps its connection and a busy lock closes it"""
+        conn = FakeConnection(True)
+        with patch.object(leader.database, "get_connection", return_value=conn):
+            lock = AdvisoryLock(1, 2)
+            self.assertTrue(lock.try_acquire())
+        self.assertTrue(lock.held)
+        self.assertEqual(self.released, [])
+
+        busy = FakeConnection(False)
+        with patch.object(leader.database, "get_connection", return_value=busy):
+            self.assertFalse(AdvisoryLock(1, 2).try_acquire())
+        self.assertEqual(self.released, [(busy, True)])
+
+    def test_check_drops_lost_connection(self):
+        """Test that a broken session gives up the lock and is closed"""
+        conn = FakeConnection(True)
+        with patch.object(leader.database, "get_connection", return_value=conn):
+            lock = AdvisoryLock(1, 2)
+            lock.try_acquire()
+        conn.result = 1
+        self.assertTrue(lock.check())
+        conn.broken = True
+        self.assertFalse(lock.check())
+        self.assertFalse(lock.held)
+        self.assertEqual(self.released, [(conn, True)])
+
+class TestLeaderElection(unittest.TestCase):
+
+    def setUp(self):
+        FakeLock.owner = None
+        self.events = []
+
+    def make(self, name):
+        async def on_elected():
+            self.events.append(("elected", name))
+
+        async def on_lost():
+            self.events.append(("lost", name))
+
+        return LeaderElection(FakeLock(name), on_elected, on_lost, interval=0.01, timeout=0.05)
+
+    def test_one_leader_and_failover(self):
+        """Test that only one replica leads and another takes over when it goes"""
+        async def run():
+            first, second = self.make("a"), self.make("b")
+            first.start()
+            await asyncio.sleep(0.03)
+            second.start()
+            await asyncio.sleep(0.03)
+            self.assertTrue(first.is_leader)
+            self.assertFalse(second.is_leader)
+
+            await first.stop()
+            await asyncio.sleep(0.05)
+            self.assertTrue(second.is_leader)
+            await second.stop()
+
+        asyncio.run(run())
+        self.assertEqual(self.events, [("elected", "a"), ("lost", "a"), ("elected", "b"), ("lost", "b")])
+
+    def test_steps_down_when_lock_is_lost(self):
+        """Test that a leader steps down when its lock disappears or its check hangs"""
+        async def run():
+            election = self.make("a")
+            election.start()
+            await asyncio.sleep(0.03)
+            FakeLock.owner = "someone else"
+            await asyncio.sleep(0.03)
+            self.assertFalse(election.is_leader)
+
+            FakeLock.owner = None
+            await asyncio.sleep(0.03)
+            self.assertTrue(election.is_leader)
+            election.lock.hang = True
+            await asyncio.sleep(0.1)
+            self.assertFalse(election.is_leader)
+            self.assertTrue(election.lock.abandoned)
+            await election.stop()
+
+        asyncio.run(run())
+        self.assertEqual(self.events[:3], [("elected", "a"), ("lost", "a"), ("elected", "a")])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import unittest
+import sys
+import os
+import asyncio
+import datetime
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import the module to test
+from listings import fetch_page, format_entry, BirthdayPages
+from storage import set_storage
+from storage_memory import MemoryStorage
+from utils import birthday_window
+
+class FakeMember:
+    def __init__(self, name):
+        self.display_name = name
+
+class FakeGuild:
+    def __init__(self, guild_id, members):
+        self.id = guild_id
+        self.members = members
+
+    def get_member(self, user_id):
+        return self.members.get(user_id)
+
+class TestListings(unittest.TestCase):
+
+    def setUp(self):
+        self.storage = set_storage(MemoryStorage())
+        self.addCleanup(set_storage, None)
+        # Two birthdays on each of the last and first three days of the year
+        self.storage.load([
+            (day * 10 + n, 10, day, 2000, 1, 1, n) for day in (1, 2, 3, 364, 365, 366) for n in range(2)
+        ])
+
+    def test_pages_cross_the_new_year(self):
+        """Test that cursors page through a wrapped window in calendar order"""
+        ranges = birthday_window(datetime.date(2024, 12, 29), 7)
+
+        async def run():
+            pages, cursor = [], None
+            while True:
+                rows, cursor = await fetch_page(10, ranges, cursor, limit=4)
+                pages.append([row[1] for row in rows])
+                if cursor is None:
+                    return pages
+
+        self.assertEqual(asyncio.run(run()), [[364, 364, 365, 365], [366, 366, 1, 1], [2, 2, 3, 3]])
+
+    def test_last_page_ends_exactly(self):
+        """Test that a page that ends on the last row has no next cursor"""
+        rows, cursor = asyncio.run(fetch_page(10, [(1, 3)], limit=6))
+        self.assertEqual(len(rows), 6)
+        self.assertIsNone(cursor)
+
+    def test_format_entry(self):
+        """Test member names from the cache, mentions otherwise, and shared ages"""
+        guild = FakeGuild(10, {1: FakeMember("Ada_L")})
+        today = datetime.date(2024, 12, 30)
+        self.assertEqual(format_entry(guild, (1, 186, 1990, 0), today), "**Jul 4** - Ada\\_L")
+        # Jul 4 has passed, so it's next year's birthday
+        self.assertEqual(format_entry(guild, (2, 186, 1990, 1), today), "**Jul 4** - <@2> (turning 35)")
+        self.assertEqual(format_entry(guild, (2, 366, 1990, 1), today), "**Dec 31** - <@2> (turning 34)")
+        self.assertEqual(format_entry(guild, (2, 366, 1990, 1)), "**Dec 31** - <@2>")
+
+    def test_page_buttons(self):
+        """Test that Next and Previous move through the stack of cursors"""
+        guild = FakeGuild(10, {})
+
+        async def run():
+            view = BirthdayPages(guild, 1, "Birthdays", [(1, 366)], page_size=5)
+            first = (await view.load()).description
+            self.assertTrue(view.previous_page.disabled)
+            view.cursors.append(view.next_cursor)
+            await view.load()
+            view.cursors.append(view.next_cursor)
+            last = await view.load()
+            self.assertTrue(view.next_page.disabled)
+            self.assertEqual(last.footer.text, "Page 3")
+            view.cursors.pop()
+            view.cursors.pop()
+            self.assertEqual((await view.load()).description, first)
+            view.stop()
+
+        asyncio.run(run())
+
+if __name__ == '__main__':
+    unittest.main()
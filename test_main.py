@@ -0,0 +1,168 @@
+import unittest
+import sys
+import os
+import asyncio
+import datetime
+from unittest import mock
+
+# Add the parent directory and the benchmark fakes to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks"))
+
+# Import the module to test
+import main
+from data_access import settings_cache, TARGET_CHANNEL, DELIVERY_ANNOUNCE
+from delivery_queue import DeliveryWorkers
+from outbound import OutboundScheduler
+from storage import set_storage
+from storage_memory import MemoryStorage
+from user_resolver import UserResolver
+from utils import encode_birthday
+from fake_discord import FakeClient, FakeGuild
+
+TODAY = datetime.date(2024, 7, 4)
+JUL_4, JUL_5 = encode_birthday("0704"), encode_birthday("0705")
+
+# Guild 10 announces each member on their own, guild 20 in one combined message,
+# and guild 30 has no announcement channel. Guild 40 is on shard 1 of 2.
+SINGLE, COALESCED, SILENT, OTHER_SHARD = 10, 20, 30, 40 | (1 << 22)
+GUILD_CONFIGS = [
+    (SINGLE, "UTC", 100, None, False, False),
+    (COALESCED, "UTC", 200, None, False, True),
+    (SILENT, "UTC", None, None, False, False),
+    (OTHER_SHARD, "UTC", 400, None, False, False),
+]
+
+# (user_id, guild_id, birthday, birth_year, announce_in_servers, receive_dms, share_age)
+USERS = [
+    (1, SINGLE, JUL_4, None, 1, 1, 0),
+    (2, SINGLE, JUL_4, 1990, 1, 0, 1),
+    (3, COALESCED, JUL_4, None, 1, 1, 0),
+    (4, COALESCED, JUL_4, None, 1, 1, 0),
+    (5, SILENT, JUL_4, None, 1, 1, 0),
+    (6, SINGLE, JUL_5, None, 1, 1, 0),
+    (7, OTHER_SHARD, JUL_4, None, 1, 1, 0),
+]
+
+class TestBirthdayDelivery(unittest.TestCase):
+
+    def setUp(self):
+        self.storage = set_storage(MemoryStorage())
+        self.addCleanup(set_storage, None)
+        self.storage.load(USERS, GUILD_CONFIGS)
+        settings_cache.clear()
+        self.addCleanup(settings_cache.clear)
+
+        self.client = FakeClient()
+        self.client.cached_users.update(user_id for user_id, *_ in USERS)
+        for guild_id, _, channel_id, *_ in GUILD_CONFIGS:
+            members = [user_id for user_id, member_guild, *_ in USERS if member_guild == guild_id]
+            self.client.add_guild(FakeGuild(self.client, guild_id, members, [channel_id] if channel_id else []))
+
+        for name, value in [
+            ("bot", self.client),
+            ("user_resolver", UserResolver(self.client)),
+            ("outbound", OutboundScheduler(global_rate=1e9, global_burst=1e9, route_rate=1e9, route_burst=1e9)),
+            ("get_current_date", lambda timezone=None: TODAY),
+        ]:
+            patcher = mock.patch.object(main, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch("utils.get_current_date", lambda timezone=None: TODAY)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_bot(self, coro):
+        """Run a coroutine against the fake client, then flush outbound sends"""
+        async def run():
+            try:
+                return await coro
+            finally:
+                await main.outbound.stop()
+        return asyncio.run(run())
+
+    def messages(self, guild_id):
+        guild = self.client.get_guild(guild_id)
+        return [message for channel in guild.channels.values() for message in channel.messages]
+
+    def test_inline_delivery_then_ledger_skips(self):
+        """Test that a check sends each DM and announcement once, and a second check sends nothing"""
+        stats = self.run_bot(main.check_birthdays())
+        self.assertNotIn("error", stats)
+        self.assertEqual(sorted(self.client.dms), [1, 3, 4, 5, 7])
+        # One message per member, or one for the whole guild when coalesced
+        self.assertEqual(len(self.messages(SINGLE)), 2)
+        self.assertEqual(len(self.messages(COALESCED)), 1)
+        self.assertIn("<@3>", self.messages(COALESCED)[0])
+        self.assertIn("<@4>", self.messages(COALESCED)[0])
+        self.assertEqual(stats["announcements_sent"], 5)
+        self.assertEqual(stats["announcement_messages"], 4)
+
+        stats = self.run_bot(main.check_birthdays())
+        self.assertEqual((stats["dms_sent"], stats["announcements_sent"]), (0, 0))
+        self.assertEqual(len(self.client.dms), 5)
+        self.assertEqual(len(self.messages(SINGLE)), 2)
+
+    def test_only_own_shards(self):
+        """Test that a process on shard 0 of 2 leaves shard 1's users and guilds alone"""
+        self.client.shard_count, self.client.shard_ids = 2, [0]
+        del self.client._guilds[OTHER_SHARD]
+
+        self.run_bot(main.check_birthdays())
+        self.assertEqual(sorted(self.client.dms), [1, 3, 4, 5])
+
+    def test_queue_delivery(self):
+        """Test that queue mode sends the same deliveries through the job queue"""
+        workers = DeliveryWorkers(main.run_delivery_job, workers=2, poll_interval=0.01)
+
+        async def run():
+            stats = await main.check_birthdays()
+            workers.start()
+            while self.storage.job_counts().get("pending"):
+                await asyncio.sleep(0.01)
+            workers.stop()
+            return stats
+
+        with mock.patch.object(main, "DELIVERY_MODE", "queue"), mock.patch.object(main, "delivery_workers", workers):
+            stats = self.run_bot(run())
+            self.assertEqual((stats["dms_queued"], stats["announcements_queued"]), (5, 4))
+            self.assertEqual(self.storage.job_counts(), {"done": 9})
+            self.assertEqual(sorted(self.client.dms), [1, 3, 4, 5, 7])
+            self.assertEqual(len(self.messages(SINGLE)), 2)
+            self.assertEqual(len(self.messages(COALESCED)), 1)
+
+            # A member registering later in the day joins the coalesced guild's job
+            self.storage.load([(8, COALESCED, JUL_4, None, 1, 0, 0)])
+            self.client.get_guild(COALESCED).member_ids.add(8)
+            self.client.cached_users.add(8)
+            stats = self.run_bot(run())
+            self.assertEqual((stats["dms_queued"], stats["announcements_queued"]), (0, 1))
+            self.assertEqual(len(self.messages(COALESCED)), 2)
+            self.assertIn("<@8>", self.messages(COALESCED)[1])
+            self.assertNotIn("<@3>", self.messages(COALESCED)[1])
+
+    def test_delivery_job_waits_for_guild(self):
+        """Test that announcement jobs retry until their guild is loaded, and end once it's been left"""
+        job = (1, DELIVERY_ANNOUNCE, SINGLE, 1, TODAY, {"channel_id": 100, "mention_everyone": False, "rows": [[1, None, 0]]}, 1)
+        guild = self.client.get_guild(SINGLE)
+        guild.unavailable = True
+        self.assertFalse(self.run_bot(main.run_delivery_job(job)))
+
+        del self.client._guilds[SINGLE]
+        with mock.patch.object(self.client, "is_ready", return_value=False):
+            self.assertFalse(self.run_bot(main.run_delivery_job(job)))
+        self.assertTrue(self.run_bot(main.run_delivery_job(job)))
+        self.assertEqual(guild.channels[100].messages, [])
+
+    def test_announcement_for_departed_members(self):
+        """Test that an announcement whose members have all left sends nothing"""
+        guild = self.client.get_guild(COALESCED)
+        guild.member_ids.clear()
+        rows = [((user_id, COALESCED, DELIVERY_ANNOUNCE, TODAY), (user_id, COALESCED, None, 1, 1, 0)) for user_id in (3, 4)]
+        del guild.channels[200]
+
+        self.assertEqual(self.run_bot(main.send_announcement_item((rows, guild, 200, False, True))), [])
+        self.assertEqual(self.storage.get_undeliverable(TARGET_CHANNEL, {200}), set())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+import sys
+import os
+from unittest import mock
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import the module to test
+import metrics
+
+class TestMetricsDisabled(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch("metrics.ENABLED", False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_timed_returns_function_unchanged(self):
+        """Test that instrumentation is skipped entirely when disabled"""
+        def query():
+            return 1
+        self.assertIs(metrics.timed(query), query)
+
+    def test_nothing_recorded(self):
+        """Test that counters and histograms ignore updates when disabled"""
+        counter = metrics.Counter("test_disabled_total", "Test counter")
+        histogram = metrics.Histogram("test_disabled_seconds", "Test histogram")
+        counter.inc()
+        histogram.observe(value=0.1)
+        self.assertEqual(counter.render(), ["# HELP test_disabled_total Test counter", "# TYPE test_disabled_total counter"])
+        self.assertEqual(len(histogram.render()), 2)
+
+class TestMetricsEnabled(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch("metrics.ENABLED", True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_counter(self):
+        """Test that counters add up per label set"""
+        counter = metrics.Counter("test_calls_total", "Test counter", ["function"])
+        counter.inc("a")
+        counter.inc("a", amount=2)
+        counter.inc("b")
+        lines = counter.render()
+        self.assertIn('test_calls_total{function="a"} 3', lines)
+        self.assertIn('test_calls_total{function="b"} 1', lines)
+
+    def test_histogram_buckets_are_cumulative(self):
+        """Test that histogram buckets, sum and count are rendered correctly"""
+        histogram = metrics.Histogram("test_latency_seconds", "Test histogram", buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 2.0):
+            histogram.observe(value=value)
+        lines = histogram.render()
+        self.assertIn('test_latency_seconds_bucket{le="0.1"} 2', lines)
+        self.assertIn('test_latency_seconds_bucket{le="1.0"} 3', lines)
+        self.assertIn('test_latency_seconds_bucket{le="+Inf"} 4', lines)
+        self.assertIn('test_latency_seconds_sum 2.65', lines)
+        self.assertIn('test_latency_seconds_count 4', lines)
+
+    def test_label_escaping(self):
+        """Test that quotes, backslashes and newlines in label values are escaped"""
+        counter = metrics.Counter("test_escape_total", "Test counter", ["command"])
+        counter.inc('a"b\\c\nd')
+        self.assertIn('test_escape_total{command="a\\"b\\\\c\\nd"} 1', counter.render())
+
+    def test_timed(self):
+        """Test that timed functions count calls, including ones that raise"""
+        def failing_query():
+            raise ValueError("boom")
+        wrapped = metrics.timed(failing_query)
+        with self.assertRaises(ValueError):
+            wrapped()
+        self.assertIn('birthday_bot_db_calls_total{function="failing_query"} 1', metrics.db_calls.render())
+
+    def test_collectors_in_render(self):
+        """Test that collector samples are rendered at scrape time"""
+        with mock.patch("metrics._collectors", []):
+            metrics.add_collector(lambda: [("test_pool_size", "gauge", "Pool size", 4)])
+            output = metrics.render()
+        self.assertIn("# TYPE test_pool_size gauge\ntest_pool_size 4\n", output)
+        self.assertIn("# TYPE birthday_bot_db_call_duration_seconds histogram", output)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+import sys
+import os
+import asyncio
+from datetime import datetime, timedelta
+import pytz
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import the module to test
+from midnight_scheduler import MidnightScheduler
+
+class FakeClock:
+    def __init__(self, now):
+        self.now = now
+    
+    def __call__(self):
+        return self.now
+
+class TestMidnightScheduler(unittest.TestCase):
+    
+    def setUp(self):
+        self.clock = FakeClock(pytz.UTC.localize(datetime(2024, 6, 1, 12, 0)))
+        self.calls = []
+        
+        async def on_rollover(timezone, guild_ids):
+            self.calls.append((timezone, guild_ids))
+        
+        self.scheduler = MidnightScheduler(on_rollover, clock=self.clock)
+    
+    def test_buckets_and_next_rollover(self):
+        """Test that the earliest local midnight is scheduled first"""
+        self.scheduler.set_guild_timezone(1, "UTC")
+        self.scheduler.set_guild_timezone(2, "Asia/Tokyo")
+        
+        when, timezone = self.scheduler.next_rollover()
+        self.assertEqual(timezone, "Asia/Tokyo")
+        self.assertEqual(when, pytz.UTC.localize(datetime(2024, 6, 1, 15, 0)))
+    
+    def test_move_guild_between_buckets(self):
+        """Test that changing a guild's timezone moves it right away"""
+        self.scheduler.set_guild_timezone(1, "Asia/Tokyo")
+        self.scheduler.set_guild_timezone(1, "America/New_York")
+        
+        self.assertNotIn("Asia/Tokyo", self.scheduler.buckets)
+        self.assertEqual(self.scheduler.buckets["America/New_York"], {1})
+    
+    def test_processes_only_due_bucket(self):
+        """Test that a rollover processes only that timezone's guilds"""
+        self.scheduler.set_guild_timezone(1, "UTC")
+        self.scheduler.set_guild_timezone(2, "Asia/Tokyo")
+        self.clock.now += timedelta(hours=3, minutes=1)  # Just past midnight in Tokyo
+        
+        async def scenario():
+            self.scheduler.start()
+            while not self.calls:
+                await asyncio.sleep(0)
+            self.scheduler.stop()
+        
+        asyncio.run(scenario())
+        self.assertEqual(self.calls, [("Asia/Tokyo", {2})])
+        
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import unittest
+import sys
+import os
+import asyncio
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import the module to test
+from outbound import TokenBucket, OutboundScheduler, PRIORITY_REPLY, PRIORITY_ANNOUNCE, PRIORITY_DM
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self):
+        return self.now
+
+class TestTokenBucket(unittest.TestCase):
+    
+    def test_burst_then_refill(self):
+        """Test that the bucket allows a burst and then refills at its rate"""
+        clock = FakeClock()
+        bucket = TokenBucket(rate=2, capacity=2, clock=clock)
+        self.assertTrue(bucket.try_acquire())
+        self.assertTrue(bucket.try_acquire())
+        self.assertFalse(bucket.try_acquire())
+        self.assertAlmostEqual(bucket.delay(), 0.5)
+        
+        clock.now = 0.5
+        self.assertTrue(bucket.try_acquire())
+
+class TestOutboundScheduler(unittest.TestCase):
+    
+    def test_priority_order(self):
+        """Test that replies go out before queued announcements and DMs"""
+        sent = []
+        
+        async def scenario():
+            scheduler = OutboundScheduler(global_rate=1000, global_burst=1, route_rate=1000, route_burst=1000)
+            
+            def job(name):
+                async def send():
+                    sent.append(name)
+                return send
+            
+            tasks = [asyncio.create_task(scheduler.submit(PRIORITY_DM, ("dm", i), job(f"dm{i}"))) for i in range(3)]
+            tasks += [asyncio.create_task(scheduler.submit(PRIORITY_ANNOUNCE, ("channel", 1), job(f"announce{i}"))) for i in range(3)]
+            tasks.append(asyncio.create_task(scheduler.submit(PRIORITY_REPLY, ("channel", 2), job("reply"))))
+            await asyncio.gather(*tasks)
+            await scheduler.stop()
+        
+        asyncio.run(scenario())
+        self.assertEqual(sent[0], "reply")
+        self.assertEqual(sent[1:4], ["announce0", "announce1", "announce2"])
+        self.assertEqual(sorted(sent[4:]), ["dm0", "dm1", "dm2"])
+    
+    def test_route_limit_does_not_block_other_routes(self):
+        """Test that a rate-limited channel doesn't hold up other channels"""
+        sent = []
+        
+        async def scenario():
+            scheduler = OutboundScheduler(global_rate=1000, global_burst=1000, route_rate=1, route_burst=1)
+            
+            def job(name):
+                async def send():
+                    sent.append(name)
+                return send
+            
+            busy = [asyncio.create_task(scheduler.submit(PRIORITY_ANNOUNCE, ("channel", 1), job("busy"))) for _ in range(2)]
+            other = asyncio.create_task(scheduler.submit(PRIORITY_ANNOUNCE, ("channel", 2), job("other")))
+            await other
+            self.assertEqual(sent, ["busy", "other"])
+            for task in busy:
+                task.cancel()
+            await scheduler.stop()
+        
+        asyncio.run(scenario())
+    
+    def test_exceptions_reach_caller(self):
+        """Test that a failed send raises in the submitter"""
+        async def scenario():
+            scheduler = OutboundScheduler()
+            
+            async def send():
+                raise PermissionError("Forbidden")
+            
+            with self.assertRaises(PermissionError):
+                await scheduler.submit(PRIORITY_DM, ("dm", 1), send)
+            self.assertEqual(scheduler.stats()["failed"]["dm"], 1)
+            await scheduler.stop()
+        
+        asyncio.run(scenario())
+        
+if __name__ == '__main__':
+    unittest.main()
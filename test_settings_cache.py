@@ -0,0 +1,65 @@
+import unittest
+import sys
+import os
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import the module to test
+from settings_cache import SettingsCache, MISSING
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self):
+        return self.now
+
+class TestSettingsCache(unittest.TestCase):
+    
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = SettingsCache(max_size=2, ttl=10, clock=self.clock)
+    
+    def test_hit_and_miss(self):
+        """Test that lookups are counted as hits or misses"""
+        self.assertIs(self.cache.get(1), MISSING)
+        self.cache.set(1, "UTC")
+        self.assertEqual(self.cache.get(1), "UTC")
+        
+        stats = self.cache.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+    
+    def test_caches_none(self):
+        """Test that a cached None is a hit, not a miss"""
+        self.cache.set(1, None)
+        self.assertIsNone(self.cache.get(1))
+    
+    def test_ttl_expiry(self):
+        """Test that entries expire after the TTL"""
+        self.cache.set(1, "UTC")
+        self.clock.now = 10
+        self.assertIs(self.cache.get(1), MISSING)
+    
+    def test_lru_eviction(self):
+        """Test that the least recently used entry is evicted when full"""
+        self.cache.set(1, "1")
+        self.cache.set(2, "2")
+        self.cache.get(1)  # Guild 1 is now the most recently used
+        self.cache.set(3, "3")
+        
+        self.assertEqual(self.cache.get(1), "1")
+        self.assertIs(self.cache.get(2), MISSING)
+        self.assertEqual(self.cache.stats()["evictions"], 1)
+    
+    def test_invalidate_guild(self):
+        """Test dropping a guild's entry"""
+        self.cache.set(1, "1")
+        self.cache.set(2, "2")
+        self.cache.invalidate(1)
+        self.assertIs(self.cache.get(1), MISSING)
+        self.assertEqual(self.cache.get(2), "2")
+        
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+import sys
+import os
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import the module to test
+from sharding import parse_shard_ids, shard_for_guild, shard_config, shard_filter, ShardFilter
+
+class TestSharding(unittest.TestCase):
+
+    def test_parse_shard_ids(self):
+        """Test parsing shard lists and ranges"""
+        self.assertEqual(parse_shard_ids("0-3"), [0, 1, 2, 3])
+        self.assertEqual(parse_shard_ids("8, 2,4-5"), [2, 4, 5, 8])
+        self.assertIsNone(parse_shard_ids(""))
+
+    def test_shard_for_guild(self):
+        """Test Discord's guild to shard formula"""
+        self.assertEqual(shard_for_guild(81384788765712384, 1), 0)
+        self.assertEqual(shard_for_guild(81384788765712384, 16), (81384788765712384 >> 22) % 16)
+        self.assertEqual(shard_for_guild(5 << 22, 4), 1)
+
+    def test_shard_config(self):
+        """Test building AutoShardedBot arguments from the environment"""
+        self.assertEqual(shard_config(0, ""), {"shard_count": None, "shard_ids": None})
+        self.assertEqual(shard_config(8, "4-7"), {"shard_count": 8, "shard_ids": [4, 5, 6, 7]})
+        with self.assertRaises(ValueError):
+            shard_config(0, "0-3")
+        with self.assertRaises(ValueError):
+            shard_config(4, "2-5")
+
+    def test_shard_filter(self):
+        """Test that a filter is only used when a process runs part of the shards"""
+        self.assertIsNone(shard_filter(None, None))
+        self.assertIsNone(shard_filter(1, [0]))
+        self.assertIsNone(shard_filter(4, [0, 1, 2, 3]))
+        shard = shard_filter(4, [1, 3])
+        self.assertEqual(shard, ShardFilter(4, frozenset({1, 3})))
+        self.assertTrue(shard.owns(1 << 22))
+        self.assertFalse(shard.owns(2 << 22))
+
+if __name__ == '__main__':
+    unittest.main()
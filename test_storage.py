@@ -0,0 +1,436 @@
+import unittest
+import sys
+import os
+import asyncio
+import datetime
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import the modules to test
+import storage
+from storage import Storage, create_storage, GuildConfig, DEFAULT_GUILD_CONFIG
+from sharding import ShardFilter
+from storage_memory import MemoryStorage
+from storage_sqlite import SQLiteStorage
+from storage_postgres import PostgresStorage
+from utils import encode_birthday, birthday_window
+
+JAN_1, JUL_4, JUL_5, DEC_25 = (encode_birthday(mmdd) for mmdd in ("0101", "0704", "0705", "1225"))
+
+class StorageContract:
+    """Behaviour every storage backend must share, run against each one below"""
+
+    def make_storage(self):
+        raise NotImplementedError
+
+    def setUp(self):
+        self.storage = self.make_storage()
+        self.storage.initialize()
+        self.addCleanup(self.storage.close)
+        self.today = datetime.date(2024, 7, 4)
+
+    def test_ping(self):
+        self.assertTrue(self.storage.ping())
+
+    def test_birthday_crud(self):
+        """Test setting, updating, reading and clearing a birthday"""
+        s = self.storage
+        self.assertIsNone(s.get_user_birthday(1, 10))
+        self.assertTrue(s.set_birthday(1, 10, JUL_4))
+        self.assertEqual(s.get_user_birthday(1, 10), (JUL_4, None, 1, 1, 0))
+
+        self.assertTrue(s.set_birthday(1, 10, DEC_25))
+        self.assertTrue(s.set_birth_year(1, 10, 1990))
+        self.assertEqual(s.get_user_birthday(1, 10), (DEC_25, 1990, 1, 1, 0))
+        self.assertFalse(s.set_birth_year(2, 10, 1990))
+
+        self.assertTrue(s.clear_birthday(1, 10))
+        self.assertFalse(s.clear_birthday(1, 10))
+        self.assertIsNone(s.get_user_birthday(1, 10))
+
+    def test_toggle_user_setting(self):
+        """Test toggling and explicitly setting user flags"""
+        s = self.storage
+        self.assertIsNone(s.toggle_user_setting(1, 10, "receive_dms"))
+        s.set_birthday(1, 10, JUL_4)
+        self.assertEqual(s.toggle_user_setting(1, 10, "receive_dms"), 0)
+        self.assertEqual(s.toggle_user_setting(1, 10, "receive_dms"), 1)
+        self.assertEqual(s.toggle_user_setting(1, 10, "share_age", 1), 1)
+        self.assertFalse(s.toggle_user_setting(1, 10, "birthday"))
+
+    def test_birthday_queries(self):
+        """Test date and per-guild date lookups with their filters"""
+        s = self.storage
+        s.load([
+            (1, 10, JUL_4, 1990, 1, 1, 1),
+            (2, 10, JUL_4, None, 0, 1, 0),
+            (3, 20, JUL_4, None, 1, 0, 0),
+            (4, 20, JUL_5, None, 1, 1, 0),
+        ])
+        self.assertEqual({row[0] for row in s.get_birthdays_for_date((JUL_4, JUL_4))}, {1, 2, 3})
+        self.assertEqual({row[0] for row in s.get_birthdays_for_date((JUL_4, JUL_4), dms_only=True)}, {1, 2})
+        self.assertIn((1, 10, 1990, 1, 1, 1), s.get_birthdays_for_date((JUL_4, JUL_4)))
+
+        rows = s.get_birthdays_for_guilds({10: (JUL_4, JUL_4), 20: (JUL_5, JUL_5)})
+        self.assertEqual({row[0] for row in rows}, {1, 2, 4})
+        rows = s.get_birthdays_for_guilds({10: (JUL_4, JUL_4), 20: (JUL_4, JUL_4)}, announce_only=True)
+        self.assertEqual({row[0] for row in rows}, {1, 3})
+        self.assertEqual(s.get_birthdays_for_guilds({}), [])
+
+    def test_birthday_ranges(self):
+        """Test that ranges include both ends, as used for Feb 29 and multi-day windows"""
+        s = self.storage
+        s.load([(day, 10, day, None, 1, 1, 0) for day in (1, 3, 59, 60, 61, 364, 366)])
+        self.assertEqual({row[0] for row in s.get_birthdays_for_date((59, 60))}, {59, 60})
+        rows = s.get_birthdays_for_guilds({10: (364, 366), 20: (364, 366)})
+        self.assertEqual({row[0] for row in rows}, {364, 366})
+
+        # A week over the new year is two ranges
+        ranges = birthday_window(datetime.date(2024, 12, 29), 7)
+        self.assertEqual(ranges, [(364, 366), (1, 4)])
+        found = {row[0] for days in ranges for row in s.get_birthdays_for_date(days)}
+        self.assertEqual(found, {1, 3, 364, 366})
+
+    def test_list_guild_birthdays(self):
+        """Test keyset pages of a guild's birthdays, leaving out members who opted out"""
+        s = self.storage
+        s.load([
+            (3, 10, JUL_4, 1990, 1, 1, 1),
+            (1, 10, JUL_4, None, 1, 1, 0),
+            (2, 10, JUL_5, None, 1, 1, 0),
+            (4, 10, JUL_4, None, 0, 1, 0),
+            (5, 20, JUL_4, None, 1, 1, 0),
+            (6, 10, DEC_25, None, 1, 1, 0),
+        ])
+        page = s.list_guild_birthdays(10, (JUL_4, DEC_25), limit=2)
+        self.assertEqual(page, [(1, JUL_4, None, 0), (3, JUL_4, 1990, 1)])
+        page = s.list_guild_birthdays(10, (JUL_4, DEC_25), after=(JUL_4, 3), limit=2)
+        self.assertEqual([row[0] for row in page], [2, 6])
+        self.assertEqual(s.list_guild_birthdays(10, (JUL_4, DEC_25), after=(DEC_25, 6)), [])
+        self.assertEqual([row[0] for row in s.list_guild_birthdays(10, (JUL_5, JUL_5))], [2])
+
+    def test_birthdays_for_date_by_shard(self):
+        """Test that a shard filter keeps only its own guilds' rows"""
+        s = self.storage
+        # Guild IDs whose shard, out of 4, is 0 through 3
+        s.load([(shard, shard << 22, JUL_4, None, 1, 1, 0) for shard in range(4)])
+        rows = s.get_birthdays_for_date((JUL_4, JUL_4), dms_only=True, shard=ShardFilter(4, frozenset({1, 3})))
+        self.assertEqual({row[0] for row in rows}, {1, 3})
+        self.assertEqual(len(s.get_birthdays_for_date((JUL_4, JUL_4), shard=None)), 4)
+
+    def test_clean_up_user_data(self):
+        """Test removing a user from one guild or all of them"""
+        s = self.storage
+        s.load([(1, 10, JUL_4, None, 1, 1, 0), (1, 20, JUL_4, None, 1, 1, 0), (1, 30, JUL_4, None, 1, 1, 0)])
+        self.assertEqual(s.clean_up_user_data(1, 10), 1)
+        self.assertEqual(s.clean_up_user_data(1), 2)
+        self.assertEqual(s.get_birthdays_for_date((JUL_4, JUL_4)), [])
+
+    def test_user_in_several_guilds(self):
+        """Test that one profile is shared by a user's guilds and DMed once"""
+        s = self.storage
+        self.assertTrue(s.set_birthday(1, 20, JUL_4))
+        self.assertTrue(s.set_birthday(1, 10, JUL_4))
+        self.assertEqual(s.get_birthdays_for_date((JUL_4, JUL_4)), [(1, 10, None, 1, 1, 0)])
+
+        # Birthday, year and DM preference follow the user, announcements are per guild
+        s.set_birthday(1, 20, DEC_25)
+        s.set_birth_year(1, 20, 1990)
+        self.assertEqual(s.toggle_user_setting(1, 20, "announce_in_servers"), 0)
+        self.assertEqual(s.toggle_user_setting(1, 20, "receive_dms"), 0)
+        self.assertEqual(s.get_user_birthday(1, 10), (DEC_25, 1990, 1, 0, 0))
+        self.assertEqual(s.get_user_birthday(1, 20), (DEC_25, 1990, 0, 0, 0))
+        rows = s.get_birthdays_for_guilds({10: (DEC_25, DEC_25), 20: (DEC_25, DEC_25)})
+        self.assertEqual(sorted(row[:4] for row in rows), [(1, 10, 1990, 1), (1, 20, 1990, 0)])
+        self.assertEqual(s.get_birthdays_for_date((JUL_4, JUL_4)), [])
+
+        # DMs move to the next guild, and the profile goes with the last one
+        s.clear_birthday(1, 10)
+        self.assertEqual(s.get_birthdays_for_date((DEC_25, DEC_25)), [(1, 20, 1990, 0, 0, 0)])
+        s.clear_birthday(1, 20)
+        s.set_birthday(1, 30, JAN_1)
+        self.assertEqual(s.get_user_birthday(1, 30), (JAN_1, None, 1, 1, 0))
+
+    def test_guild_config(self):
+        """Test creating, updating and bulk reading guild configs"""
+        s = self.storage
+        self.assertEqual(s.get_guild_configs([10, 20]), {})
+        self.assertEqual(s.update_guild_config(10, {"timezone": "Asia/Tokyo", "announce_channel": 100}),
+                         GuildConfig("Asia/Tokyo", 100, None, False, False))
+        self.assertEqual(s.update_guild_config(10, {"mention_everyone": True}),
+                         GuildConfig("Asia/Tokyo", 100, None, True, False))
+        self.assertIsNone(s.update_guild_config(10, {"owner": 1}))
+        s.load([], [(20, "Europe/Berlin", None, 200, False, True)])
+        self.assertEqual(s.get_guild_configs([10, 20, 30]), {
+            10: GuildConfig("Asia/Tokyo", 100, None, True, False),
+            20: GuildConfig("Europe/Berlin", None, 200, False, True),
+        })
+
+    def test_delivery_ledger(self):
+        """Test recording, checking and pruning deliveries"""
+        s = self.storage
+        keys = [(1, 10, "dm", self.today), (2, 10, "announce", self.today)]
+        self.assertEqual(s.get_delivered(keys), set())
+        self.assertEqual(s.record_deliveries(keys), 2)
+        self.assertEqual(s.record_deliveries(keys[:1]), 0)
+        self.assertEqual(s.get_delivered(keys + [(3, 10, "dm", self.today)]), set(keys))
+
+        old = (1, 10, "dm", self.today - datetime.timedelta(days=10))
+        s.record_deliveries([old])
+        self.assertEqual(s.prune_deliveries(self.today - datetime.timedelta(days=7)), 1)
+        self.assertEqual(s.get_delivered([old]), set())
+
+    def test_undeliverable(self):
+        """Test marking, listing, expiring and clearing undeliverable targets"""
+        s = self.storage
+        s.set_birthday(5, 10, JUL_4)
+        self.assertTrue(s.mark_undeliverable("channel", 100, 10, "Missing Access", 3600))
+        self.assertTrue(s.mark_undeliverable("user", 5, None, "Cannot send messages to this user", 3600))
+        self.assertTrue(s.mark_undeliverable("user", 6, None, "Cannot send messages to this user", -1))
+
+        self.assertEqual(s.get_undeliverable("user", {5, 6, 7}), {5})
+        self.assertEqual(s.get_undeliverable("channel", {100}), {100})
+
+        entries = s.list_undeliverable(10)
+        self.assertEqual({(entry[0], entry[1]) for entry in entries}, {("channel", 100), ("user", 5)})
+        self.assertIsInstance(entries[0][4], datetime.datetime)
+        self.assertGreater(entries[0][4].timestamp(), entries[0][3].timestamp())
+
+        self.assertEqual(s.prune_undeliverable(), 1)
+        self.assertTrue(s.clear_undeliverable("user", 5))
+        self.assertFalse(s.clear_undeliverable("user", 5))
+
+    def test_delivery_jobs(self):
+        """Test queueing, claiming, retrying, completing and pruning jobs"""
+        s = self.storage
+        jobs = [
+            ("dm", 10, 1, self.today, {"birth_year": 1990, "share_age": 1}),
+            ("announce", 10, 0, self.today, {"channel_id": 100, "rows": [[1, None, 0]]}),
+            ("announce", 20 << 22, 0, self.today, {"channel_id": 200, "rows": []}),
+        ]
+        self.assertEqual(s.enqueue_jobs(jobs), 3)
+        self.assertEqual(s.enqueue_jobs(jobs[:1]), 0)
+        self.assertEqual(s.job_counts(), {"pending": 3})
+
+        # Claimed jobs are leased, so a second claim doesn't see them
+        claimed = s.claim_jobs(2, 60)
+        self.assertEqual(len(claimed), 2)
+        self.assertEqual(claimed[0][1:], ("dm", 10, 1, self.today, {"birth_year": 1990, "share_age": 1}, 1))
+        self.assertEqual([job[2] for job in s.claim_jobs(10, 60)], [20 << 22])
+        self.assertEqual(s.claim_jobs(10, 60), [])
+
+        # An expired lease or a retry makes a job due again
+        self.assertEqual(s.complete_jobs([claimed[0][0]]), 1)
+        self.assertTrue(s.retry_job(claimed[1][0], -1, "Missing Access"))
+        retried = s.claim_jobs(10, -1)
+        self.assertEqual([(job[0], job[6]) for job in retried], [(claimed[1][0], 2)])
+        self.assertEqual([job[6] for job in s.claim_jobs(10, 60)], [3])
+        self.assertTrue(s.fail_job(claimed[1][0], "gave up"))
+        self.assertEqual(s.job_counts(), {"pending": 1, "done": 1, "failed": 1})
+
+        self.assertEqual(s.prune_jobs(self.today + datetime.timedelta(days=1)), 3)
+        self.assertEqual(s.job_counts(), {})
+
+    def test_requeued_announcement_merges_members(self):
+        """Test that queueing a combined announcement again adds its new members to the job"""
+        s = self.storage
+        job = ("announce", 10, 0, self.today, {"channel_id": 100, "rows": [[1, None, 0]]})
+        self.assertEqual(s.enqueue_jobs([job]), 1)
+        self.assertEqual(s.enqueue_jobs([job]), 0)
+        claimed = s.claim_jobs(10, -1)
+
+        # Merged while that claim is running, so the run doesn't complete it
+        self.assertEqual(s.enqueue_jobs([job[:4] + ({"channel_id": 100, "rows": [[1, None, 0], [2, 1990, 1]]},)]), 1)
+        self.assertEqual(s.complete_jobs([claimed[0][0]]), 0)
+        self.assertFalse(s.fail_job(claimed[0][0], "Missing Access"))
+        rerun = s.claim_jobs(10, 60)
+        self.assertEqual(rerun[0][5]["rows"], [[1, None, 0], [2, 1990, 1]])
+        self.assertEqual(rerun[0][6], 1)
+        self.assertEqual(s.complete_jobs([rerun[0][0]]), 1)
+
+        # A finished job runs again for members planned after it was sent
+        self.assertEqual(s.enqueue_jobs([job[:4] + ({"channel_id": 100, "rows": [[3, None, 0]]},)]), 1)
+        self.assertEqual(s.job_counts(), {"pending": 1})
+        self.assertEqual([row[0] for row in s.claim_jobs(10, 60)[0][5]["rows"]], [1, 2, 3])
+
+    def test_claim_jobs_by_shard(self):
+        """Test that a shard filter only claims its own guilds' jobs"""
+        s = self.storage
+        s.enqueue_jobs([("announce", shard << 22, 0, self.today, {}) for shard in range(4)])
+        claimed = s.claim_jobs(10, 60, shard=ShardFilter(4, frozenset({2})))
+        self.assertEqual([job[2] for job in claimed], [2 << 22])
+        self.assertEqual(len(s.claim_jobs(10, 60)), 3)
+
+class TestMemoryStorage(StorageContract, unittest.TestCase):
+
+    def make_storage(self):
+        return MemoryStorage()
+
+class TestSQLiteStorage(StorageContract, unittest.TestCase):
+
+    def make_storage(self):
+        return SQLiteStorage(":memory:")
+
+    def test_migrates_users_table(self):
+        """Test that rows in the old users table are moved into profiles and memberships"""
+        s = SQLiteStorage(":memory:")
+        self.addCleanup(s.close)
+        with s._cursor() as cur:
+            cur.execute("""
+                CREATE TABLE users (
+                    user_id INTEGER NOT NULL, guild_id INTEGER NOT NULL, birthday TEXT NOT NULL,
+                    birth_year INTEGER, announce_in_servers INTEGER DEFAULT 1,
+                    receive_dms INTEGER DEFAULT 1, share_age INTEGER DEFAULT 0,
+                    PRIMARY KEY (user_id, guild_id)
+                )
+            """)
+            cur.executemany("INSERT INTO users VALUES (?, ?, ?, ?, ?, ?, ?)", [
+                (1, 20, "1225", None, 1, 1, 0),
+                (1, 10, "0704", 1990, 0, 0, 1),
+                (2, 10, "0101", None, 1, 1, 0),
+            ])
+        s.initialize()
+        self.assertEqual(s.get_user_birthday(1, 20), (JUL_4, 1990, 1, 0, 1))
+        self.assertEqual(s.get_user_birthday(1, 10), (JUL_4, 1990, 0, 0, 1))
+        self.assertEqual(len(s.get_birthdays_for_guilds({10: (JUL_4, JUL_4), 20: (JUL_4, JUL_4)})), 2)
+        self.assertEqual(s.get_birthdays_for_date((JAN_1, JAN_1)), [(2, 10, None, 1, 1, 0)])
+        # Initializing again leaves the migrated data alone
+        s.initialize()
+        self.assertEqual(s.get_user_birthday(2, 10), (JAN_1, None, 1, 1, 0))
+
+    def test_migrates_mmdd_birthdays(self):
+        """Test that MMDD text birthdays are rebuilt as days of the year"""
+        s = SQLiteStorage(":memory:")
+        self.addCleanup(s.close)
+        with s._cursor() as cur:
+            cur.execute("CREATE TABLE profiles (user_id INTEGER PRIMARY KEY, birthday TEXT NOT NULL, "
+                        "birth_year INTEGER, receive_dms INTEGER DEFAULT 1, share_age INTEGER DEFAULT 0)")
+            cur.execute("CREATE TABLE memberships (user_id INTEGER NOT NULL, guild_id INTEGER NOT NULL, "
+                        "birthday TEXT NOT NULL, announce_in_servers INTEGER DEFAULT 1, PRIMARY KEY (user_id, guild_id))")
+            cur.execute("CREATE INDEX idx_profiles_birthday ON profiles (birthday)")
+            cur.execute("INSERT INTO profiles VALUES (1, '0229', 2000, 1, 0)")
+            cur.execute("INSERT INTO memberships VALUES (1, 10, '0229', 0)")
+        s.initialize()
+        self.assertEqual(s.get_user_birthday(1, 10), (60, 2000, 0, 1, 0))
+        self.assertEqual(len(s.get_birthdays_for_guilds({10: (59, 60)})), 1)
+        with s._cursor() as cur:
+            cur.execute("SELECT count(*) FROM sqlite_master WHERE name = 'idx_profiles_birthday' AND tbl_name = 'profiles'")
+            self.assertEqual(cur.fetchone()[0], 1)
+
+    def test_drops_replaced_listing_index(self):
+        """Test that the index replaced by idx_memberships_guild_birthday_user is dropped"""
+        s = self.storage
+        with s._cursor() as cur:
+            cur.execute("CREATE INDEX idx_memberships_guild_birthday ON memberships (guild_id, birthday)")
+        s.initialize()
+        with s._cursor() as cur:
+            cur.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'idx_memberships_guild%'")
+            self.assertEqual(cur.fetchall(), [("idx_memberships_guild_birthday_user",)])
+
+    def test_migrates_settings_table(self):
+        """Test that key/value settings rows are pivoted into guild_config"""
+        s = SQLiteStorage(":memory:")
+        self.addCleanup(s.close)
+        with s._cursor() as cur:
+            cur.execute("CREATE TABLE settings (guild_id INTEGER NOT NULL, setting TEXT NOT NULL, value TEXT, "
+                        "PRIMARY KEY (guild_id, setting))")
+            cur.executemany("INSERT INTO settings VALUES (?, ?, ?)", [
+                (10, "timezone", "Asia/Tokyo"),
+                (10, "announce_channel", "100"),
+                (10, "mention_everyone", "1"),
+                (10, "coalesce_announcements", "0"),
+                (20, "command_channel", "#general"),
+                (20, "mention_everyone", "0"),
+            ])
+        s.initialize()
+        self.assertEqual(s.get_guild_configs([10, 20]), {
+            10: GuildConfig("Asia/Tokyo", 100, None, True, False),
+            20: DEFAULT_GUILD_CONFIG,
+        })
+        # Initializing again leaves the migrated data alone
+        s.update_guild_config(20, {"command_channel": 200})
+        s.initialize()
+        self.assertEqual(s.get_guild_configs([20])[20].command_channel, 200)
+
+    def test_failed_migration_rolls_back(self):
+        """Test that a migration that fails part way leaves the old tables as they were"""
+        s = SQLiteStorage(":memory:")
+        self.addCleanup(s.close)
+        with s._cursor() as cur:
+            cur.execute("CREATE TABLE profiles (user_id INTEGER PRIMARY KEY, birthday TEXT NOT NULL, "
+                        "birth_year INTEGER, receive_dms INTEGER DEFAULT 1, share_age INTEGER DEFAULT 0)")
+            cur.execute("CREATE TABLE memberships (user_id INTEGER NOT NULL, guild_id INTEGER NOT NULL, "
+                        "birthday TEXT NOT NULL, announce_in_servers INTEGER DEFAULT 1, PRIMARY KEY (user_id, guild_id))")
+            # Not a date, so the converted birthday is NULL and the copy fails
+            cur.execute("INSERT INTO profiles VALUES (1, '1340', NULL, 1, 0)")
+        with self.assertRaises(Exception):
+            s.initialize()
+        with s._cursor() as cur:
+            cur.execute("SELECT user_id, birthday FROM profiles")
+            self.assertEqual(cur.fetchall(), [(1, "1340")])
+            cur.execute("SELECT count(*) FROM sqlite_master WHERE name LIKE '%_mmdd'")
+            self.assertEqual(cur.fetchone()[0], 0)
+
+    def test_large_set_queries_are_chunked(self):
+        """Test set queries with more values than SQLite's parameter limit"""
+        s = self.storage
+        s.load((user_id, user_id % 2000, JUL_4, None, 1, 1, 0) for user_id in range(5000))
+        rows = s.get_birthdays_for_guilds({guild_id: (JUL_4, JUL_4) for guild_id in range(2000)})
+        self.assertEqual(len(rows), 5000)
+
+        keys = [(user_id, user_id % 2000, "dm", self.today) for user_id in range(5000)]
+        s.record_deliveries(keys)
+        self.assertEqual(len(s.get_delivered(keys)), 5000)
+
+class TestCreateStorage(unittest.TestCase):
+
+    def test_backend_names(self):
+        """Test that backends are created by name"""
+        self.assertIsInstance(create_storage("memory"), MemoryStorage)
+        self.assertIsInstance(create_storage("sqlite"), SQLiteStorage)
+        with self.assertRaises(ValueError):
+            create_storage("mysql")
+
+    def test_backends_implement_interface(self):
+        """Test that every backend implements each abstract Storage method"""
+        self.assertIn("get_guild_configs", Storage.__abstractmethods__)
+        # The contract tests above don't run against Postgres, so this is what catches a missing method there
+        for backend in (MemoryStorage, SQLiteStorage, PostgresStorage):
+            with self.subTest(backend=backend.name):
+                self.assertEqual(backend.__abstractmethods__, frozenset())
+
+        class Incomplete(Storage):
+            def ping(self):
+                return True
+        with self.assertRaises(TypeError):
+            Incomplete()
+
+class TestStartStorage(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(storage.set_storage, None)
+        storage._ready_event = None
+        self.addCleanup(setattr, storage, "_ready_event", None)
+
+    def test_failed_start_never_signals_ready(self):
+        """Test that a backend failing its schema setup is reported and never ready"""
+        backend = storage.set_storage(SQLiteStorage(":memory:"))
+        backend.initialize = lambda: 1 / 0
+
+        async def run():
+            return await storage.start_storage(), await storage.wait_until_ready(0.01)
+
+        with self.assertLogs("database", "ERROR"):
+            self.assertEqual(asyncio.run(run()), (False, False))
+
+    def test_start_signals_ready(self):
+        storage.set_storage(MemoryStorage())
+
+        async def run():
+            return await storage.start_storage(), await storage.wait_until_ready(0.01)
+
+        self.assertEqual(asyncio.run(run()), (True, True))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+import sys
+import os
+import asyncio
+from unittest.mock import MagicMock, AsyncMock
+
+import discord
+
+# Add the parent directory to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import the module to test
+from user_resolver import UserResolver
+
+class TestUserResolver(unittest.TestCase):
+    
+    def setUp(self):
+        self.client = MagicMock()
+        self.client.get_user.return_value = None
+        self.client.get_guild.return_value = None
+        self.client.fetch_user = AsyncMock()
+        self.resolver = UserResolver(self.client)
+    
+    def test_cache_hit_skips_rest(self):
+        """Test that a cached user is returned without a REST fetch"""
+        user = MagicMock()
+        self.client.get_user.return_value = user
+        
+        self.assertIs(asyncio.run(self.resolver.resolve(1)), user)
+        self.client.fetch_user.assert_not_called()
+        self.assertEqual(self.resolver.stats()["cache_hits"], 1)
+    
+    def test_guild_member_cache(self):
+        """Test falling back to the guild's member cache"""
+        member = MagicMock()
+        guild = MagicMock()
+        guild.get_member.return_value = member
+        self.client.get_guild.return_value = guild
+        
+        self.assertIs(asyncio.run(self.resolver.resolve(1, guild_id=2)), member)
+        self.client.fetch_user.assert_not_called()
+    
+    def test_unknown_user_is_negatively_cached(self):
+        """Test that a user REST can't find isn't fetched again"""
+        response = MagicMock(status=404, reason="Not Found")
+        self.client.fetch_user.side_effect = discord.NotFound(response, "Unknown User")
+        
+        self.assertIsNone(asyncio.run(self.resolver.resolve(1)))
+        self.assertIsNone(asyncio.run(self.resolver.resolve(1)))
+        self.assertEqual(self.client.fetch_user.await_count, 1)
+        
+        stats = self.resolver.stats()
+        self.assertEqual(stats["rest_fetches"], 1)
+        self.assertEqual(stats["unknown_hits"], 1)
+        
+if __name__ == '__main__':
+    unittest.main()
@@ -9,7 +9,14 @@ from unittest.mock import patch, MagicMock
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Import the module to test
-from utils import parse_birthday, validate_year, calculate_age, is_admin
+from utils import (
+    parse_birthday, validate_year, calculate_age, is_admin, build_coalesced_announcements,
+    next_local_midnight, encode_birthday, decode_birthday, birthday_days, birthday_window,
+    get_guild_timezones
+)
+from data_access import settings_cache
+from storage import set_storage
+from storage_memory import MemoryStorage
 
 class TestUtils(unittest.TestCase):
     
@@ -87,6 +94,74 @@ class TestUtils(unittest.TestCase):
         self.assertTrue(is_admin(admin_member))
         self.assertTrue(is_admin(birthday_member))
         self.assertFalse(is_admin(regular_member))
+    
+    def test_next_local_midnight(self):
+        """Test finding the next local midnight as a UTC instant"""
+        now = pytz.UTC.localize(datetime(2024, 3, 9, 12, 0))
+        
+        self.assertEqual(next_local_midnight("UTC", now), pytz.UTC.localize(datetime(2024, 3, 10, 0, 0)))
+        # Tokyo is UTC+9, so it's already 21:00 on the 9th there
+        self.assertEqual(next_local_midnight("Asia/Tokyo", now), pytz.UTC.localize(datetime(2024, 3, 9, 15, 0)))
+        # New York is still on EST (UTC-5) at midnight on the 10th
+        self.assertEqual(next_local_midnight("America/New_York", now), pytz.UTC.localize(datetime(2024, 3, 10, 5, 0)))
+    
+    def test_get_guild_timezones(self):
+        """Test that guild timezones are read in one call and cached"""
+        storage = set_storage(MemoryStorage())
+        self.addCleanup(set_storage, None)
+        self.addCleanup(settings_cache.clear)
+        settings_cache.clear()
+        storage.load([], [(1, "Asia/Tokyo", None, None, False, False), (2, "Mars/Olympus", None, None, False, False)])
+        
+        with patch.object(storage, "get_guild_configs", wraps=storage.get_guild_configs) as get_configs:
+            timezones = get_guild_timezones([1, 2, 3])
+            self.assertEqual(get_guild_timezones([3, 1]), {1: "Asia/Tokyo", 3: "UTC"})
+        self.assertEqual(timezones, {1: "Asia/Tokyo", 2: "UTC", 3: "UTC"})
+        get_configs.assert_called_once_with([1, 2, 3])
+    
+    def test_encode_birthday(self):
+        """Test encoding birthdays as days of the leap year and back"""
+        self.assertEqual(encode_birthday("0101"), 1)
+        self.assertEqual(encode_birthday("0229"), 60)
+        self.assertEqual(encode_birthday("0301"), 61)
+        self.assertEqual(encode_birthday("1231"), 366)
+        for day in range(1, 367):
+            self.assertEqual(encode_birthday(decode_birthday(day)), day)
+    
+    def test_birthday_days_feb_29(self):
+        """Test that Feb 29 birthdays are celebrated on Feb 28 in other years"""
+        self.assertEqual(birthday_days(datetime(2025, 2, 28).date()), (59, 60))
+        self.assertEqual(birthday_days(datetime(2025, 3, 1).date()), (61, 61))
+        self.assertEqual(birthday_days(datetime(2024, 2, 28).date()), (59, 59))
+        self.assertEqual(birthday_days(datetime(2024, 2, 29).date()), (60, 60))
+    
+    def test_birthday_window(self):
+        """Test multi-day windows, including over the new year"""
+        self.assertEqual(birthday_window(datetime(2024, 7, 4).date(), 7), [(186, 192)])
+        self.assertEqual(birthday_window(datetime(2025, 12, 28).date(), 7), [(363, 366), (1, 3)])
+        self.assertEqual(birthday_window(datetime(2025, 2, 25).date(), 7), [(56, 63)])
+        self.assertEqual(birthday_window(datetime(2025, 3, 1).date(), 365), [(61, 366), (1, 60)])
+        self.assertEqual(birthday_window(datetime(2025, 1, 1).date(), 400), [(1, 366)])
+        self.assertEqual(birthday_window(datetime(2024, 7, 4).date(), 366), [(186, 366), (1, 185)])
+        self.assertEqual(birthday_window(datetime(2025, 1, 1).date(), 0), [])
+    
+    def test_build_coalesced_announcements(self):
+        """Test combining several birthdays into one announcement"""
+        messages = build_coalesced_announcements([("<@1>", None), ("<@2>", 30)])
+        self.assertEqual(len(messages), 1)
+        message, count = messages[0]
+        self.assertEqual(count, 2)
+        self.assertIn("• <@1>\n", message)
+        self.assertIn("• <@2> (turning 30)", message)
+        
+    def test_build_coalesced_announcements_split(self):
+        """Test that long announcements are split at the length limit"""
+        entries = [(f"<@{i:018d}>", None) for i in range(200)]
+        messages = build_coalesced_announcements(entries, limit=500)
+        
+        self.assertGreater(len(messages), 1)
+        self.assertTrue(all(len(message) <= 500 for message, _ in messages))
+        self.assertEqual(sum(count for _, count in messages), 200)
         
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
@@ -0,0 +1,89 @@
+import os
+import time
+import logging
+from collections import OrderedDict
+
+import discord
+
+logger = logging.getLogger('birthday_bot')
+
+# How long, in seconds, a user that REST couldn't find is remembered, and how many are kept
+UNKNOWN_USER_TTL = float(os.getenv("UNKNOWN_USER_TTL", "86400"))
+UNKNOWN_USER_CACHE_SIZE = int(os.getenv("UNKNOWN_USER_CACHE_SIZE", "10000"))
+
+class UserResolver:
+    """
+    Resolve user IDs to discord users, preferring the gateway cache.
+    Falls back to a REST fetch only on a cache miss, and remembers users that
+    REST reported as unknown so they aren't fetched again until the entry expires.
+    """
+
+    def __init__(self, client, negative_ttl=UNKNOWN_USER_TTL, negative_size=UNKNOWN_USER_CACHE_SIZE,
+                 clock=time.monotonic):
+        self.client = client
+        self.negative_ttl = negative_ttl
+        self.negative_size = negative_size
+        self._clock = clock
+        self._unknown = OrderedDict()
+        self.reset_stats()
+
+    def reset_stats(self):
+        """Reset the per-tick counters"""
+        self.cache_hits = 0
+        self.rest_fetches = 0
+        self.unknown_hits = 0
+
+    def stats(self):
+        """Get counters since the last reset"""
+        return {
+            "cache_hits": self.cache_hits,
+            "rest_fetches": self.rest_fetches,
+            "unknown_hits": self.unknown_hits,
+            "unknown_cached": len(self._unknown),
+        }
+
+    def _is_known_unknown(self, user_id):
+        expires_at = self._unknown.get(user_id)
+        if expires_at is None:
+            return False
+        if expires_at <= self._clock():
+            del self._unknown[user_id]
+            return False
+        return True
+
+    def _remember_unknown(self, user_id):
+        self._unknown[user_id] = self._clock() + self.negative_ttl
+        self._unknown.move_to_end(user_id)
+        while len(self._unknown) > self.negative_size:
+            self._unknown.popitem(last=False)
+
+    def get_cached(self, user_id, guild_id=None):
+        """Look a user up in the gateway cache only"""
+        user = self.client.get_user(user_id)
+        if user is None and guild_id is not None:
+            guild = self.client.get_guild(guild_id)
+            if guild:
+                user = guild.get_member(user_id)
+        return user
+
+    async def resolve(self, user_id, guild_id=None):
+        """
+        Get a user, trying the client cache and the guild's member cache first.
+        Returns None if the user doesn't exist.
+        """
+        user = self.get_cached(user_id, guild_id)
+        if user is not None:
+            self.cache_hits += 1
+            return user
+
+        if self._is_known_unknown(user_id):
+            self.unknown_hits += 1
+            return None
+
+        self.rest_fetches += 1
+        try:
+            return await self.client.fetch_user(user_id)
+        except discord.NotFound:
+            logger.info(f"User {user_id} not found, skipping for {self.negative_ttl:.0f}s")
+            self._remember_unknown(user_id)
+            return None
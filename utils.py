@@ -1,7 +1,20 @@
 import re
+import bisect
+import calendar
 import datetime
 import pytz
-from data_access import get_server_setting
+from data_access import get_guild_config, get_guild_configs
+
+# Discord's maximum message length
+DISCORD_MESSAGE_LIMIT = 2000
+
+# Birthdays are stored as their day of the year in a leap year, 1 to 366, so
+# Feb 29 keeps its own day and every date encodes the same way in every year
+BIRTHDAY_DAYS = 366
+FEB_28 = 59
+
+# Days before the first of each month in a leap year
+_MONTH_STARTS = (0, 31, 60, 91, 121, 152, 182, 213, 244, 274, 305, 335)
 
 def parse_birthday(birthday_str):
     """
@@ -57,9 +70,9 @@ def validate_year(year_str):
     except ValueError:
         return None
 
-def get_current_date_mmdd(timezone=None):
+def get_current_date(timezone=None):
     """
-    Get current date in MMDD format for the specified timezone.
+    Get current date for the specified timezone.
     If timezone is None, uses UTC.
     """
     if timezone:
@@ -68,16 +81,73 @@ def get_current_date_mmdd(timezone=None):
     else:
         now = datetime.datetime.now(pytz.UTC)
     
-    return now.strftime("%m%d")
+    return now.date()
+
+def encode_birthday(mmdd):
+    """Encode a valid MMDD birthday as its day of the leap year, 1 to 366"""
+    return _MONTH_STARTS[int(mmdd[:2]) - 1] + int(mmdd[2:4])
+
+def decode_birthday(day):
+    """Decode a day of the leap year back into an MMDD birthday"""
+    month = bisect.bisect_right(_MONTH_STARTS, day - 1)
+    return f"{month:02d}{day - _MONTH_STARTS[month - 1]:02d}"
+
+def birthday_days(date):
+    """
+    Get the (first, last) range of encoded birthdays celebrated on a date.
+    This is the one place the Feb 29 rule lives: in years without a Feb 29,
+    those birthdays are celebrated on Feb 28.
+    """
+    day = _MONTH_STARTS[date.month - 1] + date.day
+    if day == FEB_28 and not calendar.isleap(date.year):
+        return (FEB_28, FEB_28 + 1)
+    return (day, day)
+
+def birthday_window(start, days):
+    """
+    Get the encoded birthday ranges celebrated in the `days` days starting on
+    `start`, as a list of (first, last) ranges in calendar order. A window
+    that crosses the new year is split in two, so each range is an index scan.
+    """
+    if days <= 0:
+        return []
+    first = birthday_days(start)[0]
+    if days >= BIRTHDAY_DAYS:
+        # The whole year, still starting from `start`
+        return [(first, BIRTHDAY_DAYS), (1, first - 1)] if first > 1 else [(1, BIRTHDAY_DAYS)]
+    last = birthday_days(start + datetime.timedelta(days=days - 1))[1]
+    if first <= last:
+        return [(first, last)]
+    return [(first, BIRTHDAY_DAYS), (1, last)]
+
+def next_local_midnight(timezone, now=None):
+    """
+    Get the next local midnight in the specified timezone, as an aware UTC datetime.
+    If midnight doesn't exist on that day because of a DST change, the first
+    valid local time after it is used.
+    """
+    tz = pytz.timezone(timezone)
+    now = now or datetime.datetime.now(pytz.UTC)
+    next_date = now.astimezone(tz).date() + datetime.timedelta(days=1)
+    midnight = tz.normalize(tz.localize(datetime.datetime.combine(next_date, datetime.time.min), is_dst=False))
+    return midnight.astimezone(pytz.UTC)
 
 def get_guild_timezone(guild_id):
     """
     Get the timezone for a guild.
     Returns the timezone string or 'UTC' if not set.
     """
-    tz_str = get_server_setting(guild_id, "timezone")
-    
-    # Validate the timezone
+    return valid_timezone(get_guild_config(guild_id).timezone)
+
+def get_guild_timezones(guild_ids):
+    """
+    Get the timezone for each guild, reading their configs in one call.
+    Returns a dict mapping guild_id to a timezone string.
+    """
+    return {guild_id: valid_timezone(config.timezone) for guild_id, config in get_guild_configs(guild_ids).items()}
+
+def valid_timezone(tz_str):
+    """Return tz_str if it's a known timezone, otherwise 'UTC'"""
     try:
         if tz_str:
             pytz.timezone(tz_str)
@@ -87,6 +157,22 @@ def get_guild_timezone(guild_id):
     
     return "UTC"
 
+def get_guild_dates(guild_ids):
+    """
+    Get the current local date for each guild.
+    The date is computed once per timezone rather than once per guild.
+    Returns a dict mapping guild_id to a datetime.date.
+    """
+    dates_by_timezone = {}
+    guild_dates = {}
+    
+    for guild_id, tz_str in get_guild_timezones(guild_ids).items():
+        if tz_str not in dates_by_timezone:
+            dates_by_timezone[tz_str] = get_current_date(tz_str)
+        guild_dates[guild_id] = dates_by_timezone[tz_str]
+    
+    return guild_dates
+
 def calculate_age(birth_year):
     """
     Calculate a person's age based on their birth year.
@@ -97,6 +183,33 @@ def calculate_age(birth_year):
     current_year = datetime.datetime.now().year
     return current_year - birth_year
 
+def build_coalesced_announcements(entries, limit=DISCORD_MESSAGE_LIMIT):
+    """
+    Build birthday announcements covering several members at once.
+    entries is a list of (mention, age) tuples, with age None if it isn't shared.
+    Returns a list of (message, count) tuples, where count is how many entries
+    the message covers, in order. Messages are split to stay within `limit`.
+    """
+    header = "🎉 Today is the birthday of:"
+    footer = "Wish them a happy birthday! 🎂🎈"
+    messages = []
+    lines = []
+    length = len(header) + len(footer) + 1
+    
+    for mention, age in entries:
+        line = f"• {mention}" + (f" (turning {age})" if age is not None else "")
+        if lines and length + len(line) + 1 > limit:
+            messages.append(("\n".join([header] + lines + [footer]), len(lines)))
+            lines = []
+            length = len(header) + len(footer) + 1
+        lines.append(line)
+        length += len(line) + 1
+    
+    if lines:
+        messages.append(("\n".join([header] + lines + [footer]), len(lines)))
+    
+    return messages
+
 def is_admin(member):
     """
     Check if a member has admin privileges.